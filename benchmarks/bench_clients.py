@@ -0,0 +1,281 @@
+"""Measures the sync client, async client and cli against a local mock api.
+
+    python -m benchmarks.bench_clients --requests 1000 --concurrency 20 --latency 0.005
+
+Reports per scenario the requests seen by the server (including token requests
+and retries), requests per second, p50/p99 latency, peak python memory, the
+connections opened (handshakes), token requests and 401/429 responses.
+"""
+import argparse
+import asyncio
+import json
+import os
+import os.path as path
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent import futures
+
+import requests
+
+from trustpilot import async_client, client
+from trustpilot.retry import RetryPolicy
+from trustpilot.token_cache import MemoryTokenCache
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+BUSINESS_UNIT_ID = "46d6a890000064000500e0c3"
+REVIEWS_PATH = "/private/business-units/{}/reviews".format(BUSINESS_UNIT_ID)
+
+Result = namedtuple(
+    "Result", ["scenario", "seconds", "latencies", "peak_memory", "stats"]
+)
+
+
+class MockServer:
+    # runs benchmarks.mock_server in a subprocess, so it doesn't compete with
+    # the measured client for the gil
+    def __init__(self, *args):
+        self.args = [str(arg) for arg in args]
+        self.env = dict(os.environ, PYTHONPATH=ROOT)
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.mock_server"] + self.args,
+            stdout=subprocess.PIPE,
+            cwd=ROOT,
+            env=self.env,
+            text=True,
+        )
+        self.url = json.loads(self.process.stdout.readline())["url"]
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+    def reset_stats(self):
+        requests.post(self.url + "/_stats/reset").raise_for_status()
+
+    def get_stats(self):
+        return requests.get(self.url + "/_stats").json()
+
+
+def get_session_kwargs(server, args):
+    return dict(
+        api_host=server.url,
+        api_key="key",
+        api_secret="secret",
+        username="username",
+        password="password",
+        api_version="v1",
+        token_refresh_skew=min(60, args.token_ttl / 10),
+        token_cache=MemoryTokenCache(),
+        retry_policy=RetryPolicy(total=10, backoff_factor=0.001),
+    )
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    function(*args, **kwargs).raise_for_status()
+    return time.perf_counter() - started
+
+
+def sync_sequential(server, args):
+    session = client.TrustpilotSession(**get_session_kwargs(server, args))
+    return [
+        timed(session.get, REVIEWS_PATH, params={"perPage": args.per_page})
+        for _ in range(args.requests)
+    ]
+
+
+def sync_threads(server, args):
+    session = client.TrustpilotSession(
+        pool_connections=args.concurrency,
+        pool_maxsize=args.concurrency,
+        **get_session_kwargs(server, args)
+    )
+    with futures.ThreadPoolExecutor(args.concurrency) as executor:
+        return list(
+            executor.map(
+                lambda _: timed(
+                    session.get, REVIEWS_PATH, params={"perPage": args.per_page}
+                ),
+                range(args.requests),
+            )
+        )
+
+
+def async_concurrent(server, args):
+    async def run():
+        session = async_client.TrustpilotAsyncSession(
+            **get_session_kwargs(server, args)
+        )
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def timed_get():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await session.get(
+                    REVIEWS_PATH, params={"perPage": args.per_page}
+                )
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+        async with session:
+            return await asyncio.gather(*[timed_get() for _ in range(args.requests)])
+
+    return asyncio.run(run())
+
+
+def sync_pages(server, args):
+    session = client.TrustpilotSession(**get_session_kwargs(server, args))
+    for _ in session.iter_items(REVIEWS_PATH, params={"perPage": 100}, concurrency=4):
+        pass
+    return []
+
+
+def async_pages(server, args):
+    async def run():
+        session = async_client.TrustpilotAsyncSession(
+            **get_session_kwargs(server, args)
+        )
+        async with session:
+            async for _ in session.iter_items(
+                REVIEWS_PATH, params={"perPage": 100}, concurrency=4
+            ):
+                pass
+        return []
+
+    return asyncio.run(run())
+
+
+def cli(server, args):
+    # a process per request, as the cli is used from scripts
+    command = [sys.executable, "-m", "trustpilot.cli", "--host", server.url]
+    command += ["--key", "key", "--secret", "secret"]
+    command += ["get", "/business-units/{}".format(BUSINESS_UNIT_ID)]
+
+    latencies = []
+    for _ in range(args.cli_runs):
+        started = time.perf_counter()
+        subprocess.run(
+            command, check=True, stdout=subprocess.DEVNULL, cwd=ROOT, env=server.env
+        )
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+SCENARIOS = {
+    "sync": sync_sequential,
+    "sync-threads": sync_threads,
+    "async": async_concurrent,
+    "sync-pages": sync_pages,
+    "async-pages": async_pages,
+    "cli": cli,
+}
+
+
+def run_scenario(name, server, args):
+    scenario = SCENARIOS[name]
+
+    server.reset_stats()
+    started = time.perf_counter()
+    latencies = scenario(server, args)
+    seconds = time.perf_counter() - started
+    stats = server.get_stats()
+
+    # memory is measured in a second run, tracing slows the client down
+    if name == "cli":
+        peak_memory = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    elif args.skip_memory:
+        peak_memory = None
+    else:
+        tracemalloc.start()
+        scenario(server, args)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return Result(name, seconds, sorted(latencies), peak_memory, stats)
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def format_number(value, scale=1, digits=1):
+    if value is None:
+        return "-"
+    return "{:.{}f}".format(value * scale, digits)
+
+
+def print_results(results):
+    columns = "{:<13} {:>8} {:>9} {:>8} {:>8} {:>9} {:>6} {:>6} {:>5} {:>5}"
+    print(
+        columns.format(
+            "scenario",
+            "requests",
+            "req/s",
+            "p50 ms",
+            "p99 ms",
+            "peak MB",
+            "conns",
+            "tokens",
+            "401",
+            "429",
+        )
+    )
+    for result in results:
+        stats = result.stats
+        print(
+            columns.format(
+                result.scenario,
+                stats.get("requests", 0),
+                format_number(stats.get("requests", 0) / result.seconds),
+                format_number(percentile(result.latencies, 50), 1000),
+                format_number(percentile(result.latencies, 99), 1000),
+                format_number(result.peak_memory, 1 / 1024 / 1024),
+                stats.get("connections", 0),
+                stats.get("token_requests", 0),
+                stats.get("401", 0),
+                stats.get("429", 0),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "scenarios", nargs="*", choices=[[]] + list(SCENARIOS), default=[]
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--per-page", type=int, default=20, help="reviews per get")
+    parser.add_argument("--cli-runs", type=int, default=10)
+    parser.add_argument("--skip-memory", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=float, default=3600)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--total-reviews", type=int, default=2000)
+    args = parser.parse_args()
+
+    server_args = ["--latency", args.latency, "--token-ttl", args.token_ttl]
+    server_args += ["--rate-limit", args.rate_limit]
+    server_args += ["--total-reviews", args.total_reviews]
+    with MockServer(*server_args) as server:
+        print_results(
+            [
+                run_scenario(name, server, args)
+                for name in args.scenarios or list(SCENARIOS)
+            ]
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measures the import time of the package modules and the startup of the cli.
+
+    python -m benchmarks.bench_import_time --runs 10
+
+Each import runs in a fresh interpreter with `-X importtime`, the cli startup
+is the wall time of `trustpilot_api_client --help`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = (
+    "trustpilot",
+    "trustpilot.client",
+    "trustpilot.async_client",
+    "trustpilot.cli",
+)
+
+
+def get_import_times(module):
+    # microseconds spent importing each module, by name
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:  # the header
+            pass
+    return times
+
+
+def get_cli_startup():
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "trustpilot.cli", "--help"],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    # bytecode is cached by the first run, as for an installed package
+    os.environ.pop("PYTHONDONTWRITEBYTECODE", None)
+    for module in MODULES:
+        get_import_times(module)
+
+    print("{:<26} {:>10} {:>10}".format("import", "p50 ms", "min ms"))
+    for module in MODULES:
+        runs = [get_import_times(module)[module] / 1000 for _ in range(args.runs)]
+        print(
+            "{:<26} {:>10.1f} {:>10.1f}".format(
+                module, statistics.median(runs), min(runs)
+            )
+        )
+
+    runs = [get_cli_startup() * 1000 for _ in range(args.runs)]
+    print(
+        "{:<26} {:>10.1f} {:>10.1f}".format(
+            "cli --help (wall)", statistics.median(runs), min(runs)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
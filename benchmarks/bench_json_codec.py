@@ -0,0 +1,89 @@
+"""Compares the installed json codecs on review pages shaped like the api's.
+
+    python -m benchmarks.bench_json_codec --reviews 100 --pages 200
+"""
+import argparse
+import random
+import time
+
+from trustpilot.json_codec import get_available_codecs, get_json_codec
+
+WORDS = (
+    "great service fast delivery product quality support friendly price order "
+    "package arrived late refund easy recommend again website æøå 😀"
+).split()
+
+
+def make_review(index):
+    return {
+        "id": "{:024x}".format(index),
+        "consumer": {
+            "id": "{:024x}".format(index * 7),
+            "displayName": "Consumer {}".format(index),
+            "displayLocation": None,
+            "numberOfReviews": random.randint(1, 50),
+        },
+        "businessUnit": {"id": "46d6a890000064000500e0c3", "displayName": "Shop"},
+        "stars": random.randint(1, 5),
+        "title": " ".join(random.choices(WORDS, k=5)),
+        "text": " ".join(random.choices(WORDS, k=random.randint(20, 120))),
+        "language": "en",
+        "createdAt": "2023-07-28T12:00:00Z",
+        "isVerified": random.random() > 0.5,
+        "tags": [{"group": "source", "value": "invitation"}],
+        "companyReply": None,
+        "links": [
+            {
+                "href": "https://api.trustpilot.com/v1/reviews/{:024x}".format(index),
+                "method": "GET",
+                "rel": "reviews",
+            }
+        ],
+    }
+
+
+def make_page(reviews):
+    return {
+        "reviews": [make_review(index) for index in range(reviews)],
+        "links": [{"href": "https://api.trustpilot.com/v1/...", "rel": "next-page"}],
+        "total": reviews * 10,
+    }
+
+
+def measure(function, pages):
+    started = time.perf_counter()
+    for page in pages:
+        function(page)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reviews", type=int, default=100, help="reviews per page")
+    parser.add_argument("--pages", type=int, default=200, help="pages per run")
+    args = parser.parse_args()
+
+    random.seed(1)
+    page = make_page(args.reviews)
+    pages = [page] * args.pages
+    body = get_json_codec("json").dumps(page)
+    bodies = [body] * args.pages
+    megabytes = len(body) * args.pages / 1024 / 1024
+
+    print(
+        "{} pages of {} reviews, {:.1f} MB".format(args.pages, args.reviews, megabytes)
+    )
+    print("{:<8} {:>12} {:>12}".format("codec", "loads MB/s", "dumps MB/s"))
+    for name in get_available_codecs():
+        codec = get_json_codec(name)
+        loads = measure(codec.loads, bodies)
+        dumps = measure(codec.dumps, pages)
+        print(
+            "{:<8} {:>12.1f} {:>12.1f}".format(
+                name, megabytes / loads, megabytes / dumps
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
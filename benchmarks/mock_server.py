@@ -0,0 +1,216 @@
+"""A local stand-in for the api and its token issuer, for benchmarks.
+
+    python -m benchmarks.mock_server --port 8080 --latency 0.005 --rate-limit 0.01
+
+Serves:
+
+- POST /v1/oauth/oauth-business-users-for-applications/accesstoken
+- GET  /v1/business-units/{id}
+- GET  /v1/business-units/{id}/reviews?page=&perPage=         (apikey)
+- GET  /v1/private/business-units/{id}/reviews?page=&perPage= (access token)
+- POST /v1/private/business-units/{id}/email-invitations       (access token)
+- GET  /_stats, POST /_stats/reset
+
+Access tokens expire after --token-ttl seconds and are then answered with 401.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks.bench_json_codec import make_review
+
+TOKEN_PATH = "/v1/oauth/oauth-business-users-for-applications/accesstoken"
+
+
+class MockApi:
+    def __init__(
+        self,
+        latency=0.0,
+        token_ttl=3600,
+        rate_limit=0.0,
+        total_reviews=1000,
+        max_per_page=100,
+        seed=1,
+    ):
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.rate_limit = rate_limit
+        self.total_reviews = total_reviews
+        self.max_per_page = max_per_page
+        self.random = random.Random(seed)
+        self.tokens = {}
+        self.stats = Counter()
+        self.connections = set()
+        # pages are generated once, the payload size is what matters
+        self._reviews = [make_review(index) for index in range(total_reviews)]
+
+    def reset_stats(self):
+        self.stats.clear()
+        self.connections.clear()
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        # a connection is counted once per client address, i.e. per handshake
+        peer = (
+            request.transport.get_extra_info("peername") if request.transport else None
+        )
+        if peer not in self.connections:
+            self.connections.add(peer)
+            self.stats["connections"] += 1
+
+        if request.path.startswith("/_stats"):
+            return await handler(request)
+
+        self.stats["requests"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if request.path != TOKEN_PATH and self.random.random() < self.rate_limit:
+            self.stats["429"] += 1
+            return web.json_response(
+                {"message": "too many requests"},
+                status=429,
+                headers={"Retry-After": "0"},
+            )
+        return await handler(request)
+
+    def _authorized(self, request):
+        if not request.headers.get("apikey"):
+            return False
+        if "/private/" not in request.path:
+            return True
+        authorization = request.headers.get("Authorization", "")
+        expires_at = self.tokens.get(authorization[len("Bearer ") :])
+        return expires_at is not None and expires_at > time.time()
+
+    def _unauthorized(self):
+        self.stats["401"] += 1
+        return web.json_response({"fault": "invalid access token"}, status=401)
+
+    async def access_token(self, request):
+        self.stats["token_requests"] += 1
+        access_token = "token-{}".format(self.stats["token_requests"])
+        self.tokens[access_token] = time.time() + self.token_ttl
+        return web.json_response(
+            {"access_token": access_token, "expires_in": str(self.token_ttl)}
+        )
+
+    async def business_unit(self, request):
+        if not self._authorized(request):
+            return self._unauthorized()
+        return web.json_response(
+            {
+                "id": request.match_info["id"],
+                "displayName": "Shop",
+                "numberOfReviews": {"total": self.total_reviews},
+                "score": {"stars": 4.5, "trustScore": 4.6},
+            }
+        )
+
+    async def reviews(self, request):
+        if not self._authorized(request):
+            return self._unauthorized()
+
+        page = max(1, int(request.query.get("page", 1)))
+        per_page = min(self.max_per_page, int(request.query.get("perPage", 20)))
+        start = (page - 1) * per_page
+        links = []
+        if start + per_page < self.total_reviews:
+            links.append(
+                {
+                    "href": str(
+                        request.url.update_query(page=page + 1, perPage=per_page)
+                    ),
+                    "method": "GET",
+                    "rel": "next-page",
+                }
+            )
+        return web.json_response(
+            {
+                "reviews": self._reviews[start : start + per_page],
+                "links": links,
+                "total": self.total_reviews,
+            }
+        )
+
+    async def email_invitation(self, request):
+        if not self._authorized(request):
+            return self._unauthorized()
+        await request.read()
+        return web.json_response({}, status=202)
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    async def post_stats_reset(self, request):
+        self.reset_stats()
+        return web.json_response({})
+
+    def create_app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_post(TOKEN_PATH, self.access_token)
+        app.router.add_get("/v1/business-units/{id}", self.business_unit)
+        app.router.add_get("/v1/business-units/{id}/reviews", self.reviews)
+        app.router.add_get("/v1/private/business-units/{id}/reviews", self.reviews)
+        app.router.add_post(
+            "/v1/private/business-units/{id}/email-invitations", self.email_invitation
+        )
+        app.router.add_get("/_stats", self.get_stats)
+        app.router.add_post("/_stats/reset", self.post_stats_reset)
+        return app
+
+
+async def serve(api, host, port):
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    # the benchmark runner reads the address from this line
+    print(json.dumps({"url": "http://{}:{}".format(host, port)}), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="default: any free port")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to each response"
+    )
+    parser.add_argument(
+        "--token-ttl", type=float, default=3600, help="access token lifetime"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="fraction of api requests answered with 429",
+    )
+    parser.add_argument("--total-reviews", type=int, default=1000)
+    args = parser.parse_args()
+
+    api = MockApi(
+        latency=args.latency,
+        token_ttl=args.token_ttl,
+        rate_limit=args.rate_limit,
+        total_reviews=args.total_reviews,
+    )
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
+from aiohttp import web
 from aioresponses import aioresponses
+from yarl import URL
 import asyncio
+import gzip
+import json
+import threading
+import time
 from trustpilot import async_client
+from trustpilot.cache import ResponseCache
+from trustpilot.json_codec import JsonCodec
+from trustpilot.models import Review
+from trustpilot.retry import RetryPolicy
 
 
 def test_async_client_auth_and_get():
@@ -76,3 +86,631 @@ def test_advanced_context_manager_usage():
                 assert text == '"foobar"'
 
         asyncio.run(get_response())
+
+
+def test_client_session_is_reused_and_closed():
+    with aioresponses() as m:
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200)
+        m.get("https://api.tp-staging.com/v1/foo/baz", status=200)
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+            connection_limit=10,
+            connection_limit_per_host=5,
+        )
+
+        async def get_responses():
+            async with session:
+                await session.get("/foo/bar")
+                client_session = session.get_client_session()
+                await session.get("/foo/baz")
+
+                assert session.get_client_session() is client_session
+                assert client_session.connector.limit == 10
+                assert client_session.connector.limit_per_host == 5
+
+            assert client_session.closed
+            assert not session._client_sessions
+
+        asyncio.run(get_responses())
+
+
+def test_client_session_of_a_previous_loop_is_closed():
+    with aioresponses() as m:
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200, repeat=True)
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com", api_key="something"
+        )
+
+        async def get_response():
+            await session.get("/foo/bar")
+            return session.get_client_session().connector
+
+        connectors = [asyncio.run(get_response()) for _ in range(3)]
+
+        assert [connector.closed for connector in connectors] == [True, True, False]
+        asyncio.run(session.aclose())
+        assert connectors[-1].closed
+
+
+def test_client_session_per_running_loop():
+    session = async_client.TrustpilotAsyncSession(
+        api_host="https://api.tp-staging.com", api_key="something"
+    )
+    both_created = threading.Barrier(2)
+    client_sessions = []
+
+    async def use_session():
+        client_session = session.get_client_session()
+        await asyncio.get_running_loop().run_in_executor(None, both_created.wait)
+        # the other loop's session didn't replace or close this one
+        reused = session.get_client_session() is client_session
+        client_sessions.append((client_session, reused, client_session.closed))
+        await session.aclose()
+
+    threads = [
+        threading.Thread(target=asyncio.run, args=(use_session(),)) for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    (first, *first_state), (second, *second_state) = client_sessions
+    assert first is not second
+    assert first_state == second_state == [True, False]
+    assert first.closed and second.closed
+
+
+def test_concurrent_token_refresh_is_single_flight():
+    session = async_client.TrustpilotAsyncSession(
+        api_host="https://api.tp-staging.com",
+        api_key="something",
+        api_version="v1",
+    )
+    calls = []
+
+    async def get_request_auth_headers():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        session.headers["Authorization"] = "Bearer token{}".format(len(calls))
+
+    session.get_request_auth_headers = get_request_auth_headers
+
+    async def refresh_concurrently():
+        await asyncio.gather(*(session.refresh_access_token(None) for _ in range(10)))
+        assert session.headers["Authorization"] == "Bearer token1"
+
+        # requests that failed with the already replaced token just retry
+        await session.refresh_access_token("Bearer stale")
+        assert len(calls) == 1
+
+        await session.refresh_access_token("Bearer token1")
+        assert session.headers["Authorization"] == "Bearer token2"
+
+    asyncio.run(refresh_concurrently())
+
+
+def test_token_is_refreshed_ahead_of_expiry():
+    with aioresponses() as m:
+        m.post(
+            "https://api.tp-staging.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+            payload=dict(access_token="new_token", expires_in="3600"),
+        )
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200)
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+            access_token="old_token",
+            token_refresh_skew=60,
+        )
+        session.headers["Authorization"] = "Bearer old_token"
+        session.access_token_expires_at = time.time() + 30
+
+        async def get_response():
+            async with session:
+                response = await session.get("/foo/bar")
+                await session._token_refresh_task
+
+            assert response.status == 200
+
+            assert session.access_token == "new_token"
+            assert session.access_token_expires_at > time.time() + 3000
+
+        asyncio.run(get_response())
+
+
+def test_failed_token_refresh_keeps_the_current_token():
+    token_url = "https://api.tp-staging.com/v1/oauth/oauth-business-users-for-applications/accesstoken"
+    with aioresponses() as m:
+        m.post(token_url, status=503, body="unavailable")
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200, repeat=True)
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            access_token="old_token",
+        )
+        session.headers["Authorization"] = "Bearer old_token"
+        session.access_token_expires_at = time.time() - 1
+
+        async def get_responses():
+            async with session:
+                for _ in range(5):
+                    response = await session.get("/foo/bar")
+                    assert response.status == 200
+
+        asyncio.run(get_responses())
+
+        assert session.headers["Authorization"] == "Bearer old_token"
+        # no token requests for a while after one failed
+        assert len(m.requests[("POST", URL(token_url))]) == 1
+
+
+def test_retry_on_too_many_requests():
+    with aioresponses() as m:
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=429)
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=503)
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200, payload="foobar")
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+            retry_policy=RetryPolicy(backoff_factor=0),
+        )
+
+        async def get_response():
+            async with session:
+                response = await session.get("/foo/bar")
+
+            assert response.status == 200
+            assert [attempt.status for attempt in response.retry_history] == [429, 503]
+
+        asyncio.run(get_response())
+
+
+def test_map_and_gather_requests():
+    with aioresponses() as m:
+        for number in range(5):
+            m.get(
+                "https://api.tp-staging.com/v1/foo/{}".format(number),
+                payload=dict(number=number),
+            )
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+        )
+        consumed = []
+
+        def get_specs():
+            for number in range(5):
+                consumed.append(number)
+                yield {"method": "get", "url": "/foo/{}".format(number)}
+            yield {"method": "patch", "url": "/foo/bar"}
+
+        async def get_responses():
+            async with session:
+                results = session.map(get_specs(), concurrency=2, ordered=True)
+                first = await results.__anext__()
+                # input is only consumed as requests finish
+                assert len(consumed) <= 3
+                results = [first] + [result async for result in results]
+
+            assert [result.index for result in results] == list(range(6))
+            for result in results[:5]:
+                assert (await result.response.json())["number"] == result.index
+            assert isinstance(results[5].error, RuntimeError)
+
+        asyncio.run(get_responses())
+
+
+def test_gather_requests_from_async_iterable():
+    with aioresponses() as m:
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200)
+        m.get("https://api.tp-staging.com/v1/foo/baz", status=404)
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+        )
+
+        async def get_specs():
+            yield "/foo/bar"
+            yield {"path": "/foo/baz"}
+
+        async def get_responses():
+            async with session:
+                results = await session.gather_requests(get_specs(), concurrency=5)
+
+            assert [result.response.status for result in results] == [200, 404]
+            assert [result.error for result in results] == [None, None]
+
+        asyncio.run(get_responses())
+
+
+def test_iter_items_follows_next_page_links():
+    with aioresponses() as m:
+        m.get(
+            "https://api.tp-staging.com/v1/foo/reviews?perPage=2",
+            payload={
+                "reviews": [{"id": 1}, {"id": 2}],
+                "links": [
+                    {
+                        "href": "https://api.tp-staging.com/v1/foo/reviews?page=2",
+                        "rel": "next-page",
+                    }
+                ],
+            },
+        )
+        m.get(
+            "https://api.tp-staging.com/v1/foo/reviews?page=2",
+            payload={"reviews": [{"id": 3}], "links": []},
+        )
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+        )
+
+        async def get_items():
+            async with session:
+                items = [
+                    review.id
+                    async for review in session.iter_items(
+                        "/foo/reviews", params={"perPage": 2}, model=Review
+                    )
+                ]
+            assert items == [1, 2, 3]
+
+        asyncio.run(get_items())
+
+
+def test_json_codec_encodes_and_decodes_bodies():
+    calls = []
+
+    class RecordingCodec(JsonCodec):
+        name = "recording"
+
+        def dumps(self, obj, indent=False):
+            calls.append("dumps")
+            return super().dumps(obj, indent)
+
+        def loads(self, data):
+            calls.append("loads")
+            return super().loads(data)
+
+    with aioresponses() as m:
+        m.post("https://api.tp-staging.com/v1/foo/bar", payload={"id": "1"})
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+            json_codec=RecordingCodec(),
+        )
+
+        async def post():
+            async with session:
+                response = await session.post("/foo/bar", json={"stars": 5})
+                assert await response.json() == {"id": "1"}
+
+        asyncio.run(post())
+
+        assert calls == ["dumps", "loads"]
+        ((_, request),) = m.requests.items()
+        assert request[0].kwargs["data"] == b'{"stars": 5}'
+        assert request[0].kwargs["headers"]["Content-Type"] == "application/json"
+
+
+def test_hooks_and_metrics():
+    with aioresponses() as m:
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=401)
+        m.post(
+            "https://api.tp-staging.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+            payload=dict(access_token="foobarbaz"),
+        )
+        m.get("https://api.tp-staging.com/v1/foo/bar", payload=dict(foo="bar"))
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+        )
+        responses = []
+        metrics = []
+
+        def add_header(session, method, url, headers):
+            headers["X-Request-Id"] = "1"
+
+        async def post_hook(session, response):
+            responses.append(response)
+
+        session.register_pre_hook(add_header)
+        session.register_post_hook(post_hook)
+        session.register_metrics_hook(metrics.append)
+
+        async def get():
+            async with session:
+                return await session.get("/foo/bar")
+
+        response = asyncio.run(get())
+
+        assert responses == [response]
+        for request in m.requests[
+            ("GET", URL("https://api.tp-staging.com/v1/foo/bar"))
+        ]:
+            assert request.kwargs["headers"]["X-Request-Id"] == "1"
+        (request_metrics,) = metrics
+        assert request_metrics.method == "GET"
+        assert request_metrics.status == 200
+        assert request_metrics.reauthentications == 1
+        assert request_metrics.retries == 0
+        assert request_metrics.duration > 0
+
+
+def test_metrics_timings():
+    async def handler(request):
+        return web.Response(body=b"x" * 1000)
+
+    async def get():
+        app = web.Application()
+        app.router.add_get("/v1/foo", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="http://{}:{}".format(host, port),
+            api_key="something",
+            api_version="v1",
+        )
+        metrics = []
+        session.register_metrics_hook(metrics.append)
+        try:
+            async with session:
+                await session.get("/foo")
+                await session.get("/foo")
+        finally:
+            await runner.cleanup()
+        return metrics
+
+    first, second = asyncio.run(get())
+
+    assert first.status == 200
+    assert first.connect > 0
+    assert 0 < first.ttfb < first.duration
+    assert first.body_read >= 0
+    assert first.response_size == 1000
+    # the second request reuses the pooled connection
+    assert second.connect is None
+
+
+def test_compression():
+    page = json.dumps({"reviews": [{"id": id} for id in range(1000)]}).encode("utf-8")
+    body = gzip.compress(page)
+    seen = []
+
+    async def get_reviews(request):
+        seen.append(request.headers["Accept-Encoding"])
+        return web.Response(
+            body=body,
+            content_type="application/json",
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    async def post_invitations(request):
+        seen.append(request.headers.get("Content-Encoding"))
+        # aiohttp decompresses request bodies
+        return web.json_response(await request.json())
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/v1/reviews", get_reviews)
+        app.router.add_post("/v1/invitations", post_invitations)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="http://{}:{}".format(host, port),
+            api_key="something",
+            api_version="v1",
+            request_compression_min_size=100,
+        )
+        metrics = []
+        session.register_metrics_hook(metrics.append)
+        try:
+            async with session:
+                items = [
+                    item
+                    async for item in session.iter_json_items("/reviews", chunk_size=64)
+                ]
+                response = await session.get("/reviews")
+                assert await response.json() == json.loads(page)
+                response = await session.post(
+                    "/invitations", json={"ids": list(range(100))}
+                )
+                assert await response.json() == {"ids": list(range(100))}
+        finally:
+            await runner.cleanup()
+        return items, metrics
+
+    items, (streamed, read, posted) = asyncio.run(run())
+
+    assert [item["id"] for item in items] == list(range(1000))
+    assert "gzip" in seen[0] and "gzip" in seen[1]
+    assert seen[2] == "gzip"
+    assert streamed.response_wire_size == read.response_wire_size == len(body)
+    assert streamed.response_size == read.response_size == len(page)
+
+
+def test_iter_json_items_streams_the_response():
+    with aioresponses() as m:
+        m.get(
+            "https://api.tp-staging.com/v1/foo/reviews",
+            payload={"links": [], "reviews": [{"id": id} for id in range(100)]},
+        )
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+        )
+
+        async def get_items():
+            async with session:
+                items = [
+                    item["id"]
+                    async for item in session.iter_json_items(
+                        "/foo/reviews", chunk_size=16
+                    )
+                ]
+            assert items == list(range(100))
+
+        asyncio.run(get_items())
+
+
+def test_iter_pages_concurrently_with_total_count():
+    with aioresponses() as m:
+        m.get(
+            "https://api.tp-staging.com/v1/foo/reviews",
+            payload={"totalCount": 5, "reviews": [{"id": 1}, {"id": 2}]},
+        )
+        m.get(
+            "https://api.tp-staging.com/v1/foo/reviews?page=2",
+            payload={"totalCount": 5, "reviews": [{"id": 3}, {"id": 4}]},
+        )
+        m.get(
+            "https://api.tp-staging.com/v1/foo/reviews?page=3",
+            payload={"totalCount": 5, "reviews": [{"id": 5}]},
+        )
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+        )
+
+        async def get_pages():
+            async with session:
+                pages = [
+                    page
+                    async for page in session.iter_pages("/foo/reviews", concurrency=3)
+                ]
+            assert [review["id"] for page in pages for review in page["reviews"]] == [
+                1,
+                2,
+                3,
+                4,
+                5,
+            ]
+
+        asyncio.run(get_pages())
+
+
+def test_response_cache():
+    with aioresponses() as m:
+        m.get(
+            "https://api.tp-staging.com/v1/foo/bar",
+            payload={"foo": "bar"},
+            headers={"Cache-Control": "max-age=60"},
+        )
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+            response_cache=ResponseCache(),
+        )
+
+        async def get_responses():
+            async with session:
+                response = await session.get("/foo/bar")
+                cached_response = await session.get("/foo/bar")
+
+            assert not response.from_cache
+            assert cached_response.from_cache
+            assert cached_response.status == 200
+            assert await cached_response.json() == {"foo": "bar"}
+            assert session.response_cache.stats["hits"] == 1
+
+        asyncio.run(get_responses())
+
+
+def test_identical_gets_are_coalesced():
+    with aioresponses() as m:
+        m.get("https://api.tp-staging.com/v1/foo/bar", payload={"foo": "bar"})
+        m.get("https://api.tp-staging.com/v1/foo/baz", payload={"foo": "baz"})
+
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://api.tp-staging.com",
+            api_key="something",
+            api_version="v1",
+            coalesce_requests=True,
+        )
+
+        async def get_responses():
+            async with session:
+                responses = await asyncio.gather(
+                    *[session.get("/foo/bar") for _ in range(5)],
+                    session.get("/foo/baz")
+                )
+
+            assert all(response is responses[0] for response in responses[:5])
+            assert await responses[4].json() == {"foo": "bar"}
+            assert await responses[5].json() == {"foo": "baz"}
+            assert session._inflight_requests == {}
+
+        asyncio.run(get_responses())
+
+
+def test_session_pool():
+    with aioresponses() as m:
+        m.post(
+            "https://api.tp-staging.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+            payload=dict(access_token="first", expires_in="3600"),
+        )
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=401)
+        m.get("https://api.tp-staging.com/v1/foo/bar", status=200)
+
+        async def run():
+            async with async_client.AsyncSessionPool(
+                max_sessions=2, api_host="https://api.tp-staging.com", api_key="key"
+            ) as pool:
+                first = await pool.get(username="first", password="password")
+                second = await pool.get(username="second", password="password")
+                assert await pool.get(username="first", password="password") is first
+                assert first is not second
+
+                await first.get("/foo/bar")
+                assert first.access_token == "first"
+                assert await pool.get(username="first", password="password") is first
+                assert first.access_token == "first"
+                assert first.get_client_session().connector is pool.connector
+                assert second.get_client_session().connector is pool.connector
+
+                # second is the least recently used and is closed
+                client_session = second.get_client_session()
+                await pool.get(username="third", password="password")
+                assert len(pool) == 2
+                assert client_session.closed
+                assert not pool.connector.closed
+
+                connector = pool.connector
+            assert connector.closed
+            assert len(pool) == 0
+
+        asyncio.run(run())
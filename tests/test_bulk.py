@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import pytest
+import responses
+from aioresponses import aioresponses
+
+from trustpilot import async_client, client
+from trustpilot.bulk import (
+    AsyncBulkSender,
+    BulkFailure,
+    BulkSender,
+    Checkpoint,
+    email_invitations,
+)
+
+INVITATIONS_URL = (
+    "https://invitations.com/v1/private/business-units/bu/email-invitations"
+)
+
+
+def get_invitations(count):
+    return [
+        {"consumerEmail": "{}@example.com".format(number), "referenceNumber": number}
+        for number in range(count)
+    ]
+
+
+def invitation_callback(request):
+    # invitations with reference number 3 are rejected
+    invitation = json.loads(request.body)
+    if invitation["referenceNumber"] == 3:
+        return (400, {}, '{"message": "invalid email"}')
+    return (202, {}, "{}")
+
+
+def create_session(**kwargs):
+    return client.TrustpilotSession(
+        api_host="https://hostname.com", api_key="key", access_token="token", **kwargs
+    )
+
+
+def test_checkpoint_keeps_done_records_compact(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    checkpoint.add([0, 1, 3])
+    checkpoint.add([5], [BulkFailure(5, {"a": 1}, 400, "invalid")])
+
+    checkpoint = Checkpoint(path)
+    assert checkpoint.done_below == 2
+    assert checkpoint.done == {3, 5}
+    assert [checkpoint.is_done(index) for index in range(6)] == [
+        True,
+        True,
+        False,
+        True,
+        False,
+        True,
+    ]
+    assert checkpoint.failures == [BulkFailure(5, {"a": 1}, 400, "invalid")]
+    # failures are appended to their own file
+    with open(path) as checkpoint_file:
+        assert "failures" not in json.load(checkpoint_file)
+    with open(checkpoint.failures_path) as failures_file:
+        assert len(failures_file.readlines()) == 1
+
+    checkpoint.add([2, 4])
+    assert checkpoint.done_below == 6
+    assert checkpoint.done == set()
+
+    # a failure written before a crash, of a record that is sent again
+    with open(checkpoint.failures_path, "a") as failures_file:
+        failures_file.write(
+            json.dumps(BulkFailure(7, {"a": 2}, 500, "error")._asdict()) + "\n"
+        )
+        failures_file.write('{"index": 8, "rec')
+    checkpoint = Checkpoint(path)
+    assert checkpoint.failures == [BulkFailure(5, {"a": 1}, 400, "invalid")]
+    checkpoint.add([6], [BulkFailure(6, {"a": 3}, 400, "invalid")])
+    assert len(Checkpoint(path).failures) == 2
+
+
+@responses.activate
+def test_bulk_sender_reports_failures_and_resumes(tmp_path):
+    responses.add_callback(
+        responses.POST, INVITATIONS_URL, callback=invitation_callback
+    )
+    path = str(tmp_path / "checkpoint.json")
+    create_request = email_invitations("bu", host="https://invitations.com")
+    invitations = get_invitations(10)
+
+    def crash_after_six():
+        for invitation in invitations[:6]:
+            yield invitation
+        raise KeyboardInterrupt()
+
+    sender = BulkSender(
+        create_session(), create_request, concurrency=1, checkpoint=path
+    )
+    with pytest.raises(KeyboardInterrupt):
+        sender.send(crash_after_six())
+    # the request in flight when the job crashed is not checkpointed
+    sent_before_crash = len(responses.calls)
+    assert sent_before_crash in (5, 6)
+
+    sender = BulkSender(create_session(), create_request, checkpoint=path)
+    result = sender.send(invitations)
+
+    assert len(responses.calls) == sent_before_crash + 5
+    assert result.sent == 5
+    assert result.skipped == 5
+    (failure,) = result.failures
+    assert failure.index == 3
+    assert failure.record == invitations[3]
+    assert failure.status == 400
+    assert "invalid email" in failure.error
+
+    # everything is done
+    result = BulkSender(create_session(), create_request, checkpoint=path).send(
+        invitations
+    )
+    assert (result.sent, result.skipped, len(result.failures)) == (0, 10, 1)
+    assert len(responses.calls) == sent_before_crash + 5
+
+
+@responses.activate
+def test_bulk_sender_batches_records():
+    responses.add(responses.POST, "https://hostname.com/v1/bulk", status=201)
+    sender = BulkSender(
+        create_session(),
+        lambda records: {"method": "post", "path": "/bulk", "json": records},
+        batch_size=4,
+    )
+
+    result = sender.send(range(10))
+
+    assert result == (10, 0, [])
+    batches = sorted(json.loads(call.request.body) for call in responses.calls)
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_async_bulk_sender_reports_failures_and_resumes(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    create_request = email_invitations("bu", host="https://invitations.com")
+    invitations = get_invitations(5)
+
+    async def iter_invitations():
+        for invitation in invitations:
+            yield invitation
+
+    async def send():
+        session = async_client.TrustpilotAsyncSession(
+            api_host="https://hostname.com", api_key="key", access_token="token"
+        )
+        async with session:
+            sender = AsyncBulkSender(session, create_request, checkpoint=path)
+            return await sender.send(iter_invitations())
+
+    with aioresponses() as m:
+        m.post(INVITATIONS_URL, status=202, payload={})
+        m.post(INVITATIONS_URL, status=202, payload={})
+        m.post(INVITATIONS_URL, exception=ConnectionResetError("reset"))
+        m.post(INVITATIONS_URL, status=400, payload={"message": "invalid email"})
+        m.post(INVITATIONS_URL, status=202, payload={})
+        result = asyncio.run(send())
+
+    assert result.sent == 3
+    assert result.skipped == 0
+    assert sorted(failure.status or 0 for failure in result.failures) == [0, 400]
+    assert any("ConnectionResetError" in failure.error for failure in result.failures)
+
+    with aioresponses():
+        result = asyncio.run(send())
+    assert (result.sent, result.skipped, len(result.failures)) == (0, 5, 2)
@@ -0,0 +1,185 @@
+import tempfile
+import time
+
+import responses
+
+from trustpilot import client
+from trustpilot.cache import (
+    CacheEntry,
+    FileCacheBackend,
+    MemoryCacheBackend,
+    ResponseCache,
+)
+
+
+def test_expiry_from_cache_headers():
+    cache = ResponseCache(default_ttl=10)
+    now = time.time()
+
+    assert cache.get_expiry({"Cache-Control": "public, max-age=60"}, now) == now + 60
+    assert cache.get_expiry({"cache-control": "no-store"}, now) is None
+    assert cache.get_expiry({"Cache-Control": "no-cache"}, now) == now
+    assert cache.get_expiry({"Vary": "*"}, now) is None
+    assert cache.get_expiry({}, now) == now + 10
+    assert cache.get_expiry({"Expires": "Thu, 01 Jan 1970 00:00:10 GMT"}, now) == 10
+
+
+def test_authorization_is_only_part_of_private_keys():
+    cache = ResponseCache()
+    public_url = "https://api.trustpilot.com/v1/business-units/1"
+    private_url = "https://api.trustpilot.com/v1/private/business-units/1"
+
+    assert cache.get_key(public_url, headers={"Authorization": "Bearer a"}) == (
+        cache.get_key(public_url, headers={"Authorization": "Bearer b"})
+    )
+    assert cache.get_key(private_url, headers={"Authorization": "Bearer a"}) != (
+        cache.get_key(private_url, headers={"Authorization": "Bearer b"})
+    )
+    assert cache.get_key(public_url, {"page": 1}) != cache.get_key(public_url)
+
+
+def test_responses_are_stored_under_the_headers_they_vary_on():
+    cache = ResponseCache(default_ttl=60)
+    key = cache.get_key("https://api.trustpilot.com/v1/business-units/1")
+    english = {"Accept-Language": "en", "Authorization": "Bearer a"}
+    danish = {"Accept-Language": "da", "Authorization": "Bearer a"}
+
+    cache.store(key, "url", 200, {"Vary": "Accept-Language"}, b"en", english)
+    cache.store(key, "url", 200, {"Vary": "Accept-Language"}, b"da", danish)
+
+    assert cache.lookup(key, english)[0].body == b"en"
+    assert cache.lookup(key, danish)[0].body == b"da"
+    assert cache.lookup(key, {"Accept-Language": "de"}) == (None, False)
+
+
+def test_private_responses_are_stored_under_the_authorization():
+    cache = ResponseCache(default_ttl=60)
+    key = cache.get_key("https://api.trustpilot.com/v1/business-units/1")
+    headers = {"Cache-Control": "private, max-age=60"}
+
+    cache.store(key, "url", 200, headers, b"a", {"Authorization": "Bearer a"})
+
+    assert cache.lookup(key, {"Authorization": "Bearer a"})[0].body == b"a"
+    assert cache.lookup(key, {"Authorization": "Bearer b"}) == (None, False)
+    assert cache.lookup(key) == (None, False)
+    assert cache.store(key, "url", 200, {"Vary": "Accept, *"}, b"a") is None
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2, max_bytes=10)
+    for key, body in [("a", b"1"), ("b", b"22"), ("c", b"333")]:
+        backend.set(key, CacheEntry("url", 200, {}, body, 0))
+        backend.get("a")
+
+    assert backend.get("b") is None
+    assert backend.get("a").body == b"1"
+
+    backend.set("d", CacheEntry("url", 200, {}, b"4444444444", 0))
+    assert len(backend) == 1
+
+
+def test_stale_entries_are_revalidated_or_dropped():
+    cache = ResponseCache()
+    cache.store("etag", "url", 200, {"ETag": '"v1"'}, b"body")
+    cache.store("plain", "url", 200, {}, b"body")
+
+    entry, fresh = cache.lookup("etag")
+    assert not fresh
+    assert cache.get_conditional_headers(entry) == {"If-None-Match": '"v1"'}
+    assert cache.lookup("plain") == (None, False)
+
+    entry = cache.revalidate("etag", entry, {"Cache-Control": "max-age=60"})
+    assert cache.lookup("etag") == (entry, True)
+    assert cache.stats == {"hits": 1, "misses": 2, "revalidations": 1}
+
+
+def test_file_backend():
+    with tempfile.TemporaryDirectory() as directory:
+        backend = FileCacheBackend(directory, max_bytes=250)
+        backend.set("a", CacheEntry("url", 200, {"ETag": "x"}, b"\x00body\n", 12))
+
+        entry = FileCacheBackend(directory).get("a")
+        assert (entry.url, entry.status, entry.body, entry.etag) == (
+            "url",
+            200,
+            b"\x00body\n",
+            "x",
+        )
+
+        backend.set("v", CacheEntry("url", 0, {}, b"", float("inf"), ["accept"]))
+        assert FileCacheBackend(directory).get("v").vary == ("accept",)
+
+        backend.set("b", CacheEntry("url", 200, {}, b"x" * 150, 12))
+        assert backend.get("a") is None
+        assert backend.get("missing") is None
+
+
+@responses.activate
+def test_session_serves_and_revalidates_cached_responses():
+    with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+        url = "https://hostname.com/v1/business-units/1"
+        rsps.add(
+            responses.GET,
+            url,
+            body="bar",
+            headers={"Cache-Control": "max-age=0", "ETag": '"v1"'},
+        )
+        rsps.add(
+            responses.GET,
+            url,
+            status=304,
+            headers={"Cache-Control": "max-age=60"},
+            match=[responses.matchers.header_matcher({"If-None-Match": '"v1"'})],
+        )
+        session = client.TrustpilotSession(
+            api_host="https://hostname.com",
+            api_key="key",
+            response_cache=ResponseCache(),
+        )
+
+        first = session.get("/business-units/1")
+        revalidated = session.get("/business-units/1")
+        cached = session.get("/business-units/1")
+
+        assert [first.text, revalidated.text, cached.text] == ["bar"] * 3
+        assert [first.from_cache, revalidated.from_cache, cached.from_cache] == [
+            False,
+            True,
+            True,
+        ]
+        assert session.response_cache.stats == {
+            "hits": 1,
+            "misses": 1,
+            "revalidations": 1,
+        }
+
+
+@responses.activate
+def test_session_keeps_private_responses_to_their_authorization():
+    with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+        url = "https://hostname.com/v1/business-units/1"
+        for body in ["a", "b"]:
+            rsps.add(
+                responses.GET,
+                url,
+                body=body,
+                headers={"Cache-Control": "private, max-age=60"},
+                match=[
+                    responses.matchers.header_matcher(
+                        {"Authorization": "Bearer " + body}
+                    )
+                ],
+            )
+        session = client.TrustpilotSession(
+            api_host="https://hostname.com",
+            api_key="key",
+            response_cache=ResponseCache(),
+        )
+
+        bodies = []
+        for token in ["a", "b", "a"]:
+            session.headers["Authorization"] = "Bearer " + token
+            bodies.append(session.get("/business-units/1").text)
+
+        assert bodies == ["a", "b", "a"]
+        assert session.response_cache.stats["hits"] == 1
@@ -1,4 +1,5 @@
 import json
+import requests
 from click.testing import CliRunner
 
 try:
@@ -9,6 +10,7 @@ import unittest
 
 
 from trustpilot.cli import cli
+from trustpilot.utils import BatchResult
 
 
 _creds_list = [
@@ -103,6 +105,45 @@ class TestCliMethodsJsonOutput(unittest.TestCase):
         result = self.runner.invoke(cli, _creds_list + ["create-access-token"])
         self.assert_output_equal(result.output, "access_token")
 
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    def test_token_cache(self, client_mock):
+        client_mock.default_session.access_token = "access_token"
+        self.runner.invoke(
+            cli,
+            _creds_list + ["--token_cache", "tokens.json", "create-access-token"],
+        )
+        token_cache = client_mock.default_session.setup.call_args[1]["token_cache"]
+        assert token_cache.path == "tokens.json"
+
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    @mock.patch("trustpilot.cli.auth")
+    def test_json_codec(self, auth_mock, client_mock):
+        client_mock.get.return_value = self.response_mock
+
+        for codec in ["json", "auto"]:
+            result = self.runner.invoke(
+                cli,
+                _creds_list
+                + ["--json_codec", codec, "get", "/v1/business-units/1/reviews"],
+            )
+            self.assert_output_equal(result.output, self.expected_output)
+            json_codec = client_mock.default_session.setup.call_args[1]["json_codec"]
+            assert codec in (json_codec.name, "auto")
+
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    @mock.patch("trustpilot.cli.auth")
+    def test_default_json_output_escapes_non_ascii(self, auth_mock, client_mock):
+        self.response_mock.json.return_value = {"name": "Trustpilot K\u00f8benhavn"}
+        client_mock.get.return_value = self.response_mock
+
+        result = self.runner.invoke(
+            cli, _creds_list + ["get", "/v1/business-units/1/reviews"]
+        )
+
+        assert '"name": "Trustpilot K\\u00f8benhavn"' in result.output
+        json_codec = client_mock.default_session.setup.call_args[1]["json_codec"]
+        assert json_codec.name == "json"
+
     @mock.patch("trustpilot.cli.client", autospec=True)
     @mock.patch("trustpilot.cli.auth")
     def test_no_verbosity_with_get(self, auth_mock, client_mock):
@@ -179,6 +220,104 @@ class TestCliMethodsJsonOutput(unittest.TestCase):
 
         self.assert_output_equal(result.output, self.expected_output)
 
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    def test_batch(self, client_mock):
+        requests = []
+
+        def map_specs(specs, max_workers, ordered):
+            assert (max_workers, ordered) == (3, True)
+            for index, spec in enumerate(specs):
+                requests.append(spec)
+                if spec["path"] == "/fails":
+                    yield BatchResult(index, spec, None, ConnectionError("refused"))
+                else:
+                    yield BatchResult(index, spec, self.response_mock, None)
+
+        client_mock.default_session.map.side_effect = map_specs
+        lines = [
+            {"path": "/v1/business-units/1"},
+            {},
+            {"method": "post", "path": "/invitations", "data": {"foo": "bar"}},
+            {"method": "post", "path": "/raw", "data": "raw"},
+            {"path": "/fails"},
+        ]
+        input = "\n".join(json.dumps(line) if line else "" for line in lines)
+
+        result = self.runner.invoke(
+            cli,
+            _creds_list + ["batch", "--concurrency", "3", "--ordered"],
+            input=input + "\nnot json\n",
+        )
+
+        assert requests == [
+            {"path": "/v1/business-units/1"},
+            {"method": "post", "path": "/invitations", "json": {"foo": "bar"}},
+            {"method": "post", "path": "/raw", "data": "raw"},
+            {"path": "/fails"},
+        ]
+        outputs = [json.loads(line) for line in result.output.splitlines()]
+        assert [output["line"] for output in outputs] == [1, 3, 4, 5, 6]
+        assert outputs[0] == {
+            "line": 1,
+            "url": self.response_mock.url,
+            "status": 401,
+            "content": self.response_mock.json.return_value,
+        }
+        assert outputs[3] == {"line": 5, "error": "ConnectionError: refused"}
+        assert outputs[4]["error"].startswith("invalid request line")
+
+        result = self.runner.invoke(
+            cli, _creds_list + ["batch", "--concurrency", "0"], input=input
+        )
+        assert result.exit_code == 2
+        assert "--concurrency" in result.output
+
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    def test_ndjson_output(self, client_mock):
+        client_mock.get.return_value = self.response_mock
+
+        result = self.runner.invoke(
+            cli, _creds_list + ["-of", "ndjson", "get", "/v1/business-units/1"]
+        )
+
+        (line,) = result.output.splitlines()
+        assert json.loads(line) == json.loads(self.expected_output)
+
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    def test_get_paginate(self, client_mock):
+        reviews = [{"id": str(number), "stars": 5} for number in range(3)]
+        client_mock.default_session.iter_items.return_value = iter(reviews)
+
+        result = self.runner.invoke(
+            cli,
+            _creds_list
+            + ["get", "/v1/business-units/1/reviews", "--paginate"]
+            + ["--items-key", "reviews"],
+        )
+
+        client_mock.default_session.iter_items.assert_called_once_with(
+            "/v1/business-units/1/reviews", items_key="reviews"
+        )
+        # one compact json line per item
+        assert [json.loads(line) for line in result.output.splitlines()] == reviews
+
+    @mock.patch("trustpilot.cli.client", autospec=True)
+    def test_get_paginate_error(self, client_mock):
+        def iter_items(url, items_key):
+            yield {"id": "0"}
+            raise requests.HTTPError(response=self.response_mock)
+
+        client_mock.default_session.iter_items.side_effect = iter_items
+
+        result = self.runner.invoke(
+            cli, _creds_list + ["get", "/v1/business-units/1/reviews", "--paginate"]
+        )
+
+        assert result.exit_code == 1
+        item, error = result.output.split("\n", 1)
+        assert json.loads(item) == {"id": "0"}
+        assert json.loads(error)["status"] == 401
+
 
 class TestCliMethodsRawOutput(unittest.TestCase):
     def setUp(self):
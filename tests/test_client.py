@@ -2,11 +2,21 @@ try:
     from unittest import mock
 except ImportError:
     import mock
+import gzip
+import http.server
 import unittest
+import requests
 import responses
 import json
+import pytest
+import threading
+import time
+from urllib3.util.request import ACCEPT_ENCODING
 
-from trustpilot import client
+from trustpilot import client, compression
+from trustpilot.json_codec import JsonCodec
+from trustpilot.models import Review
+from trustpilot.retry import RetryPolicy
 
 
 def assert_not_called(mock):
@@ -17,6 +27,95 @@ def assert_called_once(mock):
     assert mock.call_count == 1
 
 
+class OkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class RateLimitedHandler(http.server.BaseHTTPRequestHandler):
+    # answers every other request with a 429, counting the connections made
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    requests = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def respond(self):
+        type(self).requests += 1
+        status, body = (429, b"slow down") if self.requests % 2 else (200, b"ok")
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.respond()
+
+    def log_message(self, *args):
+        pass
+
+
+class GzipHandler(http.server.BaseHTTPRequestHandler):
+    # a gzipped page of reviews, and echoes how request bodies were sent
+    protocol_version = "HTTP/1.1"
+    body = gzip.compress(
+        json.dumps({"reviews": [{"id": id} for id in range(1000)]}).encode("utf-8")
+    )
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.send_header("X-Accept-Encoding", self.headers["Accept-Encoding"])
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers["Content-Encoding"] == "gzip":
+            body = gzip.decompress(body)
+        response = json.dumps(
+            {"encoding": self.headers["Content-Encoding"], "body": json.loads(body)}
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingCodec(JsonCodec):
+    name = "recording"
+
+    def __init__(self):
+        self.calls = []
+
+    def dumps(self, obj, indent=False):
+        self.calls.append("dumps")
+        return super(RecordingCodec, self).dumps(obj, indent)
+
+    def loads(self, data):
+        self.calls.append("loads")
+        return super(RecordingCodec, self).loads(data)
+
+
 class TestCliMethods(unittest.TestCase):
     def setUp(self):
         self.api_host = "https://hostname.com"
@@ -220,3 +319,523 @@ class TestCliMethods(unittest.TestCase):
             assert res.status_code == 200
             assert double_res.status_code == 404
             assert full_url_res.status_code == 200
+
+    def test_concurrent_token_refresh_is_single_flight(self):
+        session = client.TrustpilotSession(api_host=self.api_host, api_key=self.api_key)
+        calls = []
+
+        def get_request_auth_headers():
+            calls.append(1)
+            time.sleep(0.01)
+            session.headers["Authorization"] = "Bearer token{}".format(len(calls))
+            return session.headers
+
+        session.get_request_auth_headers = get_request_auth_headers
+        threads = [
+            threading.Thread(target=session.refresh_access_token, args=(None,))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert session.headers["Authorization"] == "Bearer token1"
+
+        session.refresh_access_token("Bearer token1")
+        assert len(calls) == 2
+
+    @responses.activate
+    def test_token_is_refreshed_ahead_of_expiry(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(
+                responses.POST,
+                "https://hostname.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+                body='{"access_token":"expired_token","expires_in":"3600"}',
+                status=200,
+            )
+            rsps.add(
+                responses.POST,
+                "https://hostname.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+                body='{"access_token":"access_token","expires_in":"3600"}',
+                status=200,
+            )
+            rsps.add(
+                responses.GET, "https://hostname.com/v1/this/1", body="bar", status=200
+            )
+
+            session = self.session
+            session.get_request_auth_headers()
+            assert session.access_token_expires_at > time.time() + 3000
+
+            # an expired token is refreshed before sending instead of after a 401
+            session.access_token_expires_at = time.time() - 1
+            response = session.get(self.request_url)
+
+            headers = dict(response.request.headers)
+            assert response.text == "bar"
+            assert all(value == headers[key] for key, value in self.exp_headers.items())
+
+    @responses.activate
+    def test_failed_token_refresh_keeps_the_current_token(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            token_url = "https://hostname.com/v1/oauth/oauth-business-users-for-applications/accesstoken"
+            rsps.add(
+                responses.POST,
+                token_url,
+                body='{"access_token":"access_token","expires_in":"3600"}',
+                status=200,
+            )
+            rsps.add(responses.POST, token_url, body="unavailable", status=503)
+            rsps.add(
+                responses.GET, "https://hostname.com/v1/this/1", body="bar", status=200
+            )
+
+            session = self.session
+            session.get_request_auth_headers()
+            expires_at = session.access_token_expires_at = time.time() + 30
+            response = session.get(self.request_url)
+            # the refresh runs in the background
+            for _ in range(100):
+                if len(rsps.calls) == 3:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.01)
+
+            assert response.text == "bar"
+            assert session.headers["Authorization"] == "Bearer access_token"
+            assert session.access_token == "access_token"
+            assert session.access_token_expires_at == expires_at
+
+            # no token requests for a while after one failed, even once expired
+            for expires_at in (time.time() + 30, time.time() - 1):
+                session.access_token_expires_at = expires_at
+                for _ in range(5):
+                    session.get(self.request_url)
+            time.sleep(0.01)
+            token_requests = [
+                call for call in rsps.calls if call.request.url == token_url
+            ]
+            assert len(token_requests) == 2
+
+    @responses.activate
+    def test_retry_on_server_error(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(responses.GET, "https://hostname.com/v1/this/1", status=502)
+            rsps.add(
+                responses.GET,
+                "https://hostname.com/v1/this/1",
+                status=429,
+                headers={"Retry-After": "0"},
+            )
+            rsps.add(
+                responses.GET, "https://hostname.com/v1/this/1", body="bar", status=200
+            )
+            session = self.session
+            session.retry_policy = RetryPolicy(backoff_factor=0)
+            hook_mock = mock.Mock()
+            session.register_post_hook(hook_mock.post_hook)
+
+            response = session.get(self.request_url)
+
+            assert response.text == "bar"
+            assert_called_once(hook_mock.post_hook)
+            assert [attempt.status for attempt in response.retry_history] == [502, 429]
+
+    @responses.activate
+    def test_no_retry_of_post_on_server_error(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(responses.POST, "https://hostname.com/v1/this/1", status=503)
+            session = self.session
+            session.retry_policy = RetryPolicy(backoff_factor=0)
+
+            response = session.post(self.request_url, data="foo")
+
+            assert response.status_code == 503
+            assert response.retry_history == []
+
+    @responses.activate
+    def test_map_and_gather_requests(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            for number in range(5):
+                rsps.add(
+                    responses.GET,
+                    "https://hostname.com/v1/this/{}".format(number),
+                    body=str(number),
+                )
+            session = client.TrustpilotSession(
+                api_host=self.api_host, api_key=self.api_key, pool_maxsize=2
+            )
+            adapter = session.get_adapter("https://hostname.com")
+            specs = [{"url": "/this/{}".format(number)} for number in range(5)]
+            specs.append({"method": "get", "url": "/this/{}", "foo": "bar"})
+
+            with mock.patch.object(adapter, "close") as close:
+                results = session.gather_requests(specs, max_workers=4)
+                # the replaced adapter may still be used by other threads
+                assert_not_called(close)
+                session.close()
+                assert_called_once(close)
+
+            assert session.pool_maxsize == 4
+            assert session.get_adapter("https://hostname.com")._pool_maxsize == 4
+            assert [result.index for result in results] == list(range(6))
+            assert [result.response.text for result in results[:5]] == [
+                "0",
+                "1",
+                "2",
+                "3",
+                "4",
+            ]
+            assert isinstance(results[5].error, TypeError)
+
+            ordered = list(session.map(specs[:5], max_workers=2, ordered=True))
+            assert [result.response.text for result in ordered] == [
+                "0",
+                "1",
+                "2",
+                "3",
+                "4",
+            ]
+
+    @responses.activate
+    def test_iter_pages_and_items(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            next_page = "https://hostname.com/v1/this/reviews?page=2&perPage=2"
+            rsps.add(
+                responses.GET,
+                "https://hostname.com/v1/this/reviews",
+                json={
+                    "reviews": [{"id": 1}, {"id": 2}],
+                    "links": [{"href": next_page, "method": "GET", "rel": "next-page"}],
+                },
+                match=[responses.matchers.query_param_matcher({"perPage": "2"})],
+            )
+            rsps.add(
+                responses.GET,
+                "https://hostname.com/v1/this/reviews",
+                json={"reviews": [{"id": 3}], "links": []},
+                match=[
+                    responses.matchers.query_param_matcher(
+                        {"page": "2", "perPage": "2"}
+                    )
+                ],
+            )
+            session = self.session
+
+            items = session.iter_items("/this/reviews", params={"perPage": 2})
+
+            assert [item["id"] for item in items] == [1, 2, 3]
+
+    @responses.activate
+    def test_iter_pages_raises_http_errors(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(responses.GET, "https://hostname.com/v1/this/reviews", status=404)
+            session = self.session
+
+            with self.assertRaises(client.requests.HTTPError):
+                list(session.iter_pages("/this/reviews"))
+
+    @responses.activate
+    def test_iter_items_concurrently_with_total_count(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            pages = [
+                ({"perPage": "2"}, [1, 2]),
+                ({"perPage": "2", "page": "2"}, [3, 4]),
+                ({"perPage": "2", "page": "3"}, [5]),
+            ]
+            for query, ids in pages:
+                rsps.add(
+                    responses.GET,
+                    "https://hostname.com/v1/this/reviews",
+                    json={"total": 5, "reviews": [{"id": id} for id in ids]},
+                    match=[responses.matchers.query_param_matcher(query)],
+                )
+            session = self.session
+
+            items = session.iter_items(
+                "/this/reviews", concurrency=2, params={"perPage": 2}
+            )
+
+            assert [item["id"] for item in items] == [1, 2, 3, 4, 5]
+
+    def test_iter_items_concurrently_with_paging_in_the_url(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            pages = [
+                ({"perPage": "2", "page": "2", "stars": "5"}, [3, 4]),
+                ({"perPage": "2", "page": "3", "stars": "5"}, [5]),
+            ]
+            for query, ids in pages:
+                rsps.add(
+                    responses.GET,
+                    "https://hostname.com/v1/this/reviews",
+                    json={"total": 5, "reviews": [{"id": id} for id in ids]},
+                    match=[responses.matchers.query_param_matcher(query)],
+                )
+
+            items = self.session.iter_items(
+                "/this/reviews?perPage=2&page=2",
+                concurrency=2,
+                params={"stars": 5},
+            )
+
+            assert [item["id"] for item in items] == [3, 4, 5]
+
+    def test_json_codec_encodes_and_decodes_bodies(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(
+                responses.POST,
+                "https://hostname.com/v1/this/1",
+                json={"id": "1"},
+                match=[responses.matchers.json_params_matcher({"stars": 5})],
+            )
+            session = self.session
+            codec = session.json_codec = RecordingCodec()
+
+            response = session.post(self.request_url, json={"stars": 5})
+
+            assert response.json() == {"id": "1"}
+            assert codec.calls == ["dumps", "loads"]
+            request = rsps.calls[0].request
+            assert request.headers["Content-Type"] == "application/json"
+            assert request.body == b'{"stars": 5}'
+
+    def test_metrics_hook(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(
+                responses.POST,
+                "https://hostname.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+                body='{"access_token":"access_token"}',
+                status=200,
+            )
+            rsps.add(
+                responses.GET, "https://hostname.com/v1/this/1", body="foo", status=401
+            )
+            rsps.add(
+                responses.GET, "https://hostname.com/v1/this/1", body="bar", status=200
+            )
+            session = client.TrustpilotSession(
+                api_host=self.api_host, api_key=self.api_key
+            )
+            metrics = []
+            session.register_metrics_hook(metrics.append)
+
+            session.get(self.request_url)
+
+            (request_metrics,) = metrics
+            assert request_metrics.method == "GET"
+            assert request_metrics.url == "https://hostname.com/v1/this/1"
+            assert request_metrics.status == 200
+            assert request_metrics.reauthentications == 1
+            assert request_metrics.retries == 0
+            assert request_metrics.response_size == 3
+            assert 0 <= request_metrics.ttfb <= request_metrics.duration
+
+    def test_metrics_hook_on_errors_and_connections(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        session = client.TrustpilotSession(
+            api_host="http://127.0.0.1:{}".format(server.server_port),
+            api_key=self.api_key,
+        )
+        metrics = []
+        session.register_metrics_hook(metrics.append)
+
+        try:
+            session.get("/ok")
+            session.get("/ok")
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            session.get("http://127.0.0.1:1/refused")
+
+        first, second, failed = metrics
+        assert first.status == second.status == 200
+        assert first.connect > 0
+        assert first.pool_wait >= 0
+        # the second request reuses the pooled connection
+        assert second.connect is None
+        assert failed.status is None
+        assert failed.error == "ConnectionError"
+
+    def test_retries_reuse_the_connection(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        session = client.TrustpilotSession(
+            api_host="http://127.0.0.1:{}".format(server.server_port),
+            api_key=self.api_key,
+            retry_policy=RetryPolicy(backoff_factor=0),
+        )
+
+        try:
+            sent = [session.get("/ok"), session.post("/ok", json={"id": 1})]
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+        assert [response.text for response in sent] == ["ok", "ok"]
+        assert [len(response.retry_history) for response in sent] == [1, 1]
+        assert RateLimitedHandler.requests == 4
+        assert RateLimitedHandler.connections == 1
+
+    def test_compression(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), GzipHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        session = client.TrustpilotSession(
+            api_host="http://127.0.0.1:{}".format(server.server_port),
+            api_key=self.api_key,
+            request_compression_min_size=100,
+        )
+        metrics = []
+        session.register_metrics_hook(metrics.append)
+
+        try:
+            items = session.iter_json_items("/reviews", chunk_size=64)
+            assert [item["id"] for item in items] == list(range(1000))
+            response = session.get("/reviews")
+            small = session.post("/invitations", json={"ids": [1]}).json()
+            large = session.post("/invitations", json={"ids": list(range(100))}).json()
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+        assert "gzip" in response.headers["X-Accept-Encoding"]
+        assert small == {"encoding": None, "body": {"ids": [1]}}
+        assert large == {"encoding": "gzip", "body": {"ids": list(range(100))}}
+        streamed, read = metrics[:2]
+        # the metrics of a streamed response are emitted once it is closed
+        assert streamed.body_read is not None
+        assert streamed.response_wire_size == len(GzipHandler.body)
+        assert read.response_wire_size == len(GzipHandler.body)
+        assert read.response_size == len(response.content) > len(GzipHandler.body)
+        assert metrics[3].request_size < len(json.dumps({"ids": list(range(100))}))
+
+    def test_accept_encoding_is_what_urllib3_decodes(self):
+        # e.g. urllib3 1.26 doesn't decode zstd, even with zstandard installed
+        with mock.patch.object(compression, "zstandard", object()):
+            session = client.TrustpilotSession(
+                api_host=self.api_host, api_key=self.api_key
+            )
+        assert session.headers["Accept-Encoding"] == ACCEPT_ENCODING
+
+    def test_iter_json_items_streams_the_response(self):
+        with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+            rsps.add(
+                responses.GET,
+                "https://hostname.com/v1/this/reviews",
+                json={"links": [], "reviews": [{"id": id} for id in range(100)]},
+            )
+            session = self.session
+
+            items = session.iter_json_items(
+                "/this/reviews", chunk_size=16, model=Review
+            )
+
+            assert [item.id for item in items] == list(range(100))
+            assert rsps.calls[0].request.req_kwargs["stream"]
+
+    @responses.activate
+    def test_identical_gets_are_coalesced(self):
+        calls = []
+
+        def slow_response(request):
+            calls.append(request)
+            time.sleep(0.1)
+            return (200, {}, "bar")
+
+        with responses.RequestsMock() as rsps:
+            rsps.add_callback(
+                responses.GET, "https://hostname.com/v1/this/1", callback=slow_response
+            )
+            session = client.TrustpilotSession(
+                api_host=self.api_host, api_key=self.api_key, coalesce_requests=True
+            )
+            results = []
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(session.get(self.request_url))
+                )
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert len(calls) == 1
+            assert [response.text for response in results] == ["bar"] * 5
+            assert session._inflight_requests == {}
+
+    def test_session_pool(self):
+        def access_token(request):
+            username = dict(item.split("=") for item in request.body.split("&"))[
+                "username"
+            ]
+            return (200, {}, json.dumps({"access_token": username, "expires_in": 3600}))
+
+        with responses.RequestsMock() as rsps:
+            rsps.add_callback(
+                responses.POST,
+                "https://hostname.com/v1/oauth/oauth-business-users-for-applications/accesstoken",
+                callback=access_token,
+            )
+            rsps.add(responses.GET, "https://hostname.com/v1/this/1", status=401)
+            rsps.add(responses.GET, "https://hostname.com/v1/this/1", body="bar")
+            pool = client.SessionPool(
+                max_sessions=2, api_host=self.api_host, api_key=self.api_key
+            )
+
+            first = pool.get(username="first", password="password")
+            second = pool.get(username="second", password="password")
+            assert pool.get(username="first", password="password") is first
+            assert first is not second
+            assert first.get_adapter("https://hostname.com") is pool.http_adapter
+            assert second.get_adapter("https://hostname.com") is pool.http_adapter
+
+            first.get(self.request_url)
+            assert first.access_token == "first"
+            assert second.access_token is None
+            # the same credentials keep the session's token, changed ones set it up
+            with mock.patch.object(first, "setup", wraps=first.setup) as setup:
+                assert pool.get(username="first", password="password") is first
+                assert first.access_token == "first"
+                assert_not_called(setup)
+                assert pool.get(username="first", password="changed") is first
+                assert_called_once(setup)
+                assert pool.get(username="first", password="changed") is first
+                assert_called_once(setup)
+
+            # second is the least recently used
+            pool.get(username="third", password="password")
+            assert len(pool) == 2
+            assert pool.get(username="second", password="password") is not second
+            # first was dropped, its token is kept in the pool's token cache
+            recreated = pool.get(username="first", password="password")
+            assert recreated is not first
+            assert recreated._load_cached_access_token()
+            assert recreated.access_token == "first"
+            assert len(rsps.calls) == 3
+
+            pool.idle_timeout = 0
+            pool.get(username="fourth", password="password")
+            assert len(pool) == 1
+
+            # the shared adapter isn't grown for the threads of one session
+            with pytest.warns(UserWarning):
+                list(first.map([], max_workers=50))
+            assert first.pool_maxsize == 10
+            assert first.get_adapter("https://hostname.com") is pool.http_adapter
+
+            adapter = pool.http_adapter
+            with mock.patch.object(adapter, "close") as close:
+                pool.close()
+                close.assert_called_once_with()
+            assert len(pool) == 0
@@ -0,0 +1,63 @@
+import gzip
+import zlib
+
+import pytest
+
+from trustpilot import compression
+
+
+def decompress_in_chunks(content_encoding, data, size=7):
+    decompressor = compression.Decompressor(content_encoding)
+    chunks = [
+        decompressor.decompress(data[index : index + size])
+        for index in range(0, len(data), size)
+    ]
+    return b"".join(chunks) + decompressor.flush()
+
+
+BODY = b'{"reviews": [' + b",".join(b'{"id": 1}' for _ in range(500)) + b"]}"
+
+
+def test_decompress_gzip_in_chunks():
+    assert decompress_in_chunks("gzip", gzip.compress(BODY)) == BODY
+    # several gzip members
+    assert decompress_in_chunks("gzip", gzip.compress(BODY) * 2) == BODY * 2
+
+
+def test_decompress_deflate_with_and_without_zlib_wrapper():
+    assert decompress_in_chunks("deflate", zlib.compress(BODY)) == BODY
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    raw = compressor.compress(BODY) + compressor.flush()
+    assert decompress_in_chunks("deflate", raw) == BODY
+
+
+def test_decompress_identity_and_several_encodings():
+    assert decompress_in_chunks(None, BODY) == BODY
+    assert decompress_in_chunks("identity", BODY) == BODY
+    twice = gzip.compress(zlib.compress(BODY))
+    assert decompress_in_chunks("deflate, gzip", twice) == BODY
+
+
+def test_decompress_unknown_encoding():
+    with pytest.raises(ValueError):
+        compression.Decompressor("compress")
+
+
+def test_accept_encoding():
+    encodings = compression.get_available_encodings()
+    assert encodings[:2] == ["gzip", "deflate"]
+    assert ("br" in encodings) == (compression.brotli is not None)
+    assert ("zstd" in encodings) == (compression.zstandard is not None)
+    assert compression.get_accept_encoding(("gzip", "deflate")) == "gzip, deflate"
+
+
+def test_compress_request_body():
+    kwargs = {"data": BODY}
+    headers = compression.compress_request_body(kwargs, {"X-Foo": "bar"}, 100)
+    assert headers == {"X-Foo": "bar", "Content-Encoding": "gzip"}
+    assert gzip.decompress(kwargs["data"]) == BODY
+
+    # small bodies are sent as they are
+    kwargs = {"data": b"{}"}
+    assert compression.compress_request_body(kwargs, None, 100) is None
+    assert kwargs["data"] == b"{}"
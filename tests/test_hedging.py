@@ -0,0 +1,145 @@
+import asyncio
+import http.server
+import json
+import threading
+import time
+
+from aiohttp import web
+
+from trustpilot import async_client, client
+from trustpilot.hedging import HedgePolicy
+
+SLOW_RESPONSE_DELAY = 0.3
+
+
+def test_adaptive_delay_is_a_quantile_of_the_response_times():
+    policy = HedgePolicy(min_samples=10, min_delay=0, max_delay=1)
+    for _ in range(9):
+        policy.record(0.01)
+    # not enough samples yet
+    assert policy.start() is None
+
+    for seconds in range(1, 92):
+        policy.record(seconds / 1000)
+    assert policy.start() == 0.086
+    assert HedgePolicy(delay=0.2).start() == 0.2
+
+
+def test_hedges_are_capped():
+    policy = HedgePolicy(delay=0.01, max_extra_load=0.1, burst=2)
+    hedges = 0
+    for _ in range(100):
+        policy.start()
+        hedges += policy.acquire()
+    # the burst, then one hedge per ten requests
+    assert hedges == 2 + 9
+    assert (policy.requests, policy.hedges) == (100, 11)
+
+
+class SlowFirstHandler(http.server.BaseHTTPRequestHandler):
+    # the first request answers slowly, the others right away
+    protocol_version = "HTTP/1.1"
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            SlowFirstHandler.requests += 1
+            attempt = SlowFirstHandler.requests
+        if attempt == 1:
+            time.sleep(SLOW_RESPONSE_DELAY)
+        body = json.dumps({"attempt": attempt}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_sync_hedge_wins_over_slow_response():
+    SlowFirstHandler.requests = 0
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowFirstHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    policy = HedgePolicy(delay=0.05)
+    session = client.TrustpilotSession(
+        api_host="http://127.0.0.1:{}".format(server.server_port),
+        api_key="key",
+        access_token="token",
+        hedge_policy=policy,
+    )
+    metrics = []
+    session.register_metrics_hook(metrics.append)
+
+    try:
+        started = time.monotonic()
+        response = session.get("/business-units/1")
+        elapsed = time.monotonic() - started
+        fast_response = session.get("/business-units/1")
+        # the dropped primary response is still received
+        time.sleep(SLOW_RESPONSE_DELAY)
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+    assert response.json() == {"attempt": 2}
+    assert elapsed < SLOW_RESPONSE_DELAY
+    assert fast_response.json() == {"attempt": 3}
+    assert (policy.requests, policy.hedges, policy.hedge_wins) == (2, 1, 1)
+    hedged = sorted((m.hedge, m.hedge_won, m.status) for m in metrics if m.hedge)
+    assert hedged == [("hedge", True, 200), ("primary", False, 200)]
+    assert sum(1 for m in metrics if m.hedge is None) == 1
+
+
+def test_async_hedge_wins_and_slow_response_is_cancelled():
+    requests = []
+
+    async def business_unit(request):
+        requests.append(request)
+        attempt = len(requests)
+        if attempt == 1:
+            await asyncio.sleep(SLOW_RESPONSE_DELAY)
+        return web.json_response({"attempt": attempt})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/v1/business-units/1", business_unit)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+
+        policy = HedgePolicy(delay=0.05)
+        session = async_client.TrustpilotAsyncSession(
+            api_host="http://{}:{}".format(host, port),
+            api_key="key",
+            access_token="token",
+            hedge_policy=policy,
+        )
+        metrics = []
+        session.register_metrics_hook(metrics.append)
+        try:
+            async with session:
+                started = time.monotonic()
+                response = await session.get("/business-units/1")
+                elapsed = time.monotonic() - started
+                content = await response.json()
+        finally:
+            await runner.cleanup()
+        return policy, metrics, content, elapsed
+
+    policy, metrics, content, elapsed = asyncio.run(run())
+
+    assert content == {"attempt": 2}
+    assert elapsed < SLOW_RESPONSE_DELAY
+    assert (policy.requests, policy.hedges, policy.hedge_wins) == (1, 1, 1)
+    # the slow primary request was cancelled
+    hedged = sorted((m.hedge, m.hedge_won, m.status, m.error) for m in metrics)
+    assert hedged == [
+        ("hedge", True, 200, None),
+        ("primary", False, None, "CancelledError"),
+    ]
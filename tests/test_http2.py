@@ -0,0 +1,173 @@
+import asyncio
+import json
+
+import pytest
+import responses
+
+from trustpilot import async_client, client
+from trustpilot.models import Review
+
+httpx = pytest.importorskip("httpx")
+
+TOKEN_URL = (
+    "https://hostname.com/v1/oauth/oauth-business-users-for-applications/accesstoken"
+)
+
+
+class BodyStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, body):
+        self.body = body
+
+    def __iter__(self):
+        yield self.body
+
+    async def __aiter__(self):
+        yield self.body
+
+
+def streamed(response):
+    # received from the network, a response built with its content has it
+    # read already
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        stream=BodyStream(response.content),
+    )
+
+
+class MockApi:
+    # answers with 401 until the access token is sent
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        return streamed(self.respond(request))
+
+    def respond(self, request):
+        if request.url.path.endswith("accesstoken"):
+            return httpx.Response(200, json={"access_token": "access_token"})
+        if request.headers.get("Authorization") != "Bearer access_token":
+            return httpx.Response(401)
+        if request.url.path == "/v1/reviews":
+            return httpx.Response(
+                200,
+                json={"links": [], "reviews": [{"id": "1"}, {"id": "2"}]},
+            )
+        return httpx.Response(
+            200,
+            json={"path": request.url.path, "body": request.content.decode("utf-8")},
+        )
+
+
+def get_session_kwargs(api):
+    return dict(
+        api_host="https://hostname.com",
+        api_key="key",
+        api_secret="secret",
+        username="username",
+        password="password",
+        api_version="v1",
+        http2={"transport": httpx.MockTransport(api)},
+    )
+
+
+@responses.activate
+def test_sync_http2_reauthenticates_and_cleans_urls():
+    responses.add(responses.POST, TOKEN_URL, json={"access_token": "access_token"})
+    api = MockApi()
+    session = client.TrustpilotSession(**get_session_kwargs(api))
+
+    response = session.post("/v1/foo/bar", json={"foo": "bar"})
+
+    assert response.status_code == 200
+    assert response.json()["path"] == "/v1/foo/bar"
+    assert json.loads(response.json()["body"]) == {"foo": "bar"}
+    assert [request.url.path for request in api.requests] == ["/v1/foo/bar"] * 2
+    assert session.access_token == "access_token"
+
+    items = list(session.iter_json_items("/reviews", model=Review))
+    assert [item.id for item in items] == ["1", "2"]
+    session.close()
+
+
+def test_sync_http2_mounts_adapter():
+    session = client.TrustpilotSession(**get_session_kwargs(MockApi()))
+    adapter = session.get_adapter("https://hostname.com")
+    assert adapter.client is session.get_adapter("http://hostname.com").client
+
+    session.mount_adapters(10, 20)
+    assert session.get_adapter("https://hostname.com") is not adapter
+    assert session.http2
+
+
+def test_async_http2_reauthenticates_and_cleans_urls():
+    api = MockApi()
+    session = async_client.TrustpilotAsyncSession(**get_session_kwargs(api))
+
+    async def run():
+        async with session:
+            response = await session.post("/v1/foo/bar", data=json.dumps({"a": 1}))
+            assert response.status == 200
+            assert await response.json() == {"path": "/v1/foo/bar", "body": '{"a": 1}'}
+
+            items = [
+                item async for item in session.iter_json_items("/reviews", model=Review)
+            ]
+            assert [item.id for item in items] == ["1", "2"]
+
+            response = await session.get("https://hostname.com/v1/missing")
+            assert response.status == 200
+
+    asyncio.run(run())
+
+    assert [request.url.path for request in api.requests] == [
+        "/v1/foo/bar",
+        "/v1/oauth/oauth-business-users-for-applications/accesstoken",
+        "/v1/foo/bar",
+        "/v1/reviews",
+        "/v1/missing",
+    ]
+    assert session.access_token == "access_token"
+
+
+def test_sync_http2_rejects_settings_of_other_clients(monkeypatch):
+    monkeypatch.delenv("HTTPS_PROXY", raising=False)
+    monkeypatch.delenv("https_proxy", raising=False)
+    session = client.TrustpilotSession(
+        access_token="access_token", **get_session_kwargs(MockApi())
+    )
+    session.headers["Authorization"] = "Bearer access_token"
+
+    assert session.get("/foo", verify=True).status_code == 200
+    for settings in [
+        {"verify": False},
+        {"cert": "/client.pem"},
+        {"proxies": {"https": "http://proxy:3128"}},
+    ]:
+        with pytest.raises(ValueError):
+            session.get("/foo", **settings)
+
+    session.close()
+
+
+def test_async_http2_follows_redirects():
+    def api(request):
+        if request.url.path == "/v1/old":
+            return streamed(httpx.Response(301, headers={"Location": "/v1/new"}))
+        return streamed(httpx.Response(200, json={"path": request.url.path}))
+
+    session = async_client.TrustpilotAsyncSession(
+        access_token="access_token", **get_session_kwargs(api)
+    )
+
+    async def run():
+        async with session:
+            response = await session.get("/old")
+            assert await response.json() == {"path": "/v1/new"}
+            response = await session.get("/old", allow_redirects=False)
+            assert response.status == 301
+            with pytest.raises(TypeError):
+                await session.get("/old", ssl=False)
+
+    asyncio.run(run())
@@ -0,0 +1,78 @@
+import subprocess
+import sys
+
+from benchmarks.bench_import_time import get_import_times
+
+
+def run_python(code):
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+
+
+def assert_not_imported(module, lazy_modules):
+    imported = get_import_times(module)
+    assert module in imported
+    assert [name for name in lazy_modules if name in imported] == []
+
+
+def test_package_import_leaves_the_clients_out():
+    assert_not_imported(
+        "trustpilot", ["requests", "aiohttp", "trustpilot.client", "trustpilot.cli"]
+    )
+
+
+def test_cli_import_leaves_heavy_modules_out():
+    assert_not_imported(
+        "trustpilot.cli",
+        [
+            "requests",
+            "urllib3",
+            "aiohttp",
+            "httpx",
+            "importlib.metadata",
+            "trustpilot.client",
+            "trustpilot.async_client",
+        ],
+    )
+
+
+def test_clients_leave_optional_modules_out():
+    optional_modules = [
+        "httpx",
+        "trustpilot.http2",
+        "statsd",
+        "prometheus_client",
+        "opentelemetry",
+    ]
+    assert_not_imported(
+        "trustpilot.client", optional_modules + ["aiohttp", "trustpilot.async_client"]
+    )
+    assert_not_imported(
+        "trustpilot.async_client", optional_modules + ["requests", "trustpilot.client"]
+    )
+
+
+def test_default_sessions_created_on_first_use():
+    code = """
+import trustpilot
+from trustpilot import async_client, client
+print("default_session" in vars(client), "default_session" in vars(async_client))
+print("VERSION" in vars(trustpilot), "default_session" in dir(client))
+print(
+    client.default_session is client.default_session,
+    async_client.get.__self__ is async_client.default_session,
+)
+"""
+    assert run_python(code).stdout.split() == [
+        "False",
+        "False",
+        "False",
+        "True",
+        "True",
+        "True",
+    ]
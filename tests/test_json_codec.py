@@ -0,0 +1,54 @@
+import pytest
+
+from trustpilot import json_codec
+from trustpilot.json_codec import JsonCodec, encode_json_body, get_json_codec
+
+REVIEW = {
+    "id": "5f1e",
+    "stars": 5,
+    "title": "Great æøå 😀",
+    "consumer": {"displayName": "Jane", "numberOfReviews": 3},
+    "tags": [],
+    "isVerified": True,
+    "companyReply": None,
+}
+
+
+@pytest.mark.parametrize("name", json_codec.get_available_codecs())
+def test_codecs_round_trip(name):
+    codec = get_json_codec(name)
+
+    assert codec.name == name
+    assert codec.loads(codec.dumps(REVIEW)) == REVIEW
+    assert codec.loads(codec.dumps(REVIEW).decode("utf-8")) == REVIEW
+    assert codec.loads(codec.dumps(REVIEW, indent=True)) == REVIEW
+
+
+def test_get_json_codec():
+    codec = JsonCodec()
+
+    assert get_json_codec(codec) is codec
+    assert get_json_codec().name == json_codec.get_available_codecs()[0]
+    assert get_json_codec("json").name == "json"
+    with pytest.raises(ValueError):
+        get_json_codec("yaml")
+
+
+def test_missing_codec(monkeypatch):
+    monkeypatch.setitem(json_codec._CODECS, "ujson", (json_codec.UjsonCodec, None))
+
+    assert "ujson" not in json_codec.get_available_codecs()
+    with pytest.raises(ImportError):
+        get_json_codec("ujson")
+
+
+def test_encode_json_body():
+    kwargs = {"json": {"a": 1}}
+    headers = encode_json_body(JsonCodec(), kwargs, {"apikey": "key"})
+
+    assert kwargs == {"data": b'{"a": 1}'}
+    assert headers == {"apikey": "key", "Content-Type": "application/json"}
+
+    kwargs = {"json": [1]}
+    headers = {"content-type": "application/vnd+json"}
+    assert encode_json_body(JsonCodec(), kwargs, headers) == headers
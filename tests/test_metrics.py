@@ -0,0 +1,127 @@
+import pytest
+
+from trustpilot.metrics import (
+    OpenTelemetryHook,
+    RequestMetrics,
+    RequestTimings,
+    StatsdMetricsHook,
+    emit_metrics,
+)
+
+
+def get_metrics(**values):
+    values = dict(
+        dict(status=200, duration=0.5, ttfb=0.2, connect=0.1, retries=1), **values
+    )
+    return RequestMetrics("get", "https://api.trustpilot.com/v1/reviews/1", **values)
+
+
+def test_timings_to_metrics():
+    timings = RequestTimings()
+    timings.add("connect", 0.25)
+    timings.add("connect", 0.25)
+    timings.mark("ttfb")
+    timings.stop("ttfb")
+    timings.stop("never_marked")
+    timings.add_size("response_size", 10)
+
+    metrics = timings.to_metrics("get", "https://api.trustpilot.com", status=200)
+
+    assert metrics.method == "GET"
+    assert metrics.connect == 0.5
+    assert 0 <= metrics.ttfb <= metrics.duration
+    assert metrics.response_size == 10
+    assert metrics.tls is None
+    assert metrics.started_at == timings.started_at
+    assert metrics.to_dict()["status"] == 200
+
+
+def test_failing_hooks_are_logged(caplog):
+    calls = []
+
+    def failing_hook(metrics):
+        raise ValueError()
+
+    emit_metrics([failing_hook, calls.append], get_metrics())
+
+    assert len(calls) == 1
+    assert "metrics hook failed" in caplog.text
+
+
+def test_statsd_hook():
+    class Client:
+        def __init__(self):
+            self.calls = []
+
+        def incr(self, name, count=1):
+            self.calls.append(("incr", name, count))
+
+        def timing(self, name, milliseconds):
+            self.calls.append(("timing", name, milliseconds))
+
+    client = Client()
+    hook = StatsdMetricsHook(client, prefix="tp")
+
+    hook(get_metrics())
+    hook(get_metrics(status=None, error="ConnectionError", retries=0))
+
+    assert client.calls == [
+        ("incr", "tp.status.200", 1),
+        ("timing", "tp.duration", 500),
+        ("timing", "tp.connect", 100),
+        ("timing", "tp.ttfb", 200),
+        ("incr", "tp.retries", 1),
+        ("incr", "tp.status.ConnectionError", 1),
+        ("timing", "tp.duration", 500),
+        ("timing", "tp.connect", 100),
+        ("timing", "tp.ttfb", 200),
+    ]
+
+
+def test_opentelemetry_hook():
+    class Span:
+        def end(self, end_time):
+            self.end_time = end_time
+
+        def set_status(self, status):
+            self.status = status
+
+    class Tracer:
+        def start_span(self, name, start_time, attributes, **kwargs):
+            self.span = Span()
+            self.span.name = name
+            self.span.start_time = start_time
+            self.span.attributes = attributes
+            return self.span
+
+    tracer = Tracer()
+    metrics = get_metrics(started_at=1000.0)
+
+    OpenTelemetryHook(tracer)(metrics)
+
+    span = tracer.span
+    assert span.name == "GET"
+    assert span.start_time == 1000 * 10**9
+    assert span.end_time == span.start_time + 5 * 10**8
+    assert span.attributes["http.response.status_code"] == 200
+    assert span.attributes["trustpilot.retries"] == 1
+    assert span.attributes["trustpilot.ttfb_ms"] == 200
+
+
+def test_prometheus_hook():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from trustpilot.metrics import PrometheusMetricsHook
+
+    registry = prometheus_client.CollectorRegistry()
+    hook = PrometheusMetricsHook(registry)
+
+    hook(get_metrics(response_size=100))
+
+    assert (
+        registry.get_sample_value(
+            "trustpilot_request_duration_seconds_count",
+            {"method": "GET", "status": "200"},
+        )
+        == 1
+    )
+    assert registry.get_sample_value("trustpilot_request_retries_total") == 1
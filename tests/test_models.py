@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from trustpilot.models import BusinessUnit, Invitation, Link, Review, ReviewsPage
+
+REVIEW = {
+    "id": "1",
+    "stars": 4,
+    "title": "Good",
+    "createdAt": "2023-07-28T12:00:00.000Z",
+    "consumer": {"id": "2", "displayName": "Jane"},
+    "businessUnit": {"id": "3", "displayName": "Shop"},
+    "links": [{"href": "https://api.trustpilot.com/v1/reviews/1", "rel": "self"}],
+    "companyReply": None,
+    "source": "Organic",
+}
+
+
+def test_fields_are_read_from_the_json():
+    review = Review(REVIEW)
+
+    assert review.id == "1"
+    assert review.stars == 4
+    assert review.text is None
+    assert review.company_reply is None
+    assert review["source"] == "Organic"
+    assert review.get("missing", 1) == 1
+    assert review.to_dict() is REVIEW
+    assert repr(review) == "Review(id='1')"
+
+
+def test_nested_fields_are_decoded_lazily_once():
+    review = Review(REVIEW)
+    assert review._decoded is None
+
+    assert review.consumer.display_name == "Jane"
+    assert review.consumer is review.consumer
+    assert isinstance(review.business_unit, BusinessUnit)
+    assert review.links == (Link(REVIEW["links"][0]),)
+    assert review.links[0].rel == "self"
+    assert review.created_at == datetime(2023, 7, 28, 12, tzinfo=timezone.utc)
+    assert set(review._decoded) == {
+        "consumer",
+        "business_unit",
+        "links",
+        "created_at",
+    }
+
+
+def test_models_are_compact_and_read_only():
+    review = Review(REVIEW)
+
+    assert not hasattr(review, "__dict__")
+    with pytest.raises(AttributeError):
+        review.stars = 1
+    with pytest.raises(AttributeError):
+        review.other = 1
+
+
+def test_unparsable_dates_are_kept():
+    invitation = Invitation({"consumerEmail": "a@b.c", "createdAt": "yesterday"})
+
+    assert invitation.consumer_email == "a@b.c"
+    assert invitation.created_at == "yesterday"
+
+
+def test_page():
+    page = ReviewsPage(
+        {
+            "reviews": [REVIEW],
+            "links": [{"href": "https://api.trustpilot.com/2", "rel": "next-page"}],
+            "total": 7,
+        }
+    )
+
+    assert page.items == [Review(REVIEW)]
+    assert page.total == 7
+    assert page.next_page_url == "https://api.trustpilot.com/2"
+    assert page.links[0].rel == "next-page"
@@ -0,0 +1,65 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+import responses
+
+from trustpilot import client
+from trustpilot.rate_limit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_spaces_requests():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket._updated
+
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == 0
+    assert round(bucket.reserve(now), 3) == 0.1
+    assert round(bucket.reserve(now), 3) == 0.2
+    # refilled tokens are used by the callers already waiting
+    assert round(bucket.reserve(now + 1), 3) == 0
+
+
+def test_limits_are_per_key_and_endpoint_prefix():
+    limiter = RateLimiter(rate=1, endpoint_rates={"/v1/private/": (1, 1)})
+    private_url = "https://api.trustpilot.com/v1/private/business-units/1"
+
+    assert limiter.reserve("key", "https://api.trustpilot.com/v1/foo") == 0
+    assert limiter.reserve("other_key", private_url) == 0
+    assert limiter.reserve("key", "https://api.trustpilot.com/v1/foo") > 0.9
+    assert limiter.reserve("other_key", private_url) > 0.9
+
+
+def test_rate_adapts_to_rate_limit_headers():
+    limiter = RateLimiter(rate=100)
+    url = "https://api.trustpilot.com/v1/foo"
+
+    limiter.update_from_response(
+        "key", url, 200, {"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "20"}
+    )
+    (bucket,) = limiter._buckets.values()
+    assert bucket.rate == 0.5
+
+    limiter.update_from_response("key", url, 429, {"Retry-After": "5"})
+    assert limiter.reserve("key", url) > 4
+
+
+@responses.activate
+def test_session_consults_rate_limiter():
+    with responses.RequestsMock(assert_all_requests_are_fired=True) as rsps:
+        rsps.add(
+            responses.GET,
+            "https://hostname.com/v1/this/1",
+            headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1"},
+        )
+        rate_limiter = mock.Mock()
+        session = client.TrustpilotSession(
+            api_host="https://hostname.com", api_key="key", rate_limiter=rate_limiter
+        )
+
+        session.get("/this/1")
+
+        rate_limiter.acquire.assert_called_once_with(
+            "key", "https://hostname.com/v1/this/1"
+        )
+        rate_limiter.update_from_response.assert_called_once()
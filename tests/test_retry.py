@@ -0,0 +1,42 @@
+from email.utils import formatdate
+import time
+
+from trustpilot.retry import RetryPolicy, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("soon") is None
+    assert 8 < parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+def test_exponential_backoff_without_jitter():
+    policy = RetryPolicy(total=5, backoff_factor=1, backoff_max=5, jitter=False)
+
+    delays = [policy.get_retry_delay("GET", 503, retries) for retries in range(6)]
+
+    assert delays == [1, 2, 4, 5, 5, None]
+
+
+def test_jitter_stays_within_backoff():
+    policy = RetryPolicy(backoff_factor=1)
+
+    assert all(0 <= policy.get_retry_delay("GET", 502, 2) <= 4 for _ in range(100))
+
+
+def test_method_and_status_rules():
+    policy = RetryPolicy(jitter=False)
+
+    assert policy.get_retry_delay("GET", 404, 0) is None
+    assert policy.get_retry_delay("POST", 503, 0) is None
+    assert policy.get_retry_delay("POST", 429, 0) == 0.5
+    assert policy.get_retry_delay("delete", 500, 0) == 0.5
+
+
+def test_retry_after_and_budget():
+    policy = RetryPolicy(jitter=False, max_retry_after=60, budget=10)
+
+    assert policy.get_retry_delay("GET", 429, 0, retry_after="7") == 7
+    assert policy.get_retry_delay("GET", 429, 0, retry_after="61") is None
+    assert policy.get_retry_delay("GET", 429, 0, elapsed=5, retry_after="7") is None
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from trustpilot.streaming import JsonItemParser
+
+DOCUMENT = {
+    "links": [{"href": "https://api.trustpilot.com/v1/reviews?page=2"}],
+    "meta": {"reviews": ["not", "these"], "nested": [[1, 2]]},
+    "reviews": [
+        {"id": "1", "text": 'with "quotes", [brackets] and {braces}'},
+        {"id": "2", "text": 'escaped \\" backslash \\\\', "tags": [1, {"a": []}]},
+        {"id": "3", "text": "unicode æøå 😀"},
+        "plain",
+        42,
+        None,
+    ],
+    "total": 6,
+}
+
+
+def parse(document, chunk_size, **kwargs):
+    data = json.dumps(document, ensure_ascii=False).encode("utf-8")
+    parser = JsonItemParser(**kwargs)
+    items = []
+    for start in range(0, len(data), chunk_size):
+        items.extend(parser.feed(data[start : start + chunk_size]))
+    parser.close()
+    return items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 100000])
+def test_items_of_any_chunking(chunk_size):
+    assert parse(DOCUMENT, chunk_size) == DOCUMENT["reviews"]
+    assert parse(DOCUMENT, chunk_size, items_key="reviews") == DOCUMENT["reviews"]
+
+
+def test_items_key_and_top_level_arrays():
+    assert parse(DOCUMENT, 5, items_key="links") == DOCUMENT["links"]
+    assert parse(DOCUMENT, 5, items_key="missing") == []
+    assert parse([{"id": 1}, [2], 3], 2) == [{"id": 1}, [2], 3]
+    assert parse({"reviews": []}, 1) == []
+
+
+def test_items_are_returned_as_soon_as_they_are_complete():
+    parser = JsonItemParser()
+    assert parser.feed(b'{"reviews": [{"id": 1}, {"i') == [{"id": 1}]
+    assert parser.feed(b'd": 2}]') == [{"id": 2}]
+    assert parser.done
+    assert parser.feed(b', "other": [3]}') == []
+
+
+def test_truncated_document():
+    parser = JsonItemParser()
+    parser.feed(b'{"reviews": [{"id": 1}, {"id"')
+    with pytest.raises(ValueError):
+        parser.close()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import unittest
+
+from trustpilot import auth, client
+from trustpilot.token_cache import FileTokenCache, MemoryTokenCache
+
+
+class TestFileTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "nested", "tokens.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_tokens_are_shared_between_instances(self):
+        expires_at = time.time() + 3600
+        FileTokenCache(self.path).set("key", "access_token", expires_at)
+
+        assert FileTokenCache(self.path).get("key") == ("access_token", expires_at)
+        assert FileTokenCache(self.path).get("other_key") is None
+        assert os.stat(self.path).st_mode & 0o777 == 0o600
+
+    def test_expired_tokens_are_not_returned_or_kept(self):
+        cache = FileTokenCache(self.path)
+        cache.set("expired", "old_token", time.time() - 1)
+        cache.set("key", "access_token", time.time() + 3600)
+
+        assert cache.get("expired") is None
+        assert "expired" not in cache._read()
+
+    def test_missing_or_corrupt_file_is_a_miss(self):
+        cache = FileTokenCache(self.path)
+        assert cache.get("key") is None
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{not json")
+        assert cache.get("key") is None
+
+
+def test_token_cache_key_depends_on_credentials():
+    session = client.TrustpilotSession(
+        api_host="https://hostname.com", api_key="key", username="user"
+    )
+    key = auth.get_token_cache_key(session)
+
+    session.username = "other_user"
+    assert auth.get_token_cache_key(session) != key
+
+    session.username = "user"
+    session.token_issuer_host = "https://issuer.com"
+    assert auth.get_token_cache_key(session) != key
+
+
+def test_session_uses_cached_token_without_token_request():
+    token_cache = MemoryTokenCache()
+    session = client.TrustpilotSession(
+        api_host="https://hostname.com", api_key="key", token_cache=token_cache
+    )
+    token_cache.set(auth.get_token_cache_key(session), "cached", time.time() + 3600)
+
+    session._refresh_access_token_ahead()
+
+    assert session.access_token == "cached"
+    assert session.headers["Authorization"] == "Bearer cached"
+
+    # a cached token that was rejected is not reused
+    session.get_request_auth_headers = lambda: session._set_access_token("new")
+    session.refresh_access_token("Bearer cached")
+    assert session.access_token == "new"
@@ -1,7 +1,13 @@
-from importlib import metadata
+def __getattr__(name):
+    # the version is looked up on first use, importlib.metadata is slow to
+    # import and scans sys.path
+    if name == "VERSION":
+        global VERSION
+        from importlib import metadata
 
-
-try:
-    VERSION = metadata.version("trustpilot")
-except:
-    VERSION = "unknown"
+        try:
+            VERSION = metadata.version("trustpilot")
+        except:
+            VERSION = "unknown"
+        return VERSION
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# RequestTimings of the request being sent on the current thread, if any
+_current = threading.local()
+
+
+def start_timings(timings):
+    _current.timings = timings
+
+
+def stop_timings():
+    _current.timings = None
+
+
+def _get_timings():
+    return getattr(_current, "timings", None)
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        # dns lookup and tcp connect, urllib3 doesn't do them separately
+        started = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._connect_seconds = time.perf_counter() - started
+            timings = _get_timings()
+            if timings is not None:
+                timings.add("connect", self._connect_seconds)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        self._connect_seconds = 0.0
+        started = time.perf_counter()
+        super().connect()
+        timings = _get_timings()
+        if timings is not None:
+            timings.add("tls", time.perf_counter() - started - self._connect_seconds)
+
+
+class _TimedPoolMixin:
+    def _get_conn(self, timeout=None):
+        started = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            timings = _get_timings()
+            if timings is not None:
+                timings.add("pool_wait", time.perf_counter() - started)
+
+
+class _TimedHTTPConnectionPool(_TimedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(_TimedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimingHTTPAdapter(HTTPAdapter):
+    # an HTTPAdapter recording pool wait, connect and tls handshake times into
+    # the timings started on the sending thread
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
@@ -2,17 +2,186 @@ from contextlib import asynccontextmanager
 from logging import getLogger
 from os import environ
 import aiohttp
+import asyncio
+import collections
+import functools
 import base64
+import inspect
+import json
+import threading
+import time
+import weakref
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
 
-from trustpilot import auth, utils
+from trustpilot import auth, compression, streaming, utils
+from trustpilot.cache import MemoryCacheBackend
+from trustpilot.hedging import HedgedCall, emit_request_metrics
+from trustpilot.json_codec import encode_json_body, get_json_codec
+from trustpilot.metrics import RequestTimings
+from trustpilot.retry import RetryAttempt, RetryPolicy
+from trustpilot.token_cache import FileTokenCache, MemoryTokenCache
 
 logger = getLogger("trustpilot.async_client")
+_end_of_pages = object()
+# aiohttp decodes these itself (br with the brotli package), other encodings
+# are only asked for where the body is decoded by trustpilot.compression
+_AIOHTTP_ENCODINGS = ("gzip", "deflate", "br")
+# aiohttp >= 3.10 can leave the body of a single request compressed
+_HAS_REQUEST_AUTO_DECOMPRESS = (
+    "auto_decompress" in inspect.signature(aiohttp.ClientSession._request).parameters
+)
+
+
+async def _iterate(iterable):
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+def _create_trace_config():
+    # feeds the RequestTimings passed as trace_request_ctx of a request
+    def mark(name):
+        async def callback(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx.mark(name)
+
+        return callback
+
+    def stop(name):
+        async def callback(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx.stop(name)
+
+        return callback
+
+    async def on_request_start(session, context, params):
+        # time to first byte is that of the last attempt
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx.phases.pop("ttfb", None)
+            context.trace_request_ctx.mark("ttfb")
+
+    async def on_request_end(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx.stop("ttfb")
+            context.trace_request_ctx.mark("body_read")
+
+    async def on_request_chunk_sent(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx.add_size("request_size", len(params.chunk))
+
+    async def on_response_chunk_received(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx.add_size("response_size", len(params.chunk))
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_queued_start.append(mark("pool_wait"))
+    trace_config.on_connection_queued_end.append(stop("pool_wait"))
+    trace_config.on_connection_create_start.append(mark("connect"))
+    trace_config.on_connection_create_end.append(stop("connect"))
+    trace_config.on_dns_resolvehost_start.append(mark("dns"))
+    trace_config.on_dns_resolvehost_end.append(stop("dns"))
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
+async def _run_hook(hook, *args):
+    result = hook(*args)
+    if asyncio.iscoroutine(result):
+        await result
+
+
+def _close_stale_client_session(client_session):
+    # closes a pooled session of a loop that is closed, without awaiting as
+    # that can only be done in its own loop
+    if client_session.closed or not isinstance(client_session, aiohttp.ClientSession):
+        # httpx closes its connections when garbage collected
+        return
+    connector = client_session.connector
+    connector_owner = client_session.connector_owner
+    client_session.detach()
+    if connector_owner and connector is not None:
+        # Connector.close() closes the connections right away, its awaitable
+        # only warns when it isn't awaited
+        connector._close()
+
+
+def _log_background_token_refresh_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("background token refresh failed", exc_info=task.exception())
+
+
+class CachedResponse:
+    # stands in for a buffered aiohttp.ClientResponse served by the response cache
+    from_cache = True
+
+    def __init__(self, entry):
+        self.status = entry.status
+        self.headers = CIMultiDictProxy(CIMultiDict(entry.headers))
+        self.url = URL(entry.url)
+        self.retry_history = []
+        self._body = entry.body
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    @property
+    def content_type(self):
+        content_type = self.headers.get("Content-Type", "application/octet-stream")
+        return content_type.split(";")[0].strip().lower()
+
+    @property
+    def charset(self):
+        for parameter in self.headers.get("Content-Type", "").split(";")[1:]:
+            name, _, value = parameter.strip().partition("=")
+            if name.lower() == "charset":
+                return value.strip('"')
+        return None
+
+    async def read(self):
+        return self._body
+
+    async def text(self, encoding=None, errors="strict"):
+        return self._body.decode(encoding or self.charset or "utf-8", errors)
+
+    async def json(self, *, encoding=None, loads=json.loads, **kwargs):
+        return loads(self._body.decode(encoding or self.charset or "utf-8"))
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise aiohttp.ClientResponseError(
+                aiohttp.RequestInfo(self.url, "GET", self.headers, self.url),
+                (),
+                status=self.status,
+                headers=self.headers,
+            )
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
 
 
 class TrustpilotAsyncSession:
     __SUPPORTED_HTTP_METHODS = ["post", "get", "put", "delete"]
 
     def __init__(self, *args, **kwargs):
+        # pooled sessions by the loop they were created in
+        self._client_sessions = weakref.WeakKeyDictionary()
+        self._client_sessions_lock = threading.Lock()
+        self._token_refresh_task = None
+        self._inflight_requests = {}
+        self._pre_hooks = []
+        self._post_hooks = []
+        self._metrics_hooks = []
         self.setup(**kwargs)
         self.headers = {}
 
@@ -28,6 +197,22 @@ class TrustpilotAsyncSession:
         token_issuer_path=None,
         token_issuer_host=None,
         user_agent=None,
+        token_refresh_skew=60,
+        token_cache=None,
+        retry_policy=None,
+        rate_limiter=None,
+        response_cache=None,
+        coalesce_requests=False,
+        hedge_policy=None,
+        json_codec=None,
+        connection_limit=100,
+        connection_limit_per_host=0,
+        keepalive_timeout=15,
+        dns_cache_ttl=10,
+        http2=False,
+        accept_encoding=None,
+        request_compression_min_size=None,
+        connector=None,
         **kwargs
     ):
         self.api_host = api_host or environ.get(
@@ -46,6 +231,19 @@ class TrustpilotAsyncSession:
 
         self.token_issuer_host = token_issuer_host or self.api_host
         self.access_token = access_token
+        self.access_token_expires_at = None
+        self.token_refresh_skew = token_refresh_skew
+        self.token_cache = token_cache
+        if token_cache is None and environ.get("TRUSTPILOT_TOKEN_CACHE_PATH"):
+            self.token_cache = FileTokenCache()
+        self._token_cache_checked = False
+        self._token_refresh_backoff = auth.TokenRefreshBackoff()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        self.coalesce_requests = coalesce_requests
+        self.hedge_policy = hedge_policy
+        self.json_codec = get_json_codec(json_codec)
         self.token_issuer_path = token_issuer_path or environ.get(
             "TRUSTPILOT_API_TOKEN_ISSUER_PATH",
             "oauth/oauth-business-users-for-applications/accesstoken",
@@ -55,6 +253,18 @@ class TrustpilotAsyncSession:
             "TRUSTPILOT_USER_AGENT", auth.get_user_agent()
         )
 
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        # True or a dict of httpx.AsyncClient options
+        self.http2 = http2
+        self.accept_encoding = accept_encoding
+        self.request_compression_min_size = request_compression_min_size
+        # an aiohttp connector shared with other sessions (e.g. of an
+        # AsyncSessionPool), which close it
+        self.connector = connector
+
         if not self.api_host.startswith("http"):
             raise aiohttp.http_exceptions.InvalidURLError(
                 "'{}' is not a valid api_host url".format(api_host)
@@ -62,19 +272,210 @@ class TrustpilotAsyncSession:
 
         return self
 
+    def get_client_session(self):
+        # a pooled session is bound to the loop it was created in, so a session
+        # used from another loop (e.g. another asyncio.run or thread) gets its
+        # own one
+        loop = asyncio.get_running_loop()
+        with self._client_sessions_lock:
+            client_session = self._client_sessions.get(loop)
+            if client_session is None or client_session.closed:
+                self._close_stale_client_sessions()
+                client_session = self._create_client_session()
+                self._client_sessions[loop] = client_session
+        return client_session
+
+    def _close_stale_client_sessions(self):
+        for loop, client_session in list(self._client_sessions.items()):
+            if loop.is_closed():
+                del self._client_sessions[loop]
+                _close_stale_client_session(client_session)
+
+    def _create_client_session(self):
+        if self.http2:
+            from trustpilot.http2 import HTTP2ClientSession
+
+            options = self.http2 if isinstance(self.http2, dict) else {}
+            return HTTP2ClientSession(connection_limit=self.connection_limit, **options)
+
+        if self.connector is not None:
+            return aiohttp.ClientSession(
+                connector=self.connector,
+                connector_owner=False,
+                trace_configs=[_create_trace_config()],
+            )
+
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        return aiohttp.ClientSession(
+            connector=connector, trace_configs=[_create_trace_config()]
+        )
+
+    async def aclose(self):
+        # the session of the running loop, those of other running loops are
+        # closed by an aclose() in their loop
+        loop = asyncio.get_running_loop()
+        with self._client_sessions_lock:
+            client_session = self._client_sessions.pop(loop, None)
+            self._close_stale_client_sessions()
+        if client_session is not None and not client_session.closed:
+            await client_session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _set_access_token(self, access_token, expires_at=None):
+        self.access_token = access_token
+        self.access_token_expires_at = expires_at
+        self.headers.update(
+            {
+                "Authorization": "Bearer {}".format(access_token),
+                "apikey": self.api_key,
+                "User-Agent": self.user_agent,
+            }
+        )
+
+    async def _run_in_executor(self, method, *args):
+        # for token and response caches doing blocking (file) io
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, method, *args)
+
     async def get_request_auth_headers(self):
         url, data, headers = auth.create_access_token_request_params(self)
-        async with aiohttp.ClientSession() as session:
+        session = self.get_client_session()
+        try:
             async with session.post(url, data=data, headers=headers) as response:
+                if response.status != 200:
+                    # keep the current token, it may still be valid (e.g. when
+                    # refreshed ahead of its expiry)
+                    self._token_refresh_backoff.failed()
+                    logger.warning(
+                        {
+                            "message": "access token request failed",
+                            "url": url,
+                            "status": response.status,
+                        }
+                    )
+                    return
                 response_json = await response.json()
-                self.access_token = response_json["access_token"]
-                self.headers.update(
-                    {
-                        "Authorization": "Bearer {}".format(self.access_token),
-                        "apikey": self.api_key,
-                        "User-Agent": self.user_agent,
-                    }
-                )
+        except aiohttp.ClientError:
+            self._token_refresh_backoff.failed()
+            raise
+
+        self._token_refresh_backoff.succeeded()
+        access_token = response_json["access_token"]
+        expires_at = auth.get_access_token_expiry(response_json)
+        self._set_access_token(access_token, expires_at)
+
+        if self.token_cache is not None and expires_at is not None:
+            await self._run_in_executor(
+                self.token_cache.set,
+                auth.get_token_cache_key(self),
+                access_token,
+                expires_at,
+            )
+
+    async def _load_cached_access_token(self, stale_authorization=None):
+        if self.token_cache is None:
+            return False
+
+        cached = await self._run_in_executor(
+            self.token_cache.get, auth.get_token_cache_key(self)
+        )
+        if cached is None:
+            return False
+
+        access_token, expires_at = cached
+        if (
+            expires_at - time.time() <= self.token_refresh_skew
+            or "Bearer {}".format(access_token) == stale_authorization
+        ):
+            return False
+
+        self._set_access_token(access_token, expires_at)
+        return True
+
+    async def _fetch_access_token(self, stale_authorization=None):
+        if await self._load_cached_access_token(stale_authorization):
+            return
+        if not self._token_refresh_backoff.is_waiting():
+            await self.get_request_auth_headers()
+
+    async def refresh_access_token(self, stale_authorization=None):
+        # single-flight: concurrent requests failing with the same token await
+        # one shared token request and reuse its result
+        authorization = self.headers.get("Authorization")
+        if authorization is not None and authorization != stale_authorization:
+            return
+
+        task = self._token_refresh_task
+        if (
+            task is None
+            or task.done()
+            or task.get_loop() is not asyncio.get_running_loop()
+        ):
+            task = asyncio.ensure_future(self._fetch_access_token(stale_authorization))
+            self._token_refresh_task = task
+        await asyncio.shield(task)
+
+    async def _refresh_access_token_ahead(self):
+        if not self.access_token and not self._token_cache_checked:
+            # reuse a token cached by another session or process, if any
+            self._token_cache_checked = True
+            await self._load_cached_access_token()
+
+        expires_at = self.access_token_expires_at
+        if not self.access_token or expires_at is None:
+            return
+
+        remaining = expires_at - time.time()
+        if remaining > self.token_refresh_skew:
+            return
+        if self._token_refresh_backoff.is_waiting():
+            # the last token request failed
+            return
+
+        if remaining <= 0:
+            await self.refresh_access_token(self.headers.get("Authorization"))
+            return
+
+        # still valid, keep using it while a new one is fetched
+        task = self._token_refresh_task
+        if (
+            task is not None
+            and not task.done()
+            and task.get_loop() is asyncio.get_running_loop()
+        ):
+            return
+        task = asyncio.ensure_future(
+            self._fetch_access_token(self.headers.get("Authorization"))
+        )
+        task.add_done_callback(_log_background_token_refresh_failure)
+        self._token_refresh_task = task
+
+    def _bind_json_codec(self, response):
+        # response.json() decodes with the session's codec
+        if self.json_codec.name != "json":
+            response.json = functools.partial(
+                response.json, loads=self.json_codec.loads
+            )
+        return response
+
+    def _get_request_headers(self, headers=None):
+        request_headers = {
+            "Accept-Encoding": self.accept_encoding
+            or compression.get_accept_encoding(_AIOHTTP_ENCODINGS)
+        }
+        request_headers.update(self.headers)
+        request_headers.update(headers or {})
+        return request_headers
 
     @asynccontextmanager
     async def request_context_manager(self, method, url, *args, **kwargs):
@@ -83,31 +484,480 @@ class TrustpilotAsyncSession:
 
         cleaned_url = utils.get_cleaned_url(url, self.api_host, self.api_version)
 
-        authenticate_and_retry = False
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            http_method = getattr(session, method)
-            async with http_method(cleaned_url, *args, **kwargs) as response:
-                if response.status in (401, 403):
-                    authenticate_and_retry = True
-                else:
-                    yield response
+        await self._refresh_access_token_ahead()
+        headers = kwargs.pop("headers", None)
+        if kwargs.get("json") is not None:
+            headers = encode_json_body(self.json_codec, kwargs, headers)
+        if self.request_compression_min_size is not None:
+            headers = compression.compress_request_body(
+                kwargs, headers, self.request_compression_min_size
+            )
+        if self._pre_hooks:
+            headers = dict(headers or {})
+            for hook in self._pre_hooks:
+                await _run_hook(hook, self, method, cleaned_url, headers)
+        session = self.get_client_session()
+        http_method = getattr(session, method)
 
-        if authenticate_and_retry:
-            # first try ended in not-authenticated
-            # trying again
-            await self.get_request_auth_headers()
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                http_method = getattr(session, method)
-                async with http_method(cleaned_url, *args, **kwargs) as response:
-                    yield response
+        authenticate_and_retry = True
+        retry_history = []
+        started = time.monotonic()
+        timings = RequestTimings() if self._metrics_hooks else None
+        response = error = None
+        responded = False
+        try:
+            while True:
+                if self.rate_limiter is not None:
+                    delay = self.rate_limiter.reserve(self.api_key, cleaned_url)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                request_headers = self._get_request_headers(headers)
+                async with http_method(
+                    cleaned_url,
+                    *args,
+                    headers=request_headers,
+                    trace_request_ctx=timings,
+                    **kwargs
+                ) as response:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.update_from_response(
+                            self.api_key, cleaned_url, response.status, response.headers
+                        )
+                    if authenticate_and_retry and response.status in (401, 403):
+                        retry_delay = None
+                    else:
+                        retry_delay = self.retry_policy.get_retry_delay(
+                            method,
+                            response.status,
+                            len(retry_history),
+                            time.monotonic() - started,
+                            response.headers.get("Retry-After"),
+                        )
+                        if retry_delay is None:
+                            response.retry_history = retry_history
+                            response.metrics_timings = timings
+                            for hook in self._post_hooks:
+                                await _run_hook(hook, self, response)
+                            responded = True
+                            yield self._bind_json_codec(response)
+                            return
+
+                if retry_delay is None:
+                    # first try ended in not-authenticated
+                    # trying again
+                    authenticate_and_retry = False
+                    await self.refresh_access_token(
+                        request_headers.get("Authorization")
+                    )
+                    continue
+
+                retry_history.append(
+                    RetryAttempt(len(retry_history) + 1, response.status, retry_delay)
+                )
+                logger.debug(
+                    "retrying {} {} after {} in {:.2f}s".format(
+                        method, cleaned_url, response.status, retry_delay
+                    )
+                )
+                await asyncio.sleep(retry_delay)
+        except BaseException as e:
+            # errors raised by the caller while using the response are not
+            # errors of the request
+            if not responded:
+                error = e
+            raise
+        finally:
+            if timings is not None:
+                self._emit_metrics(
+                    method,
+                    cleaned_url,
+                    response if responded else None,
+                    error,
+                    timings,
+                    retries=len(retry_history),
+                    reauthentications=0 if authenticate_and_retry else 1,
+                )
+
+    def _emit_metrics(self, method, url, response, error, timings, **values):
+        if error is not None:
+            values["error"] = type(error).__name__
+        if response is not None:
+            values["status"] = response.status
+            timings.stop("body_read")
+            if "response_size" not in timings.sizes and response._body is not None:
+                values["response_size"] = len(response._body)
+            if "response_wire_size" not in timings.sizes:
+                values["response_wire_size"] = self._get_wire_size(
+                    response,
+                    values.get("response_size", timings.sizes.get("response_size")),
+                )
+        # aiohttp resolves the host while connecting
+        if "connect" in timings.phases and "dns" in timings.phases:
+            timings.phases["connect"] -= timings.phases["dns"]
+        emit_request_metrics(
+            self._metrics_hooks, timings.to_metrics(method, url, **values)
+        )
+
+    def _get_wire_size(self, response, response_size):
+        # aiohttp only hands out decompressed bodies
+        if not response.headers.get("Content-Encoding"):
+            return response_size
+        content_length = response.headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit():
+            return int(content_length)
+        return None
+
+    def register_pre_hook(self, hook):
+        # hook(session, method, url, headers), may be a coroutine function and
+        # change the headers
+        self._pre_hooks.append(hook)
+
+    def register_post_hook(self, hook):
+        # hook(session, response), may be a coroutine function
+        self._post_hooks.append(hook)
+
+    def register_metrics_hook(self, hook):
+        # hook(metrics) is called with a RequestMetrics after each request
+        self._metrics_hooks.append(hook)
+
+    async def _run_response_cache(self, method, *args):
+        if isinstance(self.response_cache.backend, MemoryCacheBackend):
+            return method(*args)
+        return await self._run_in_executor(method, *args)
+
+    async def _cached_get(self, url, *args, **kwargs):
+        cache = self.response_cache
+        cleaned_url = utils.get_cleaned_url(url, self.api_host, self.api_version)
+        headers = dict(kwargs.pop("headers", None) or {})
+        request_headers = self._get_request_headers(headers)
+        key = cache.get_key(cleaned_url, kwargs.get("params"), request_headers)
+
+        entry, fresh = await self._run_response_cache(
+            cache.lookup, key, request_headers
+        )
+        if fresh:
+            return self._bind_json_codec(CachedResponse(entry))
+        if entry is not None:
+            headers.update(cache.get_conditional_headers(entry))
+
+        response = await self._send_get(cleaned_url, *args, headers=headers, **kwargs)
+        # read by _send_get, aiohttp won't read() a released response again
+        body = response._body
+
+        if entry is not None and response.status == 304:
+            entry = await self._run_response_cache(
+                cache.revalidate, key, entry, response.headers, request_headers
+            )
+            return self._bind_json_codec(CachedResponse(entry))
+
+        await self._run_response_cache(
+            cache.store,
+            key,
+            str(response.url),
+            response.status,
+            response.headers,
+            body,
+            request_headers,
+        )
+        response.from_cache = False
+        return response
+
+    async def _coalesced_get(self, url, *args, **kwargs):
+        # identical GETs made while one is in flight await it and share its
+        # (buffered) response instead of making their own request
+        cleaned_url = utils.get_cleaned_url(url, self.api_host, self.api_version)
+        key_kwargs = dict(kwargs)
+        headers = self._get_request_headers(key_kwargs.pop("headers", None))
+        key = utils.get_request_fingerprint(
+            "GET", cleaned_url, headers=headers, args=args, **key_kwargs
+        )
+
+        def forget(task):
+            if self._inflight_requests.get(key) is task:
+                del self._inflight_requests[key]
+
+        task = self._inflight_requests.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._get(cleaned_url, *args, **kwargs))
+            task.add_done_callback(forget)
+            self._inflight_requests[key] = task
+        # a cancelled caller must not cancel the request of the others
+        return await asyncio.shield(task)
+
+    async def _get(self, url, *args, **kwargs):
+        if self.response_cache is not None:
+            return await self._cached_get(url, *args, **kwargs)
+        return await self._send_get(url, *args, **kwargs)
+
+    async def _read_get(self, url, *args, **kwargs):
+        async with self.request_context_manager(
+            "get", url, *args, **kwargs
+        ) as response:
+            await response.read()
+            return response
+
+    async def _send_get(self, url, *args, **kwargs):
+        if self.hedge_policy is None:
+            return await self._read_get(url, *args, **kwargs)
+        return await self._hedged_get(url, *args, **kwargs)
+
+    async def _send_hedge_attempt(self, call, role, url, args, kwargs):
+        started = time.monotonic()
+        with call.attempt(role):
+            response = await self._read_get(url, *args, **kwargs)
+        self.hedge_policy.record(time.monotonic() - started)
+        return response
+
+    async def _hedged_get(self, url, *args, **kwargs):
+        # sends a hedge when the GET hasn't answered within the policy's delay
+        # and returns the first response below 500, cancelling the other
+        policy = self.hedge_policy
+        call = HedgedCall()
+        delay = policy.start()
+        if delay is None:
+            try:
+                return await self._send_hedge_attempt(
+                    call, "primary", url, args, kwargs
+                )
+            finally:
+                call.decide("primary")
+
+        primary = asyncio.ensure_future(
+            self._send_hedge_attempt(call, "primary", url, args, kwargs)
+        )
+        attempts = {primary: "primary"}
+        winner = None
+        try:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            if not done and policy.acquire():
+                call.hedged = True
+                hedge = asyncio.ensure_future(
+                    self._send_hedge_attempt(call, "hedge", url, args, kwargs)
+                )
+                attempts[hedge] = "hedge"
+
+            pending = set(attempts)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in attempts:
+                    if (
+                        task in done
+                        and task.exception() is None
+                        and task.result().status < 500
+                    ):
+                        winner = task
+                        break
+            # neither answered well, the primary's outcome is used
+            winner = winner or primary
+        finally:
+            losers = [task for task in attempts if task is not winner]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.wait(losers)
+            call.decide(attempts.get(winner))
+
+        if attempts[winner] == "hedge":
+            policy.record_win()
+        return winner.result()
 
     async def authenticated_request(self, method, url, *args, **kwargs):
+        if method == "get":
+            if self.coalesce_requests:
+                return await self._coalesced_get(url, *args, **kwargs)
+            return await self._get(url, *args, **kwargs)
+
         async with self.request_context_manager(
             method, url, *args, **kwargs
         ) as response:
             await response.read()
             return response
 
+    async def _run_request_spec(self, index, spec):
+        try:
+            method, url, kwargs = utils.get_request_spec_args(spec)
+            response = await self.authenticated_request(method, url, **kwargs)
+        except Exception as e:
+            return utils.BatchResult(index, spec, None, e)
+        return utils.BatchResult(index, spec, response, None)
+
+    async def map(self, specs, concurrency=10, ordered=False):
+        # runs request specs from an (async) iterable with at most `concurrency`
+        # requests in flight, only pulling new specs as requests finish, and
+        # yields a BatchResult per spec as completed (or in input order)
+        specs = _iterate(specs).__aiter__()
+        pending = collections.deque() if ordered else set()
+        index = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        spec = await specs.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(self._run_request_spec(index, spec))
+                    index += 1
+                    if ordered:
+                        pending.append(task)
+                    else:
+                        pending.add(task)
+
+                if not pending:
+                    return
+
+                if ordered:
+                    result = await pending[0]
+                    pending.popleft()
+                    yield result
+                else:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def gather_requests(self, specs, concurrency=10):
+        results = [result async for result in self.map(specs, concurrency)]
+        return sorted(results, key=lambda result: result.index)
+
+    async def _get_page(self, url, **kwargs):
+        response = await self.get(url, **kwargs)
+        response.raise_for_status()
+        return await response.json()
+
+    async def _fetch_pages(self, url, pages, **kwargs):
+        try:
+            while url:
+                page = await self._get_page(url, **kwargs)
+                await pages.put(page)
+                url = utils.get_next_page_url(page)
+                # the next page links already hold the query parameters
+                kwargs.pop("params", None)
+            await pages.put(_end_of_pages)
+        except Exception as e:
+            await pages.put(e)
+
+    async def _iter_pages_concurrently(
+        self, url, concurrency, items_key, total_key, kwargs
+    ):
+        page = await self._get_page(url, **kwargs)
+        yield page
+
+        specs = utils.get_page_request_specs(
+            url, page, items_key=items_key, total_key=total_key, **kwargs
+        )
+        if specs is None:
+            # no total count, fall back to following the next page links
+            next_url = utils.get_next_page_url(page)
+            if next_url:
+                kwargs.pop("params", None)
+                async for page in self.iter_pages(next_url, **kwargs):
+                    yield page
+            return
+
+        async for result in self.map(specs, concurrency=concurrency, ordered=True):
+            if result.error is not None:
+                raise result.error
+            result.response.raise_for_status()
+            yield await result.response.json()
+
+    async def iter_pages(
+        self,
+        url,
+        prefetch=1,
+        concurrency=None,
+        items_key=None,
+        total_key=None,
+        **kwargs
+    ):
+        # yields the json content of each page of a list endpoint by following
+        # its next-page links, fetching up to `prefetch` pages ahead while the
+        # current one is processed.
+        # With `concurrency`, pages are instead requested in parallel (and yielded
+        # in order) once the first page tells the total number of items
+        if concurrency:
+            async for page in self._iter_pages_concurrently(
+                url, concurrency, items_key, total_key, kwargs
+            ):
+                yield page
+            return
+
+        if prefetch < 1:
+            while url:
+                page = await self._get_page(url, **kwargs)
+                yield page
+                url = utils.get_next_page_url(page)
+                kwargs.pop("params", None)
+            return
+
+        pages = asyncio.Queue(maxsize=prefetch)
+        task = asyncio.ensure_future(self._fetch_pages(url, pages, **kwargs))
+        try:
+            while True:
+                page = await pages.get()
+                if page is _end_of_pages:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            task.cancel()
+
+    async def iter_items(
+        self, url, items_key=None, prefetch=1, concurrency=None, model=None, **kwargs
+    ):
+        async for page in self.iter_pages(
+            url,
+            prefetch=prefetch,
+            concurrency=concurrency,
+            items_key=items_key,
+            **kwargs
+        ):
+            for item in utils.get_page_items(page, items_key):
+                yield item if model is None else model(item)
+
+    async def iter_json_items(
+        self, url, items_key=None, chunk_size=64 * 1024, model=None, **kwargs
+    ):
+        # parses the items of a single response while it is downloaded, so
+        # the whole body is never held in memory
+        parser = streaming.JsonItemParser(items_key, self.json_codec.loads)
+        if _HAS_REQUEST_AUTO_DECOMPRESS or self.http2:
+            # the body is decompressed here while it is downloaded, which
+            # also tells its size on the wire
+            headers = {
+                "Accept-Encoding": self.accept_encoding
+                or compression.get_accept_encoding()
+            }
+            headers.update(kwargs.pop("headers", None) or {})
+            kwargs.update(headers=headers, auto_decompress=False)
+        async with self.request_context_manager("get", url, **kwargs) as response:
+            response.raise_for_status()
+            timings = response.metrics_timings
+            decompressor = compression.Decompressor(
+                response.headers.get("Content-Encoding")
+                if kwargs.get("auto_decompress") is False
+                else None
+            )
+            async for chunk in response.content.iter_chunked(chunk_size):
+                data = decompressor.decompress(chunk)
+                if timings is not None:
+                    timings.add_size("response_wire_size", len(chunk))
+                    timings.add_size("response_size", len(data))
+                for item in parser.feed(data):
+                    yield item if model is None else model(item)
+            for item in parser.feed(decompressor.flush()):
+                yield item if model is None else model(item)
+        parser.close()
+
     async def post(self, url, *args, **kwargs):
         return await self.authenticated_request("post", url, *args, **kwargs)
 
@@ -121,9 +971,138 @@ class TrustpilotAsyncSession:
         return await self.authenticated_request("delete", url, *args, **kwargs)
 
 
-default_session = TrustpilotAsyncSession()
-get = default_session.get
-post = default_session.post
-put = default_session.put
-delete = default_session.delete
-request_context_manager = default_session.request_context_manager
+class AsyncSessionPool:
+    # TrustpilotAsyncSessions by credentials (utils.get_session_key) for acting
+    # on behalf of many business users: each session keeps its own access
+    # token, all of them share one aiohttp connector. The least recently used
+    # sessions are closed beyond `max_sessions` or after `idle_timeout` seconds
+    # unused, their tokens are kept in the token cache
+    def __init__(self, max_sessions=1000, idle_timeout=900, **defaults):
+        # defaults are setup() arguments for every session
+        if defaults.get("token_cache") is None and not environ.get(
+            "TRUSTPILOT_TOKEN_CACHE_PATH"
+        ):
+            defaults["token_cache"] = MemoryTokenCache()
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.defaults = defaults
+        self.connector = None
+        self._connector_loop = None
+        self._sessions = collections.OrderedDict()
+
+    def _get_connector(self):
+        # like the pooled session of a TrustpilotAsyncSession, the connector is
+        # bound to the loop it was created in
+        loop = asyncio.get_running_loop()
+        if (
+            self.connector is None
+            or self.connector.closed
+            or self._connector_loop is not loop
+        ):
+            self.connector = aiohttp.TCPConnector(
+                limit=self.defaults.get("connection_limit", 100),
+                limit_per_host=self.defaults.get("connection_limit_per_host", 0),
+                keepalive_timeout=self.defaults.get("keepalive_timeout", 15),
+                ttl_dns_cache=self.defaults.get("dns_cache_ttl", 10),
+            )
+            self._connector_loop = loop
+        return self.connector
+
+    def _evict(self, now):
+        evicted = []
+        for key, (session, last_used, _) in list(self._sessions.items()):
+            if (
+                now - last_used < self.idle_timeout
+                and len(self._sessions) < self.max_sessions
+            ):
+                break
+            del self._sessions[key]
+            evicted.append(session)
+        return evicted
+
+    async def get(self, **kwargs):
+        # the session for these credentials (and any other setup() arguments
+        # given the first time), created when there is none
+        kwargs = dict(self.defaults, **kwargs)
+        key = utils.get_session_key(**kwargs)
+        connector = self._get_connector()
+        entry = self._sessions.pop(key, None)
+        evicted = self._evict(time.monotonic())
+        # compared with the arguments a session was set up with, setup() fills
+        # in defaults from the environment
+        credentials = (kwargs.get("password"), kwargs.get("api_secret"))
+        if entry is None:
+            session = TrustpilotAsyncSession(connector=connector, **kwargs)
+        else:
+            session, _, setup_credentials = entry
+            session.connector = connector
+            if credentials == (None, None) or credentials == setup_credentials:
+                credentials = setup_credentials
+            else:
+                # changed credentials of the same user
+                session.setup(connector=connector, **kwargs)
+        self._sessions[key] = (session, time.monotonic(), credentials)
+        for evicted_session in evicted:
+            await evicted_session.aclose()
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def aclose(self):
+        sessions = [entry[0] for entry in self._sessions.values()]
+        self._sessions.clear()
+        connector, self.connector = self.connector, None
+        for session in sessions:
+            await session.aclose()
+        if connector is not None and not connector.closed:
+            await connector.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+async def get_session(**kwargs):
+    # a session of the module wide AsyncSessionPool
+    return await _get_module_session("_session_cache").get(**kwargs)
+
+
+_module_sessions = {
+    "default_session": TrustpilotAsyncSession,
+    "_session_cache": AsyncSessionPool,
+}
+# module level shortcuts to the methods of default_session
+_default_session_methods = (
+    "get",
+    "post",
+    "put",
+    "delete",
+    "request_context_manager",
+    "aclose",
+)
+
+
+def _get_module_session(name="default_session"):
+    # default_session and _session_cache are created on first use rather than
+    # on import, once created (or patched) they are plain module attributes
+    module_globals = globals()
+    if name not in module_globals:
+        module_globals[name] = _module_sessions[name]()
+    return module_globals[name]
+
+
+def __getattr__(name):
+    if name in _module_sessions:
+        return _get_module_session(name)
+    if name in _default_session_methods:
+        return getattr(_get_module_session(), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(
+        set(globals()) | set(_module_sessions) | set(_default_session_methods)
+    )
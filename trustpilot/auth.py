@@ -1,17 +1,24 @@
-import requests
 import base64
+import functools
+import hashlib
 import logging
-import platform
-from trustpilot import VERSION
+import time
+from urllib.parse import urlparse
 
-OS = platform.system()
-PYTHON_VERSION = platform.python_version()
 SCOPE = "external"
 
 
+@functools.lru_cache(maxsize=None)
 def get_user_agent():
+    # imported here to keep them off the import path of the package
+    import platform
+    from trustpilot import VERSION
+
     user_agent = "python-trustpilot-client?scope={scope}&version={version}&python-version={python_version}&os={os}".format(
-        scope=SCOPE, version=VERSION, python_version=PYTHON_VERSION, os=OS
+        scope=SCOPE,
+        version=VERSION,
+        python_version=platform.python_version(),
+        os=platform.system(),
     )
     return user_agent
 
@@ -42,3 +49,47 @@ def create_access_token_request_params(session):
     }
 
     return url, data, headers
+
+
+def get_access_token_expiry(response_json):
+    # absolute (epoch) expiry of a token from the "expires_in" seconds of the
+    # token issuer response, or None if it is missing
+    try:
+        return time.time() + float(response_json["expires_in"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenRefreshBackoff:
+    # token requests are not sent again for `min_delay` seconds after one
+    # failed, doubling up to `max_delay` while they keep failing, so requests
+    # don't each try while the token issuer is down
+    def __init__(self, min_delay=1, max_delay=60):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.retry_at = 0
+
+    def is_waiting(self):
+        return time.monotonic() < self.retry_at
+
+    def failed(self):
+        self.failures += 1
+        delay = min(self.max_delay, self.min_delay * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + delay
+
+    def succeeded(self):
+        self.failures = 0
+        self.retry_at = 0
+
+
+def get_token_cache_key(session):
+    token_issuer_host = urlparse(session.token_issuer_host).netloc
+    key = "\n".join(
+        [
+            getattr(session, "api_key", None) or "",
+            getattr(session, "username", None) or "",
+            token_issuer_host or session.token_issuer_host,
+        ]
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+INVITATIONS_API_HOST = "https://invitations-api.trustpilot.com"
+
+# a record that was not written, with the status it was answered with or the
+# error raised while sending it
+BulkFailure = namedtuple("BulkFailure", ["index", "record", "status", "error"])
+# outcome of a bulk job: records written in this run, records skipped as done
+# by an earlier run and all failures, including those of earlier runs
+BulkResult = namedtuple("BulkResult", ["sent", "skipped", "failures"])
+
+
+def email_invitations(business_unit_id, host=INVITATIONS_API_HOST, api_version="v1"):
+    # create_request for sending email invitations, the api takes one per
+    # request
+    url = "{}/{}/private/business-units/{}/email-invitations".format(
+        host.rstrip("/"), api_version, business_unit_id
+    )
+
+    def create_request(records):
+        (invitation,) = records
+        return {"method": "post", "url": url, "json": invitation}
+
+    return create_request
+
+
+class Checkpoint:
+    # the records of a bulk job that are done (written or failed), by their
+    # index in the records, and its failures. Saved to `path` (if any) after
+    # each batch, a job started again with the same checkpoint skips the
+    # records already done. Failures are appended to `path`.failures.ndjson
+    # instead, so saving doesn't get slower as they add up
+    def __init__(self, path=None):
+        self.path = path
+        self.failures_path = None if path is None else path + ".failures.ndjson"
+        self.done_below = 0
+        self.done = set()
+        self.failures = []
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except FileNotFoundError:
+            # failures of an earlier job with no checkpoint left
+            try:
+                os.remove(self.failures_path)
+            except FileNotFoundError:
+                pass
+            return
+        self.done_below = state["done_below"]
+        self.done = set(state["done"])
+        failures = [BulkFailure(**failure) for failure in state.get("failures", [])]
+        try:
+            with open(self.failures_path, "r") as failures_file:
+                for line in failures_file:
+                    try:
+                        failures.append(BulkFailure(**json.loads(line)))
+                    except ValueError:  # cut short by a crash
+                        pass
+        except FileNotFoundError:
+            pass
+        # failures of records not checkpointed as done are sent again, the last
+        # failure of a record is kept
+        by_index = {}
+        for failure in failures:
+            if self.is_done(failure.index):
+                by_index.pop(failure.index, None)
+                by_index[failure.index] = failure
+        self.failures = list(by_index.values())
+        # once per job, without the lines cut short or sent again
+        temp_path = "{}.{}.tmp".format(self.failures_path, os.getpid())
+        with open(temp_path, "w") as failures_file:
+            self._write_failures(failures_file, self.failures)
+        os.replace(temp_path, self.failures_path)
+
+    def is_done(self, index):
+        return index < self.done_below or index in self.done
+
+    def add(self, indexes, failures=()):
+        self.done.update(indexes)
+        # only the done records above the first one not done are kept apart
+        while self.done_below in self.done:
+            self.done.remove(self.done_below)
+            self.done_below += 1
+        self.failures.extend(failures)
+        self._append_failures(failures)
+        self.save()
+
+    def _append_failures(self, failures):
+        if self.path is None or not failures:
+            return
+        with open(self.failures_path, "a") as failures_file:
+            self._write_failures(failures_file, failures)
+
+    def _write_failures(self, failures_file, failures):
+        for failure in failures:
+            failures_file.write(json.dumps(failure._asdict()) + "\n")
+
+    def save(self):
+        if self.path is None:
+            return
+        state = {"done_below": self.done_below, "done": sorted(self.done)}
+        # a crash while writing leaves the previous checkpoint intact
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temp_path, self.path)
+
+
+def _get_checkpoint(checkpoint):
+    if isinstance(checkpoint, Checkpoint):
+        return checkpoint
+    return Checkpoint(checkpoint)
+
+
+class _BulkSender:
+    def __init__(
+        self,
+        session,
+        create_request,
+        batch_size=1,
+        concurrency=10,
+        checkpoint=None,
+        get_failures=None,
+    ):
+        # create_request(records) returns the request spec (see
+        # utils.get_request_spec_args) writing a batch of records, and
+        # get_failures(indexes, records, response) the BulkFailures of a
+        # batch the api answered, by default all records when it failed
+        self.session = session
+        self.create_request = create_request
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint = _get_checkpoint(checkpoint)
+        self.get_failures = get_failures
+        self._requested_batches = 0
+
+    def _create_request(self, indexes, records, batches):
+        # batches are kept by the index of their spec in session.map
+        batches[self._requested_batches] = (indexes, records)
+        self._requested_batches += 1
+        return self.create_request(records)
+
+    def _get_error_failures(self, indexes, records, error):
+        return [
+            BulkFailure(
+                index, record, None, "{}: {}".format(type(error).__name__, error)
+            )
+            for index, record in zip(indexes, records)
+        ]
+
+    def _finish_batch(self, indexes, records, failures, counts):
+        self.checkpoint.add(indexes, failures)
+        counts["sent"] += len(indexes) - len(failures)
+        for failure in failures:
+            logger.warning(
+                {
+                    "message": "bulk record failed",
+                    "index": failure.index,
+                    "status": failure.status,
+                    "error": failure.error,
+                }
+            )
+
+    def _get_result(self, counts):
+        return BulkResult(
+            counts["sent"], counts["skipped"], list(self.checkpoint.failures)
+        )
+
+
+class BulkSender(_BulkSender):
+    # writes records in batches with a TrustpilotSession, running up to
+    # `concurrency` batches at once under its rate limiter and retry policy
+    def _iter_specs(self, records, batches, counts):
+        # request specs of the batches of records not done yet
+        indexes, batch = [], []
+        for index, record in enumerate(records):
+            if self.checkpoint.is_done(index):
+                counts["skipped"] += 1
+                continue
+            indexes.append(index)
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield self._create_request(indexes, batch, batches)
+                indexes, batch = [], []
+        if batch:
+            yield self._create_request(indexes, batch, batches)
+
+    def _get_response_failures(self, indexes, records, response):
+        if self.get_failures is not None:
+            return list(self.get_failures(indexes, records, response))
+        if response.ok:
+            return []
+        return [
+            BulkFailure(index, record, response.status_code, response.text)
+            for index, record in zip(indexes, records)
+        ]
+
+    def send(self, records):
+        counts = {"sent": 0, "skipped": 0}
+        self._requested_batches = 0
+        batches = {}
+        specs = self._iter_specs(records, batches, counts)
+        for result in self.session.map(specs, max_workers=self.concurrency):
+            indexes, batch = batches.pop(result.index)
+            if result.error is not None:
+                failures = self._get_error_failures(indexes, batch, result.error)
+            else:
+                failures = self._get_response_failures(indexes, batch, result.response)
+            self._finish_batch(indexes, batch, failures, counts)
+        return self._get_result(counts)
+
+
+class AsyncBulkSender(_BulkSender):
+    # writes records from an (async) iterable in batches with a
+    # TrustpilotAsyncSession, running up to `concurrency` batches at once
+    # under its rate limiter and retry policy
+    async def _iter_records(self, records):
+        if hasattr(records, "__aiter__"):
+            async for record in records:
+                yield record
+        else:
+            for record in records:
+                yield record
+
+    async def _iter_specs(self, records, batches, counts):
+        indexes, batch = [], []
+        index = -1
+        async for record in self._iter_records(records):
+            index += 1
+            if self.checkpoint.is_done(index):
+                counts["skipped"] += 1
+                continue
+            indexes.append(index)
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield self._create_request(indexes, batch, batches)
+                indexes, batch = [], []
+        if batch:
+            yield self._create_request(indexes, batch, batches)
+
+    async def _get_response_failures(self, indexes, records, response):
+        if self.get_failures is not None:
+            failures = self.get_failures(indexes, records, response)
+            if asyncio.iscoroutine(failures):
+                failures = await failures
+            return list(failures)
+        if response.ok:
+            return []
+        text = await response.text()
+        return [
+            BulkFailure(index, record, response.status, text)
+            for index, record in zip(indexes, records)
+        ]
+
+    async def send(self, records):
+        counts = {"sent": 0, "skipped": 0}
+        self._requested_batches = 0
+        batches = {}
+        specs = self._iter_specs(records, batches, counts)
+        async for result in self.session.map(specs, concurrency=self.concurrency):
+            indexes, batch = batches.pop(result.index)
+            if result.error is not None:
+                failures = self._get_error_failures(indexes, batch, result.error)
+            else:
+                failures = await self._get_response_failures(
+                    indexes, batch, result.response
+                )
+            self._finish_batch(indexes, batch, failures, counts)
+        return self._get_result(counts)
@@ -0,0 +1,386 @@
+import json
+import logging
+import os
+import os.path as path
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from trustpilot import utils
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_STATUSES = frozenset([200, 203, 300, 301, 404, 410])
+
+# headers that change the response of an endpoint, the authorization is only
+# part of the key for private endpoints
+_KEY_HEADERS = ("accept", "accept-language")
+
+# headers a 304 response updates on the stored response
+_REVALIDATION_HEADERS = ("cache-control", "expires", "etag", "last-modified", "date")
+
+
+def _get_header(headers, name):
+    value = headers.get(name)
+    if value is None:
+        name = name.lower()
+        for key, header_value in headers.items():
+            if key.lower() == name:
+                return header_value
+    return value
+
+
+def parse_cache_control(value):
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or True
+    return directives
+
+
+def get_vary(headers):
+    # lower cased names of the request headers a response varies on, responses
+    # private to a user vary on their authorization
+    vary = [
+        name.strip().lower()
+        for name in (_get_header(headers, "Vary") or "").split(",")
+        if name.strip()
+    ]
+    cache_control = parse_cache_control(_get_header(headers, "Cache-Control"))
+    if "private" in cache_control and "authorization" not in vary:
+        vary.append("authorization")
+    return tuple(vary)
+
+
+def _parse_http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class CacheEntry:
+    __slots__ = (
+        "url",
+        "status",
+        "headers",
+        "body",
+        "expires_at",
+        "etag",
+        "last_modified",
+        "vary",
+    )
+
+    def __init__(self, url, status, headers, body, expires_at, vary=()):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+        # on the entry stored under the key of the request, the names of the
+        # headers whose values are part of the keys of its variants
+        self.vary = tuple(vary)
+        self.etag = _get_header(headers, "ETag")
+        self.last_modified = _get_header(headers, "Last-Modified")
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    @property
+    def revalidatable(self):
+        return bool(self.etag or self.last_modified)
+
+    def is_fresh(self, now=None):
+        return self.expires_at > (now or time.time())
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "status": self.status,
+            "headers": self.headers,
+            "expires_at": self.expires_at,
+            "vary": self.vary,
+        }
+
+    @classmethod
+    def from_dict(cls, values, body):
+        return cls(
+            values["url"],
+            values["status"],
+            values["headers"],
+            body,
+            values["expires_at"],
+            values.get("vary", ()),
+        )
+
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            self._delete(key)
+            self._entries[key] = entry
+            self._size += entry.size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._delete(next(iter(self._entries)))
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def delete(self, key):
+        with self._lock:
+            self._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileCacheBackend:
+    # one file per entry: a json line with the metadata followed by the body
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _get_path(self, key):
+        return path.join(self.directory, key)
+
+    def get(self, key):
+        file_path = self._get_path(key)
+        try:
+            with open(file_path, "rb") as cache_file:
+                values = json.loads(cache_file.readline())
+                body = cache_file.read()
+            os.utime(file_path)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry.from_dict(values, body)
+
+    def set(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        file_path = self._get_path(key)
+        temp_path = "{}.{}.tmp".format(file_path, threading.get_ident())
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as cache_file:
+                cache_file.write(json.dumps(entry.to_dict()).encode("utf-8") + b"\n")
+                cache_file.write(entry.body)
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            logger.warning({"message": "response cache not writable", "error": str(e)})
+            return
+        self._evict()
+
+    def _evict(self):
+        files = []
+        size = 0
+        for cache_file in os.scandir(self.directory):
+            if cache_file.is_file() and not cache_file.name.endswith(".tmp"):
+                stat = cache_file.stat()
+                files.append((stat.st_mtime, stat.st_size, cache_file.path))
+                size += stat.st_size
+
+        # least recently used first
+        for _, file_size, file_path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            self._remove(file_path)
+            size -= file_size
+
+    def _remove(self, file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def delete(self, key):
+        self._remove(self._get_path(key))
+
+    def clear(self):
+        for cache_file in os.scandir(self.directory):
+            self._remove(cache_file.path)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        backend=None,
+        default_ttl=0,
+        max_entries=1024,
+        max_bytes=64 * 1024 * 1024,
+        private_path_markers=("/private/",),
+    ):
+        # default_ttl is used for responses without Cache-Control/Expires headers,
+        # with 0 such responses are revalidated on every request (if possible)
+        if backend is None:
+            backend = MemoryCacheBackend(max_entries, max_bytes)
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.private_path_markers = private_path_markers
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def is_private(self, url):
+        url_path = urlparse(url).path
+        return any(marker in url_path for marker in self.private_path_markers)
+
+    def get_key(self, url, params=None, headers=None):
+        # responses of public endpoints are the same for every user, so the
+        # authorization is only part of the key for private endpoints
+        key_headers = _KEY_HEADERS
+        if self.is_private(url):
+            key_headers += ("authorization",)
+        headers = dict(
+            (name.lower(), value)
+            for name, value in (headers or {}).items()
+            if name.lower() in key_headers
+        )
+        return utils.get_request_fingerprint("GET", url, params, headers)
+
+    def _get_variant_key(self, key, vary, request_headers):
+        # the key of the response to a request whose headers named by vary have
+        # these values
+        headers = dict(
+            (name.lower(), value)
+            for name, value in (request_headers or {}).items()
+            if name.lower() in vary
+        )
+        return utils.get_request_fingerprint("GET", key, headers=headers)
+
+    def _get_entry_key(self, key, request_headers):
+        # responses with a Vary header are stored under a variant key, the key
+        # of the request then holds an entry naming the headers they vary on
+        entry = self.backend.get(key)
+        if entry is not None and entry.vary:
+            return self._get_variant_key(key, entry.vary, request_headers)
+        return key
+
+    def lookup(self, key, request_headers=None):
+        # returns (entry, fresh), a stale entry may be revalidated
+        key = self._get_entry_key(key, request_headers)
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, False
+
+        if entry.is_fresh():
+            self._count("hits")
+            return entry, True
+
+        if not entry.revalidatable:
+            self.backend.delete(key)
+            return None, False
+
+        return entry, False
+
+    def get_conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def get_expiry(self, headers, now=None):
+        # expiry from the response headers, or None when it must not be stored
+        now = now or time.time()
+        cache_control = parse_cache_control(_get_header(headers, "Cache-Control"))
+        if "no-store" in cache_control or "*" in get_vary(headers):
+            return None
+
+        if "no-cache" in cache_control:
+            return now
+        try:
+            return now + int(cache_control["max-age"])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        expires = _parse_http_date(_get_header(headers, "Expires"))
+        if expires is not None:
+            return expires
+        return now + self.default_ttl
+
+    def store(self, key, url, status, headers, body, request_headers=None):
+        self._count("misses")
+        if status not in CACHEABLE_STATUSES:
+            return None
+
+        expires_at = self.get_expiry(headers)
+        if expires_at is None:
+            return None
+
+        entry = CacheEntry(url, status, dict(headers), body, expires_at)
+        if not entry.is_fresh() and not entry.revalidatable:
+            return None
+
+        vary = get_vary(headers)
+        if vary:
+            self.backend.set(key, CacheEntry(url, 0, {}, b"", float("inf"), vary))
+            key = self._get_variant_key(key, vary, request_headers)
+        self.backend.set(key, entry)
+        return entry
+
+    def revalidate(self, key, entry, headers, request_headers=None):
+        # a 304 response confirmed the entry, update it with the new headers
+        self._count("revalidations")
+        key = self._get_entry_key(key, request_headers)
+        entry_headers = dict(
+            (name, value)
+            for name, value in entry.headers.items()
+            if name.lower() not in _REVALIDATION_HEADERS
+        )
+        entry_headers.update(
+            (name, value)
+            for name, value in headers.items()
+            if name.lower() in _REVALIDATION_HEADERS
+        )
+        expires_at = self.get_expiry(entry_headers)
+        entry = CacheEntry(
+            entry.url, entry.status, entry_headers, entry.body, expires_at or 0
+        )
+        if expires_at is not None:
+            self.backend.set(key, entry)
+        return entry
+
+    def clear(self):
+        self.backend.clear()
@@ -3,17 +3,36 @@ import json
 import logging
 import sys
 import os.path as path
-from inspect import getsourcefile
 
 
-current_dir = path.dirname(path.abspath(getsourcefile(lambda: 0)))
-sys.path.insert(0, current_dir[: current_dir.rfind(path.sep)])
+if not __package__:
+    # run as a script, make the trustpilot package importable
+    sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
 logger = logging.getLogger(__name__)
 
-from trustpilot import client, auth, VERSION
+from trustpilot import auth
+from trustpilot.json_codec import get_json_codec
+from trustpilot.token_cache import FileTokenCache
 from collections import OrderedDict
 
 
+def _get_client():
+    # trustpilot.client (and requests) is imported when a command needs it
+    # rather than on import, once imported (or patched) it is `client`
+    module_globals = globals()
+    if "client" not in module_globals:
+        from trustpilot import client
+
+        module_globals["client"] = client
+    return module_globals["client"]
+
+
+def __getattr__(name):
+    if name == "client":
+        return _get_client()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
 @click.pass_context
 def get_verbosity(ctx):
     return ctx.meta.get("trustpilot.verbosity", 0)
@@ -25,6 +44,11 @@ def get_output_format(ctx):
     return output_format
 
 
+@click.pass_context
+def get_codec(ctx):
+    return ctx.meta.get("trustpilot.jsoncodec") or get_json_codec("json")
+
+
 def format_response(response):
     content = response.text
 
@@ -48,18 +72,79 @@ def format_response(response):
         lines.extend(["content", content])
         return "\n".join(lines)
     elif output_format == "json":
+        output = get_response_output(response)
+        return get_codec().dumps(output, indent=True).decode("utf-8")
+    elif output_format == "ndjson":
+        return format_json_line(get_response_output(response))
+
+
+def get_response_output(response, output=None):
+    output = OrderedDict() if output is None else output
+    output["url"] = response.url
+    output["status"] = response.status_code
+    if get_verbosity():
+        headers = response.headers
+        output["headers"] = OrderedDict((k, headers[k]) for k in headers)
+    output["content"] = get_response_content(response)
+    return output
+
+
+def format_json_line(content):
+    # compact json on a single line, for ndjson output
+    return get_codec().dumps(content).decode("utf-8")
+
+
+def get_response_content(response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def get_batch_spec(request):
+    # a batch input line as request spec, json data is sent as json
+    spec = dict(request)
+    data = spec.pop("data", None)
+    if isinstance(data, (dict, list)):
+        spec["json"] = data
+    elif data is not None:
+        spec["data"] = data
+    return spec
+
+
+def iter_batch_specs(lines, line_numbers):
+    # line_numbers gets the input line of each spec by its index
+    index = 0
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
         try:
-            content = response.json()
-        except ValueError:
-            pass
-        output = OrderedDict()
-        output["url"] = response.url
-        output["status"] = response.status_code
-        if get_verbosity():
-            headers = response.headers
-            output["headers"] = OrderedDict((k, headers[k]) for k in headers)
-        output["content"] = content
-        return json.dumps(output, indent=2)
+            request = get_codec().loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("expected an object")
+        except ValueError as e:
+            # reported right away, the other lines are still sent
+            click.echo(
+                format_batch_result(
+                    line_number, error="invalid request line: {}".format(e)
+                )
+            )
+            continue
+        line_numbers[index] = line_number
+        index += 1
+        yield get_batch_spec(request)
+
+
+def format_batch_result(line_number, response=None, error=None):
+    output = OrderedDict()
+    output["line"] = line_number
+    if isinstance(error, Exception):
+        output["error"] = "{}: {}".format(type(error).__name__, error)
+    elif error is not None:
+        output["error"] = error
+    else:
+        get_response_output(response, output)
+    return format_json_line(output)
 
 
 @click.group(invoke_without_command=True)
@@ -91,15 +176,28 @@ def format_response(response):
     help="Trustpilot password",
     envvar="TRUSTPILOT_PASSWORD",
 )
+@click.option(
+    "--token_cache",
+    type=click.Path(dir_okay=False),
+    help="File to cache access tokens in between runs",
+    envvar="TRUSTPILOT_TOKEN_CACHE_PATH",
+)
 @click.option("--config", "-c", type=click.File("r"), help="Json config file name")
 @click.option("--env", "-e", type=click.File("r"), help="Dot env file")
 @click.option(
     "--outputformat",
     "-of",
-    type=click.Choice(["json", "raw"], case_sensitive=False),
+    type=click.Choice(["json", "ndjson", "raw"], case_sensitive=False),
     default="json",
     help="Output format, default=json",
 )
+@click.option(
+    "--json_codec",
+    type=click.Choice(["auto", "orjson", "ujson", "json"], case_sensitive=False),
+    default="json",
+    help="Json codec, default=json (auto for orjson or ujson when installed)",
+    envvar="TRUSTPILOT_JSON_CODEC",
+)
 @click.option("-v", "--verbose", count=True, help="Verbosity level")
 def cli(ctx, **kwargs):
     splash = r"""
@@ -146,6 +244,13 @@ def cli(ctx, **kwargs):
     output_format = kwargs.get("outputformat")
     ctx.meta["trustpilot.outputformat"] = output_format
 
+    # setup json codec
+    try:
+        json_codec = get_json_codec(kwargs.pop("json_codec").lower())
+    except ImportError as e:
+        raise click.BadParameter(str(e), param_hint="--json_codec")
+    ctx.meta["trustpilot.jsoncodec"] = json_codec
+
     # setup logging (increasing information levels)
     # _ : content, url, status_code
     # v : headers
@@ -155,14 +260,21 @@ def cli(ctx, **kwargs):
     logging_level = levels.get(verbosity, logging.CRITICAL)
 
     logger.setLevel(logging_level)
-    if logging_level > logging.DEBUG:
-        # disable urllib3 logging
-        client.disable_ssl_warnings()
 
     if ctx.invoked_subcommand is None:
         click.echo("\n".join([splash, ctx.get_help()]))
         return
 
+    _get_client()
+    if logging_level > logging.DEBUG:
+        # disable urllib3 logging
+        client.disable_ssl_warnings()
+
+    token_cache_path = kwargs.pop("token_cache") or values_dict.get(
+        "TRUSTPILOT_TOKEN_CACHE_PATH"
+    )
+    token_cache = FileTokenCache(token_cache_path) if token_cache_path else None
+
     # create default session
     try:
         client.default_session.setup(
@@ -184,6 +296,8 @@ def cli(ctx, **kwargs):
             or values_dict.get("TRUSTPILOT_USERNAME", None),
             password=kwargs.pop("password")
             or values_dict.get("TRUSTPILOT_PASSWORD", None),
+            token_cache=token_cache,
+            json_codec=json_codec,
         )
     except KeyError as key:
         raise SystemExit("Missing argument: {}".format(key))
@@ -205,12 +319,34 @@ def create_access_token():
 
 @cli_command
 @click.argument("path")
-def get(path):
+@click.option(
+    "--paginate",
+    is_flag=True,
+    help="Follow the next-page links and write one json line per item",
+)
+@click.option(
+    "--items-key",
+    type=str,
+    help="Key of the items in the pages, default: their first list",
+)
+def get(path, paginate, items_key):
     """
     Send a GET request
     """
-    response = client.get(url=path)
-    click.echo(format_response(response))
+    if not paginate:
+        response = client.get(url=path)
+        click.echo(format_response(response))
+        return
+
+    import requests
+
+    # items are written as they arrive, holding at most a page or two
+    try:
+        for item in client.default_session.iter_items(path, items_key=items_key):
+            click.echo(format_json_line(item))
+    except requests.HTTPError as e:
+        click.echo(format_response(e.response), err=True)
+        sys.exit(1)
 
 
 @cli_command
@@ -277,5 +413,39 @@ def patch(path, data, content_type):
     click.echo(format_response(response))
 
 
+@cli_command
+@click.argument("input", type=click.File("r"), default="-")
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    help="Requests in flight, default=10",
+)
+@click.option(
+    "--ordered",
+    is_flag=True,
+    help="Output results in input order, default: as they complete",
+)
+def batch(input, concurrency, ordered):
+    """
+    Send the requests of a NDJSON file (or stdin) over one session
+
+    Each line is a json object with "method" (default GET), "path" (or "url")
+    and optionally "data", "headers" and "params". A json result with the
+    input "line" is written per request as it completes.
+    """
+    line_numbers = {}
+    specs = iter_batch_specs(input, line_numbers)
+    results = client.default_session.map(
+        specs, max_workers=concurrency, ordered=ordered
+    )
+    for result in results:
+        click.echo(
+            format_batch_result(
+                line_numbers.pop(result.index), result.response, result.error
+            )
+        )
+
+
 if __name__ == "__main__":
     cli()
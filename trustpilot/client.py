@@ -1,13 +1,64 @@
 # -*- coding: utf-8 -*-
 import requests
+import collections
+import functools
 import logging
-
-from trustpilot import auth, utils
+import queue
+import threading
+import time
+from concurrent import futures
+
+from trustpilot import adapters, auth, compression, streaming, utils
+from trustpilot.hedging import HedgedCall, emit_request_metrics
+from trustpilot.json_codec import encode_json_body, get_json_codec
+from trustpilot.metrics import RequestTimings
+from trustpilot.retry import RetryAttempt, RetryPolicy
+from trustpilot.token_cache import FileTokenCache, MemoryTokenCache
 from os import environ
+from urllib3.util.request import ACCEPT_ENCODING
 from warnings import warn
 
 logger = logging.getLogger(__name__)
-_session_cache = {}
+_end_of_pages = object()
+
+
+def _decode_json(response, codec, **kwargs):
+    if kwargs:
+        return requests.Response.json(response, **kwargs)
+    try:
+        return codec.loads(response.content)
+    except ValueError as e:
+        raise requests.exceptions.JSONDecodeError(str(e), response.text, 0)
+
+
+def _create_adapter(pool_connections, pool_maxsize, http2=False):
+    if http2:
+        from trustpilot.http2 import HTTP2Adapter
+
+        options = http2 if isinstance(http2, dict) else {}
+        return HTTP2Adapter(pool_maxsize=pool_maxsize, **options)
+    return adapters.TimingHTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize
+    )
+
+
+def _release_response(response):
+    # read the rest of the body of a response that is sent again, so its
+    # keep-alive connection goes back to the pool instead of being closed
+    try:
+        response.content
+    except (
+        requests.exceptions.ChunkedEncodingError,
+        requests.exceptions.ContentDecodingError,
+        requests.exceptions.ConnectionError,
+        RuntimeError,
+    ):
+        response.close()
+
+
+def _close_dropped_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
 
 
 def disable_ssl_warnings():
@@ -31,9 +82,16 @@ def disable_ssl_warnings():
 class TrustpilotSession(requests.Session):
     def __init__(self, **kwargs):
         super(TrustpilotSession, self).__init__()
+        self._token_lock = threading.Lock()
+        self._inflight_lock = threading.Lock()
+        self._inflight_requests = {}
+        self._hedge_executor = None
+        self._hedge_workers = 0
+        self._replaced_adapters = []
         self.setup(**kwargs)
         self._pre_hooks = []
         self._post_hooks = []
+        self._metrics_hooks = []
         self.auth = self._pre_request_callback
 
     def setup(
@@ -48,6 +106,20 @@ class TrustpilotSession(requests.Session):
         token_issuer_path=None,
         token_issuer_host=None,
         user_agent=None,
+        token_refresh_skew=60,
+        token_cache=None,
+        retry_policy=None,
+        rate_limiter=None,
+        pool_connections=10,
+        pool_maxsize=10,
+        response_cache=None,
+        coalesce_requests=False,
+        hedge_policy=None,
+        json_codec=None,
+        http2=False,
+        accept_encoding=None,
+        request_compression_min_size=None,
+        http_adapter=None,
         **kwargs
     ):
         self.api_host = api_host or environ.get(
@@ -66,6 +138,26 @@ class TrustpilotSession(requests.Session):
         self.api_version = api_version or environ.get("TRUSTPILOT_API_VERSION", "v1")
         self.token_issuer_host = token_issuer_host or self.api_host
         self.access_token = access_token
+        self.access_token_expires_at = None
+        self.token_refresh_skew = token_refresh_skew
+        self.token_cache = token_cache
+        if token_cache is None and environ.get("TRUSTPILOT_TOKEN_CACHE_PATH"):
+            self.token_cache = FileTokenCache()
+        self._token_cache_checked = False
+        self._token_refresh_backoff = auth.TokenRefreshBackoff()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.http_adapter = http_adapter
+        self.mount_adapters(pool_connections, pool_maxsize, http2)
+        self.response_cache = response_cache
+        self.coalesce_requests = coalesce_requests
+        self.hedge_policy = hedge_policy
+        self.json_codec = get_json_codec(json_codec)
+        # responses are decoded by urllib3 (or httpx), urllib3 < 2 can't decode
+        # zstd even when zstandard is installed
+        self.accept_encoding = accept_encoding or ACCEPT_ENCODING
+        self.headers["Accept-Encoding"] = self.accept_encoding
+        self.request_compression_min_size = request_compression_min_size
         self.token_issuer_path = token_issuer_path or environ.get(
             "TRUSTPILOT_API_TOKEN_ISSUER_PATH",
             "oauth/oauth-business-users-for-applications/accesstoken",
@@ -84,33 +176,198 @@ class TrustpilotSession(requests.Session):
 
         return self
 
-    def get_request_auth_headers(self):
-        url, data, headers = auth.create_access_token_request_params(self)
-        response = requests.post(url=url, headers=headers, data=data)
-
-        self.access_token = None
-        if response and response.status_code == requests.codes["ok"]:
-            response_json = response.json()
-            self.access_token = response_json["access_token"]
-
+    def _set_access_token(self, access_token, expires_at=None):
+        self.access_token = access_token
+        self.access_token_expires_at = expires_at
         self.headers.update(
             {
-                "Authorization": "Bearer {}".format(self.access_token),
+                "Authorization": "Bearer {}".format(access_token),
                 "apikey": self.api_key,
                 "User-Agent": self.user_agent,
             }
         )
         return self.headers
 
+    def mount_adapters(self, pool_connections, pool_maxsize, http2=None):
+        # pool_maxsize is the number of connections kept per host, requests made
+        # from more threads than that have to wait for a free connection; with
+        # http2 (True or a dict of httpx.Client options) requests are
+        # multiplexed over those connections instead
+        if http2 is None:
+            http2 = getattr(self, "http2", False)
+        shared_adapter = getattr(self, "http_adapter", None)
+        if shared_adapter is not None:
+            # shared with other sessions (e.g. of a SessionPool), which size and
+            # close it
+            self.pool_connections = getattr(
+                shared_adapter, "_pool_connections", pool_connections
+            )
+            self.pool_maxsize = getattr(shared_adapter, "_pool_maxsize", pool_maxsize)
+            self.http2 = http2
+            for prefix in ("https://", "http://"):
+                self.mount(prefix, shared_adapter)
+            self._own_adapter = None
+            return
+
+        own_adapter = getattr(self, "_own_adapter", None)
+        if (
+            own_adapter is not None
+            and self.adapters.get("https://") is own_adapter
+            and (self.pool_connections, self.pool_maxsize, self.http2)
+            == (pool_connections, pool_maxsize, http2)
+        ):
+            return
+
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.http2 = http2
+        adapter = _create_adapter(pool_connections, pool_maxsize, http2)
+        for prefix in ("https://", "http://"):
+            self.mount(prefix, adapter)
+        if own_adapter is not None and own_adapter is not adapter:
+            # other threads may still be sending requests with it
+            self._replaced_adapters.append(own_adapter)
+        self._own_adapter = adapter
+
+    def close(self):
+        # a shared http_adapter is closed by its owner
+        adapters = set(self.adapters.values()) | set(self._replaced_adapters)
+        self._replaced_adapters = []
+        for adapter in adapters:
+            if adapter is not self.http_adapter:
+                adapter.close()
+        hedge_executor, self._hedge_executor = self._hedge_executor, None
+        if hedge_executor is not None:
+            hedge_executor.shutdown(wait=False)
+
+    def get_request_auth_headers(self):
+        url, data, headers = auth.create_access_token_request_params(self)
+        try:
+            response = requests.post(url=url, headers=headers, data=data)
+        except requests.RequestException:
+            self._token_refresh_backoff.failed()
+            raise
+
+        if not response or response.status_code != requests.codes["ok"]:
+            # keep the current token, it may still be valid (e.g. when refreshed
+            # ahead of its expiry)
+            self._token_refresh_backoff.failed()
+            logger.warning(
+                {
+                    "message": "access token request failed",
+                    "url": url,
+                    "status": response.status_code,
+                }
+            )
+            return self.headers
+
+        self._token_refresh_backoff.succeeded()
+        response_json = response.json()
+        access_token = response_json["access_token"]
+        expires_at = auth.get_access_token_expiry(response_json)
+        if self.token_cache is not None and expires_at is not None:
+            self.token_cache.set(
+                auth.get_token_cache_key(self), access_token, expires_at
+            )
+
+        return self._set_access_token(access_token, expires_at)
+
+    def _load_cached_access_token(self, stale_authorization=None):
+        if self.token_cache is None:
+            return False
+
+        cached = self.token_cache.get(auth.get_token_cache_key(self))
+        if cached is None:
+            return False
+
+        access_token, expires_at = cached
+        if (
+            expires_at - time.time() <= self.token_refresh_skew
+            or "Bearer {}".format(access_token) == stale_authorization
+        ):
+            return False
+
+        self._set_access_token(access_token, expires_at)
+        return True
+
+    def refresh_access_token(self, stale_authorization=None):
+        # single-flight: concurrent requests failing with the same token wait for
+        # one token request and reuse its result
+        with self._token_lock:
+            authorization = self.headers.get("Authorization")
+            if authorization is not None and authorization != stale_authorization:
+                return self.headers
+            if self._load_cached_access_token(stale_authorization):
+                return self.headers
+            if self._token_refresh_backoff.is_waiting():
+                return self.headers
+            return self.get_request_auth_headers()
+
+    def _refresh_access_token_in_background(self, stale_authorization):
+        try:
+            self.refresh_access_token(stale_authorization)
+        except Exception:
+            logger.exception({"message": "background token refresh failed"})
+
+    def _refresh_access_token_ahead(self):
+        if not self.access_token and not self._token_cache_checked:
+            # reuse a token cached by another session or process, if any
+            self._token_cache_checked = True
+            with self._token_lock:
+                self._load_cached_access_token()
+
+        expires_at = self.access_token_expires_at
+        if not self.access_token or expires_at is None:
+            return
+
+        remaining = expires_at - time.time()
+        if remaining > self.token_refresh_skew:
+            return
+        if self._token_refresh_backoff.is_waiting():
+            # the last token request failed
+            return
+
+        authorization = self.headers.get("Authorization")
+        if remaining <= 0:
+            self.refresh_access_token(authorization)
+        elif not self._token_lock.locked():
+            # still valid, keep using it while a new one is fetched
+            threading.Thread(
+                target=self._refresh_access_token_in_background,
+                args=(authorization,),
+                daemon=True,
+            ).start()
+
     def _pre_request_callback(self, request):
         for hook in self._pre_hooks:
             hook(self, request)
         return request
 
+    def _get_retry_delay(self, response):
+        req = response.request
+        retry_history = getattr(req, "retry_history", [])
+        started = getattr(req, "retry_started", None)
+        if started is None:
+            elapsed = response.elapsed.total_seconds()
+        else:
+            elapsed = time.monotonic() - started
+        return self.retry_policy.get_retry_delay(
+            req.method,
+            response.status_code,
+            len(retry_history),
+            elapsed,
+            response.headers.get("Retry-After"),
+        )
+
     def _post_request_callback(self, response, *args, **kwargs):
         req = response.request
         retry = getattr(req, "authentication_retry", True)
 
+        if self.rate_limiter is not None:
+            self.rate_limiter.update_from_response(
+                self.api_key, req.url, response.status_code, response.headers
+            )
+
         if retry and response.status_code in (
             requests.codes.unauthorized,
             requests.codes.forbidden,
@@ -119,11 +376,40 @@ class TrustpilotSession(requests.Session):
                 {"message": "reauthenticating and retrying once", "url": req.url}
             )
             req.authentication_retry = False
-            req.headers.update(self.get_request_auth_headers())
-            response = self.send(req)
-        else:
-            for hook in self._post_hooks:
-                hook(self, response)
+            _release_response(response)
+            req.headers.update(
+                self.refresh_access_token(req.headers.get("Authorization"))
+            )
+            return self.send(req, **kwargs)
+
+        retry_delay = self._get_retry_delay(response)
+        if retry_delay is not None:
+            if not hasattr(req, "retry_history"):
+                req.retry_history = []
+                req.retry_started = time.monotonic() - response.elapsed.total_seconds()
+            req.retry_history.append(
+                RetryAttempt(
+                    len(req.retry_history) + 1, response.status_code, retry_delay
+                )
+            )
+            logger.debug(
+                {
+                    "message": "retrying request",
+                    "url": req.url,
+                    "status": response.status_code,
+                    "delay": retry_delay,
+                }
+            )
+            _release_response(response)
+            time.sleep(retry_delay)
+            return self.send(req, **kwargs)
+
+        response.retry_history = getattr(req, "retry_history", [])
+        self._bind_json_codec(response)
+        if self._metrics_hooks:
+            response.received_at = time.perf_counter()
+        for hook in self._post_hooks:
+            hook(self, response)
 
         return response
 
@@ -133,38 +419,579 @@ class TrustpilotSession(requests.Session):
     def register_post_hook(self, hook):
         self._post_hooks.append(hook)
 
+    def register_metrics_hook(self, hook):
+        # hook(metrics) is called with a RequestMetrics after each request
+        self._metrics_hooks.append(hook)
+
+    def send(self, request, **kwargs):
+        # also called for retries and redirects, which count against the limit
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.api_key, request.url)
+
+        # retries and re-authentication are sent within the first send
+        if not self._metrics_hooks or hasattr(request, "metrics_timings"):
+            return super(TrustpilotSession, self).send(request, **kwargs)
+
+        timings = request.metrics_timings = RequestTimings()
+        adapters.start_timings(timings)
+        response = error = None
+        try:
+            response = super(TrustpilotSession, self).send(request, **kwargs)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            adapters.stop_timings()
+            if response is not None and not response._content_consumed:
+                # a streamed body is read after send returns, its metrics are
+                # emitted once the response is closed
+                response.close = functools.partial(
+                    self._close_streamed_response, response, timings
+                )
+            else:
+                self._emit_metrics(request, response, error, timings)
+
+    def _close_streamed_response(self, response, timings):
+        requests.Response.close(response)
+        del response.close
+        self._emit_metrics(response.request, response, None, timings)
+
+    def _emit_metrics(self, request, response, error, timings):
+        values = {
+            "retries": len(getattr(request, "retry_history", [])),
+            "reauthentications": 0
+            if getattr(request, "authentication_retry", True)
+            else 1,
+        }
+        if isinstance(request.body, (bytes, str)):
+            values["request_size"] = len(request.body)
+        if error is not None:
+            values["error"] = type(error).__name__
+        if response is not None:
+            values["status"] = response.status_code
+            values["ttfb"] = response.elapsed.total_seconds()
+            received_at = getattr(response, "received_at", None)
+            if response._content_consumed and received_at is not None:
+                values["body_read"] = time.perf_counter() - received_at
+                if response._content is not False:
+                    values["response_size"] = len(response._content or b"")
+                # bytes read from the connection, before decompression
+                if hasattr(response.raw, "tell"):
+                    values["response_wire_size"] = response.raw.tell()
+
+        emit_request_metrics(
+            self._metrics_hooks,
+            timings.to_metrics(request.method, request.url, **values),
+        )
+
+    def _run_request_spec(self, index, spec):
+        try:
+            method, url, kwargs = utils.get_request_spec_args(spec)
+            response = self.request(method, url, **kwargs)
+        except Exception as e:
+            return utils.BatchResult(index, spec, None, e)
+        return utils.BatchResult(index, spec, response, None)
+
+    def map(self, specs, max_workers=10, ordered=False):
+        # runs request specs in a thread pool with at most `max_workers` requests
+        # in flight, only pulling new specs as requests finish, and yields a
+        # BatchResult per spec as completed (or in input order)
+        if max_workers > self.pool_maxsize:
+            if self.http_adapter is None:
+                self.mount_adapters(self.pool_connections, max_workers)
+            else:
+                warn(
+                    "max_workers={} is more than the {} connections of the shared "
+                    "http_adapter, the other threads wait for one".format(
+                        max_workers, self.pool_maxsize
+                    ),
+                    stacklevel=2,
+                )
+
+        specs = iter(specs)
+        pending = collections.deque() if ordered else set()
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for index, spec in enumerate(specs):
+                    if len(pending) >= max_workers:
+                        if ordered:
+                            yield pending.popleft().result()
+                        else:
+                            done, pending = futures.wait(
+                                pending, return_when=futures.FIRST_COMPLETED
+                            )
+                            for future in done:
+                                yield future.result()
+
+                    future = executor.submit(self._run_request_spec, index, spec)
+                    if ordered:
+                        pending.append(future)
+                    else:
+                        pending.add(future)
+
+                if ordered:
+                    while pending:
+                        yield pending.popleft().result()
+                else:
+                    for future in futures.as_completed(pending):
+                        yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def gather_requests(self, specs, max_workers=10):
+        results = list(self.map(specs, max_workers))
+        return sorted(results, key=lambda result: result.index)
+
+    def _get_page(self, url, **kwargs):
+        response = self.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_pages(self, url, pages, stopped, **kwargs):
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        try:
+            while url and not stopped.is_set():
+                page = self._get_page(url, **kwargs)
+                put(page)
+                url = utils.get_next_page_url(page)
+                # the next page links already hold the query parameters
+                kwargs.pop("params", None)
+            put(_end_of_pages)
+        except Exception as e:
+            put(e)
+
+    def _iter_pages_concurrently(self, url, concurrency, items_key, total_key, kwargs):
+        page = self._get_page(url, **kwargs)
+        yield page
+
+        specs = utils.get_page_request_specs(
+            url, page, items_key=items_key, total_key=total_key, **kwargs
+        )
+        if specs is None:
+            # no total count, fall back to following the next page links
+            next_url = utils.get_next_page_url(page)
+            if next_url:
+                kwargs.pop("params", None)
+                for page in self.iter_pages(next_url, **kwargs):
+                    yield page
+            return
+
+        for result in self.map(specs, max_workers=concurrency, ordered=True):
+            if result.error is not None:
+                raise result.error
+            result.response.raise_for_status()
+            yield result.response.json()
+
+    def iter_pages(
+        self,
+        url,
+        prefetch=1,
+        concurrency=None,
+        items_key=None,
+        total_key=None,
+        **kwargs
+    ):
+        # yields the json content of each page of a list endpoint by following
+        # its next-page links, fetching up to `prefetch` pages ahead in a
+        # background thread while the current one is processed.
+        # With `concurrency`, pages are instead requested in parallel (and yielded
+        # in order) once the first page tells the total number of items
+        if concurrency:
+            for page in self._iter_pages_concurrently(
+                url, concurrency, items_key, total_key, kwargs
+            ):
+                yield page
+            return
+
+        if prefetch < 1:
+            while url:
+                page = self._get_page(url, **kwargs)
+                yield page
+                url = utils.get_next_page_url(page)
+                kwargs.pop("params", None)
+            return
+
+        pages = queue.Queue(maxsize=prefetch)
+        stopped = threading.Event()
+        threading.Thread(
+            target=self._fetch_pages,
+            args=(url, pages, stopped),
+            kwargs=kwargs,
+            daemon=True,
+        ).start()
+        try:
+            while True:
+                page = pages.get()
+                if page is _end_of_pages:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            stopped.set()
+
+    def iter_items(
+        self, url, items_key=None, prefetch=1, concurrency=None, model=None, **kwargs
+    ):
+        for page in self.iter_pages(
+            url,
+            prefetch=prefetch,
+            concurrency=concurrency,
+            items_key=items_key,
+            **kwargs
+        ):
+            for item in utils.get_page_items(page, items_key):
+                yield item if model is None else model(item)
+
+    def iter_json_items(
+        self, url, items_key=None, chunk_size=64 * 1024, model=None, **kwargs
+    ):
+        # parses the items of a single response while it is downloaded, so
+        # the whole body is never held in memory
+        response = self.get(url, stream=True, **kwargs)
+        try:
+            response.raise_for_status()
+            parser = streaming.JsonItemParser(items_key, self.json_codec.loads)
+            for chunk in response.iter_content(chunk_size):
+                for item in parser.feed(chunk):
+                    yield item if model is None else model(item)
+            parser.close()
+        finally:
+            response.close()
+
+    def _bind_json_codec(self, response):
+        # response.json() decodes with the session's codec
+        if self.json_codec.name != "json":
+            response.json = functools.partial(_decode_json, response, self.json_codec)
+        return response
+
+    def _build_cached_response(self, entry):
+        response = requests.Response()
+        response.status_code = entry.status
+        response.headers = requests.structures.CaseInsensitiveDict(entry.headers)
+        response._content = entry.body
+        response.url = entry.url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.request = requests.Request("GET", entry.url).prepare()
+        response.retry_history = []
+        response.from_cache = True
+        return self._bind_json_codec(response)
+
+    def _cached_get(self, url, **kwargs):
+        cache = self.response_cache
+        headers = kwargs.pop("headers", None) or {}
+        request_headers = dict(self.headers)
+        request_headers.update(headers)
+        key = cache.get_key(url, kwargs.get("params"), request_headers)
+
+        entry, fresh = cache.lookup(key, request_headers)
+        if fresh:
+            return self._build_cached_response(entry)
+        if entry is not None:
+            headers = dict(headers, **cache.get_conditional_headers(entry))
+
+        response = self._send_get(url, headers=headers, **kwargs)
+        if entry is not None and response.status_code == requests.codes.not_modified:
+            entry = cache.revalidate(key, entry, response.headers, request_headers)
+            return self._build_cached_response(entry)
+
+        cache.store(
+            key,
+            response.url,
+            response.status_code,
+            response.headers,
+            response.content,
+            request_headers,
+        )
+        response.from_cache = False
+        return response
+
+    def _coalesced_get(self, url, **kwargs):
+        # identical GETs made while one is in flight wait for it and share its
+        # (buffered) response instead of making their own request
+        key_kwargs = dict(kwargs)
+        headers = dict(self.headers)
+        headers.update(key_kwargs.pop("headers", None) or {})
+        key = utils.get_request_fingerprint("GET", url, headers=headers, **key_kwargs)
+
+        with self._inflight_lock:
+            inflight_request = self._inflight_requests.get(key)
+            if inflight_request is None:
+                inflight_request = self._inflight_requests[key] = futures.Future()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            return inflight_request.result()
+
+        try:
+            response = self._get(url, **kwargs)
+            response.content
+        except Exception as e:
+            inflight_request.set_exception(e)
+            raise
+        else:
+            inflight_request.set_result(response)
+        finally:
+            with self._inflight_lock:
+                self._inflight_requests.pop(key, None)
+        return response
+
+    def _get(self, url, **kwargs):
+        if self.response_cache is not None:
+            return self._cached_get(url, **kwargs)
+        return self._send_get(url, **kwargs)
+
+    def _send_get(self, url, **kwargs):
+        if self.hedge_policy is None:
+            return super(TrustpilotSession, self).request("GET", url, **kwargs)
+        return self._hedged_get(url, **kwargs)
+
+    def _get_hedge_executor(self):
+        # a primary and a hedge request for each thread the pool serves
+        max_workers = 2 * self.pool_maxsize
+        with self._inflight_lock:
+            if self._hedge_executor is None or self._hedge_workers < max_workers:
+                if self._hedge_executor is not None:
+                    self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = futures.ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="trustpilot-hedge"
+                )
+                self._hedge_workers = max_workers
+            return self._hedge_executor
+
+    def _send_hedge_attempt(self, call, role, url, kwargs):
+        started = time.monotonic()
+        with call.attempt(role):
+            response = super(TrustpilotSession, self).request("GET", url, **kwargs)
+        self.hedge_policy.record(time.monotonic() - started)
+        return response
+
+    def _hedged_get(self, url, **kwargs):
+        # sends a hedge when the GET hasn't answered within the policy's delay
+        # and returns the first response below 500. Both are sent from the
+        # hedge executor, a request can't be interrupted so the other response
+        # is dropped once received
+        policy = self.hedge_policy
+        call = HedgedCall()
+        delay = policy.start()
+        if delay is None:
+            try:
+                return self._send_hedge_attempt(call, "primary", url, kwargs)
+            finally:
+                call.decide("primary")
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(
+            self._send_hedge_attempt, call, "primary", url, kwargs
+        )
+        attempts = {primary: "primary"}
+        winner = None
+        try:
+            done, _ = futures.wait([primary], timeout=delay)
+            if not done and policy.acquire():
+                call.hedged = True
+                hedge = executor.submit(
+                    self._send_hedge_attempt, call, "hedge", url, kwargs
+                )
+                attempts[hedge] = "hedge"
+
+            pending = set(attempts)
+            while pending and winner is None:
+                done, pending = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED
+                )
+                for future in attempts:
+                    if (
+                        future in done
+                        and future.exception() is None
+                        and future.result().status_code < 500
+                    ):
+                        winner = future
+                        break
+            # neither answered well, the primary's outcome is used
+            winner = winner or primary
+        finally:
+            for future in attempts:
+                if future is not winner and not future.cancel():
+                    future.add_done_callback(_close_dropped_response)
+            call.decide(attempts.get(winner))
+
+        if attempts[winner] == "hedge":
+            policy.record_win()
+        return winner.result()
+
     def request(self, method, url, **kwargs):
         cleaned_url = utils.get_cleaned_url(url, self.api_host, self.api_version)
+        self._refresh_access_token_ahead()
+        if kwargs.get("json") is not None:
+            kwargs["headers"] = encode_json_body(
+                self.json_codec, kwargs, kwargs.get("headers")
+            )
+        if self.request_compression_min_size is not None:
+            kwargs["headers"] = compression.compress_request_body(
+                kwargs, kwargs.get("headers"), self.request_compression_min_size
+            )
+
+        if method.upper() == "GET" and not kwargs.get("stream"):
+            if self.coalesce_requests:
+                return self._coalesced_get(cleaned_url, **kwargs)
+            return self._get(cleaned_url, **kwargs)
 
         return super(TrustpilotSession, self).request(method, cleaned_url, **kwargs)
 
 
+class SessionPool:
+    # TrustpilotSessions by credentials (utils.get_session_key) for acting on
+    # behalf of many business users: each session keeps its own access token,
+    # all of them share one connection pool. The least recently used sessions
+    # are dropped beyond `max_sessions` or after `idle_timeout` seconds unused,
+    # their tokens are kept in the token cache
+    def __init__(self, max_sessions=1000, idle_timeout=900, **defaults):
+        # defaults are setup() arguments for every session
+        if defaults.get("token_cache") is None and not environ.get(
+            "TRUSTPILOT_TOKEN_CACHE_PATH"
+        ):
+            defaults["token_cache"] = MemoryTokenCache()
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.defaults = defaults
+        self.http_adapter = None
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_http_adapter(self):
+        if self.http_adapter is None:
+            self.http_adapter = _create_adapter(
+                self.defaults.get("pool_connections", 10),
+                self.defaults.get("pool_maxsize", 10),
+                self.defaults.get("http2", False),
+            )
+        return self.http_adapter
+
+    def _evict(self, now):
+        evicted = []
+        for key, (session, last_used, _) in list(self._sessions.items()):
+            if (
+                now - last_used < self.idle_timeout
+                and len(self._sessions) < self.max_sessions
+            ):
+                break
+            del self._sessions[key]
+            evicted.append(session)
+        return evicted
+
+    def get(self, **kwargs):
+        # the session for these credentials (and any other setup() arguments
+        # given the first time), created when there is none
+        kwargs = dict(self.defaults, **kwargs)
+        key = utils.get_session_key(**kwargs)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            evicted = self._evict(now)
+            # compared with the arguments a session was set up with, setup() fills
+            # in defaults from the environment
+            credentials = (kwargs.get("password"), kwargs.get("api_secret"))
+            if entry is None:
+                session = TrustpilotSession(
+                    http_adapter=self._get_http_adapter(), **kwargs
+                )
+            else:
+                session, _, setup_credentials = entry
+                if credentials == (None, None) or credentials == setup_credentials:
+                    credentials = setup_credentials
+                else:
+                    # changed credentials of the same user
+                    session.setup(http_adapter=self._get_http_adapter(), **kwargs)
+            self._sessions[key] = (session, now, credentials)
+        for evicted_session in evicted:
+            evicted_session.close()
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def close(self):
+        with self._lock:
+            sessions = [entry[0] for entry in self._sessions.values()]
+            self._sessions.clear()
+            http_adapter, self.http_adapter = self.http_adapter, None
+        for session in sessions:
+            session.close()
+        if http_adapter is not None:
+            http_adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_session(**kwargs):
+    # a session of the module wide SessionPool
+    return _get_module_session("_session_cache").get(**kwargs)
+
+
 def post(url, data=None, json=None, **kwargs):
-    return default_session.post(url, data=data, json=json, **kwargs)
+    return _get_module_session().post(url, data=data, json=json, **kwargs)
 
 
 def head(url, **kwargs):
-    return default_session.head(url, **kwargs)
+    return _get_module_session().head(url, **kwargs)
 
 
 def options(url, **kwargs):
-    return default_session.options(url, **kwargs)
+    return _get_module_session().options(url, **kwargs)
 
 
 def get(url, **kwargs):
-    return default_session.get(url, **kwargs)
+    return _get_module_session().get(url, **kwargs)
 
 
 def patch(url, data=None, **kwargs):
-    return default_session.patch(url, data=data, **kwargs)
+    return _get_module_session().patch(url, data=data, **kwargs)
 
 
 def delete(url, **kwargs):
-    return default_session.delete(url, **kwargs)
+    return _get_module_session().delete(url, **kwargs)
 
 
 def put(url, data=None, **kwargs):
-    return default_session.put(url, data, **kwargs)
+    return _get_module_session().put(url, data, **kwargs)
+
+
+_module_sessions = {"default_session": TrustpilotSession, "_session_cache": SessionPool}
+_module_sessions_lock = threading.Lock()
+
+
+def _get_module_session(name="default_session"):
+    # default_session and _session_cache are created on first use rather than
+    # on import, once created (or patched) they are plain module attributes
+    module_globals = globals()
+    if name not in module_globals:
+        with _module_sessions_lock:
+            if name not in module_globals:
+                module_globals[name] = _module_sessions[name]()
+    return module_globals[name]
+
+
+def __getattr__(name):
+    if name in _module_sessions:
+        return _get_module_session(name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
-default_session = TrustpilotSession()
+def __dir__():
+    return sorted(set(globals()) | set(_module_sessions))
@@ -0,0 +1,167 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, pip install brotli (or brotlicffi)
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, pip install zstandard
+    zstandard = None
+
+# content codings in the order they are advertised
+ENCODINGS = ("gzip", "deflate", "br", "zstd")
+
+
+def get_available_encodings(encodings=ENCODINGS):
+    available = {"identity", "gzip", "x-gzip", "deflate"}
+    if brotli is not None:
+        available.add("br")
+    if zstandard is not None:
+        available.add("zstd")
+    return [encoding for encoding in encodings if encoding in available]
+
+
+def get_accept_encoding(encodings=ENCODINGS):
+    # Accept-Encoding header value for the encodings that can be decoded here
+    return ", ".join(get_available_encodings(encodings))
+
+
+class _DeflateDecoder:
+    # "deflate" is zlib wrapped, but some servers send raw deflate data
+    def __init__(self):
+        self._first_try = True
+        self._data = b""
+        self._decompressor = zlib.decompressobj()
+
+    def decompress(self, data):
+        if not self._first_try:
+            return self._decompressor.decompress(data)
+
+        self._data += data
+        try:
+            decompressed = self._decompressor.decompress(data)
+            if decompressed:
+                self._first_try = False
+                self._data = b""
+            return decompressed
+        except zlib.error:
+            self._first_try = False
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            try:
+                return self.decompress(self._data)
+            finally:
+                self._data = b""
+
+    def flush(self):
+        return self._decompressor.flush()
+
+
+class _GzipDecoder:
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data):
+        # a gzip body may consist of several members
+        decompressed = []
+        while data:
+            decompressed.append(self._decompressor.decompress(data))
+            data = self._decompressor.unused_data
+            if not data:
+                break
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return b"".join(decompressed)
+
+    def flush(self):
+        return self._decompressor.flush()
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        self._decompressor = brotli.Decompressor()
+        # Brotli has process(), brotlicffi decompress()
+        self.decompress = getattr(self._decompressor, "process", None) or getattr(
+            self._decompressor, "decompress"
+        )
+
+    def flush(self):
+        return b""
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+    def flush(self):
+        return b""
+
+
+class _IdentityDecoder:
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+_DECODERS = {
+    "identity": _IdentityDecoder,
+    "gzip": _GzipDecoder,
+    "x-gzip": _GzipDecoder,
+    "deflate": _DeflateDecoder,
+    "br": _BrotliDecoder,
+    "zstd": _ZstdDecoder,
+}
+
+
+class Decompressor:
+    # decodes a body with the given Content-Encoding chunk by chunk, e.g. to
+    # feed a streaming.JsonItemParser while the compressed body is downloaded
+    def __init__(self, content_encoding=None):
+        encodings = [
+            encoding.strip().lower()
+            for encoding in (content_encoding or "").split(",")
+            if encoding.strip()
+        ]
+        self._decoders = []
+        # codings are listed in the order they were applied
+        for encoding in reversed(encodings):
+            if encoding not in get_available_encodings(_DECODERS):
+                raise ValueError("Can't decode content encoding '{}'".format(encoding))
+            self._decoders.append(_DECODERS[encoding]())
+
+    def decompress(self, data):
+        for decoder in self._decoders:
+            data = decoder.decompress(data)
+        return data
+
+    def flush(self):
+        data = b""
+        for decoder in self._decoders:
+            data = decoder.decompress(data) + decoder.flush()
+        return data
+
+
+def compress_request_body(kwargs, headers, min_size):
+    # gzips a bytes or str `data` of at least `min_size` bytes in place and
+    # returns the headers with its Content-Encoding
+    data = kwargs.get("data")
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if not isinstance(data, (bytes, bytearray)) or len(data) < min_size:
+        return headers
+
+    headers = dict(headers or {})
+    if any(name.lower() == "content-encoding" for name in headers):
+        return headers
+    kwargs["data"] = gzip.compress(data, compresslevel=6)
+    headers["Content-Encoding"] = "gzip"
+    return headers
@@ -0,0 +1,145 @@
+import collections
+import contextvars
+import threading
+
+from trustpilot.metrics import emit_metrics
+
+# the HedgedCall a request is an attempt of, set while the attempt is sent
+_current_call = contextvars.ContextVar("trustpilot_hedged_call", default=None)
+
+
+class HedgePolicy:
+    # sends a duplicate ("hedge") of a GET that hasn't answered after `delay`
+    # seconds and uses whichever response comes first, to cut the tail latency
+    # of slow upstream responses. Without a fixed delay it is the `quantile` of
+    # the last `window` response times (within min_delay and max_delay), no
+    # hedges are sent until `min_samples` are known. Hedges are capped at
+    # `max_extra_load` of the requests, with bursts of up to `burst` hedges
+    def __init__(
+        self,
+        delay=None,
+        quantile=0.95,
+        min_delay=0.005,
+        max_delay=2.0,
+        window=1000,
+        min_samples=50,
+        max_extra_load=0.05,
+        burst=10,
+    ):
+        self.delay = delay
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_extra_load = max_extra_load
+        self.burst = burst
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._samples = collections.deque(maxlen=window)
+        self._new_samples = 0
+        self._adaptive_delay = None
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        # response time of a request that completed
+        with self._lock:
+            self._samples.append(seconds)
+            self._new_samples += 1
+
+    def _get_adaptive_delay(self):
+        if len(self._samples) < self.min_samples:
+            return None
+        # sorting the window on every request would cost more than it saves
+        if self._adaptive_delay is None or self._new_samples >= 20:
+            samples = sorted(self._samples)
+            delay = samples[int(self.quantile * (len(samples) - 1))]
+            self._adaptive_delay = min(self.max_delay, max(self.min_delay, delay))
+            self._new_samples = 0
+        return self._adaptive_delay
+
+    def start(self):
+        # counts a request and returns the seconds to wait before hedging it,
+        # or None to not hedge it
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.burst, self._tokens + self.max_extra_load)
+            if self.delay is not None:
+                return self.delay
+            return self._get_adaptive_delay()
+
+    def acquire(self):
+        # whether a hedge may be sent within the extra load allowed
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+
+class HedgedCall:
+    # a GET sent as a "primary" and possibly a "hedge" request. The metrics of
+    # each are held back until the response to use is known, then emitted
+    # with `hedge` telling which request they are of (None when no hedge was
+    # sent) and `hedge_won` whether its response was used
+    def __init__(self):
+        self.hedged = False
+        self.winner = None
+        self._decided = False
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def attempt(self, role):
+        # run the attempt within, e.g. `with call.attempt("hedge"):`
+        return _Attempt(self, role)
+
+    def add_metrics(self, hooks, metrics, role):
+        with self._lock:
+            if not self._decided:
+                self._metrics.append((hooks, metrics, role))
+                return
+        self._emit(hooks, metrics, role)
+
+    def decide(self, winner):
+        # winner is the request whose response is used, None when none is
+        with self._lock:
+            self.winner = winner
+            self._decided = True
+            held_back, self._metrics = self._metrics, []
+        for hooks, metrics, role in held_back:
+            self._emit(hooks, metrics, role)
+
+    def _emit(self, hooks, metrics, role):
+        if self.hedged:
+            metrics.hedge = role
+            metrics.hedge_won = role == self.winner
+        emit_metrics(hooks, metrics)
+
+
+class _Attempt:
+    def __init__(self, call, role):
+        self.call = call
+        self.role = role
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_call.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_call.reset(self._token)
+
+
+def emit_request_metrics(hooks, metrics):
+    # emits the metrics of a request, or holds them back for its HedgedCall
+    attempt = _current_call.get()
+    if attempt is None:
+        emit_metrics(hooks, metrics)
+    else:
+        attempt.call.add_metrics(hooks, metrics, attempt.role)
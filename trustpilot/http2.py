@@ -0,0 +1,396 @@
+import json
+import os
+import ssl
+from contextlib import asynccontextmanager
+
+import aiohttp
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+try:
+    import httpx
+except ImportError:  # optional, pip install trustpilot[http2]
+    httpx = None
+
+
+def _get_timeout_error(error):
+    # what aiohttp raises on timeouts, also an asyncio.TimeoutError
+    timeout_error = aiohttp.ServerTimeoutError(str(error))
+    timeout_error.__cause__ = error
+    return timeout_error
+
+
+def _check_httpx():
+    if httpx is None:
+        raise ImportError("http2 needs httpx, pip install trustpilot[http2]")
+
+
+def _get_content_kwargs(data=None, json_data=None):
+    # aiohttp/requests style body arguments as httpx arguments
+    if json_data is not None:
+        return {"json": json_data}
+    if isinstance(data, (bytes, bytearray, str)):
+        return {"content": data}
+    if data is not None:
+        return {"data": data}
+    return {}
+
+
+class _RawResponse:
+    # what requests.Response reads a streamed body from
+    def __init__(self, response):
+        self._response = response
+        self._chunks = None
+
+    def stream(self, chunk_size=None, decode_content=True):
+        for chunk in self._response.iter_bytes(chunk_size):
+            yield chunk
+
+    def read(self, amt=None, decode_content=True):
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes(amt)
+        return next(self._chunks, b"")
+
+    def tell(self):
+        # bytes received, before decompression
+        return self._response.num_bytes_downloaded
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+def _get_timeout(timeout):
+    # requests timeouts are a number or a (connect, read) tuple, aiohttp ones an
+    # aiohttp.ClientTimeout
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(None, connect=connect, read=read)
+    if isinstance(timeout, aiohttp.ClientTimeout):
+        return httpx.Timeout(
+            timeout.total,
+            connect=timeout.connect or timeout.sock_connect or timeout.total,
+            read=timeout.sock_read or timeout.total,
+        )
+    return httpx.Timeout(timeout)
+
+
+def _create_ssl_context(ca_bundle):
+    if os.path.isdir(ca_bundle):
+        return ssl.create_default_context(capath=ca_bundle)
+    return ssl.create_default_context(cafile=ca_bundle)
+
+
+class HTTP2Adapter(requests.adapters.BaseAdapter):
+    # sends the requests of a requests.Session with httpx, which multiplexes
+    # concurrent requests to a host over http/2 connections
+    def __init__(self, pool_maxsize=10, **client_options):
+        _check_httpx()
+        super(HTTP2Adapter, self).__init__()
+        self._pool_maxsize = pool_maxsize
+        client_options.setdefault(
+            "limits",
+            httpx.Limits(
+                max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize
+            ),
+        )
+        self._verify = client_options.get("verify", True)
+        if self._verify is True and client_options.get("trust_env", True):
+            # the ca bundle requests uses from the environment, httpx only reads
+            # SSL_CERT_FILE/SSL_CERT_DIR
+            ca_bundle = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get(
+                "CURL_CA_BUNDLE"
+            )
+            if ca_bundle:
+                self._verify = ca_bundle
+                client_options["verify"] = _create_ssl_context(ca_bundle)
+        self.client = httpx.Client(http2=True, **client_options)
+        self._client_options = client_options
+
+    def _get_client_proxy(self, url):
+        proxy = self._client_options.get("proxy")
+        if proxy is None and self._client_options.get("trust_env", True):
+            # httpx reads the same environment variables as requests
+            proxy = requests.utils.select_proxy(
+                url, requests.utils.get_environ_proxies(url)
+            )
+        return None if proxy is None else str(proxy)
+
+    def _check_settings(self, url, verify, cert, proxies):
+        # tls and proxy settings are those of the httpx.Client, other ones (of
+        # the session or a request) would be ignored
+        if verify is not True and verify != self._verify:
+            raise ValueError(
+                "verify={!r} differs from the http2 client, pass it in the http2 "
+                "options".format(verify)
+            )
+        if cert is not None and cert != self._client_options.get("cert"):
+            raise ValueError(
+                "cert={!r} differs from the http2 client, pass it in the http2 "
+                "options".format(cert)
+            )
+        proxy = requests.utils.select_proxy(url, proxies or {})
+        if proxy is not None and proxy != self._get_client_proxy(url):
+            raise ValueError(
+                "proxy {!r} differs from the http2 client, pass it in the http2 "
+                "options".format(proxy)
+            )
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        self._check_settings(request.url, verify, cert, proxies)
+        httpx_request = self.client.build_request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            content=request.body,
+            timeout=_get_timeout(timeout),
+        )
+        try:
+            httpx_response = self.client.send(httpx_request, stream=True)
+        except httpx.TimeoutException as e:
+            if isinstance(e, httpx.ConnectTimeout):
+                raise requests.exceptions.ConnectTimeout(e, request=request)
+            raise requests.exceptions.ReadTimeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.headers = requests.structures.CaseInsensitiveDict(
+            httpx_response.headers.multi_items()
+        )
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.http_version = httpx_response.http_version
+        response.raw = _RawResponse(httpx_response)
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+class _StreamReader:
+    # the parts of aiohttp.StreamReader used to read a body incrementally
+    def __init__(self, response):
+        self._response = response
+        self._buffer = b""
+        self._chunks = None
+
+    async def _next_chunk(self):
+        if self._chunks is None:
+            httpx_response = self._response._httpx_response
+            if self._response._auto_decompress:
+                self._chunks = httpx_response.aiter_bytes()
+            else:
+                self._chunks = httpx_response.aiter_raw()
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+    async def read(self, n=-1):
+        if n < 0:
+            chunks = [self._buffer]
+            self._buffer = b""
+            chunk = await self._next_chunk()
+            while chunk:
+                chunks.append(chunk)
+                chunk = await self._next_chunk()
+            return b"".join(chunks)
+        if not self._buffer:
+            self._buffer = await self._next_chunk()
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    async def iter_chunked(self, n):
+        while True:
+            chunk = await self.read(n)
+            if not chunk:
+                return
+            yield chunk
+
+    async def iter_any(self):
+        while True:
+            chunk = self._buffer or await self._next_chunk()
+            self._buffer = b""
+            if not chunk:
+                return
+            yield chunk
+
+
+class HTTP2Response:
+    # the parts of aiohttp.ClientResponse the async session and its users rely on
+    def __init__(
+        self, method, httpx_response, trace_request_ctx=None, auto_decompress=True
+    ):
+        self.method = method.upper()
+        self._httpx_response = httpx_response
+        self._timings = trace_request_ctx
+        self._auto_decompress = auto_decompress
+        self.status = httpx_response.status_code
+        self.reason = httpx_response.reason_phrase
+        self.headers = CIMultiDictProxy(
+            CIMultiDict(httpx_response.headers.multi_items())
+        )
+        self.url = URL(str(httpx_response.url))
+        self.version = httpx_response.http_version
+        self.content = _StreamReader(self)
+        self._body = None
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    @property
+    def content_type(self):
+        return self.headers.get("Content-Type", "application/octet-stream").split(";")[
+            0
+        ]
+
+    @property
+    def charset(self):
+        return self._httpx_response.charset_encoding
+
+    @property
+    def request_info(self):
+        request = self._httpx_response.request
+        return aiohttp.RequestInfo(
+            self.url,
+            self.method,
+            CIMultiDictProxy(CIMultiDict(request.headers.multi_items())),
+            self.url,
+        )
+
+    async def read(self):
+        if self._body is None:
+            self._body = await self.content.read()
+            if self._timings is not None:
+                self._timings.add_size("response_size", len(self._body))
+                self._timings.add_size(
+                    "response_wire_size", self._httpx_response.num_bytes_downloaded
+                )
+        return self._body
+
+    async def text(self, encoding=None, errors="strict"):
+        return (await self.read()).decode(encoding or self.charset or "utf-8", errors)
+
+    async def json(self, *, encoding=None, loads=json.loads, **kwargs):
+        body = await self.read()
+        if not body.strip():
+            return None
+        return loads(body.decode(encoding or self.charset or "utf-8"))
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise aiohttp.ClientResponseError(
+                self.request_info,
+                (),
+                status=self.status,
+                message=self.reason,
+                headers=self.headers,
+            )
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def _close(self):
+        await self._httpx_response.aclose()
+
+
+class HTTP2ClientSession:
+    # stands in for the pooled aiohttp.ClientSession of TrustpilotAsyncSession,
+    # multiplexing concurrent requests to a host over http/2 connections
+    def __init__(self, connection_limit=100, **client_options):
+        _check_httpx()
+        client_options.setdefault(
+            "limits",
+            httpx.Limits(
+                max_connections=connection_limit or None,
+                max_keepalive_connections=connection_limit or None,
+            ),
+        )
+        self.client = httpx.AsyncClient(http2=True, **client_options)
+
+    @property
+    def closed(self):
+        return self.client.is_closed
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method,
+        url,
+        headers=None,
+        params=None,
+        data=None,
+        json=None,
+        timeout=None,
+        trace_request_ctx=None,
+        auto_decompress=True,
+        allow_redirects=True,
+        **kwargs
+    ):
+        if kwargs:
+            # e.g. ssl or proxy, which are options of the httpx.AsyncClient
+            raise TypeError(
+                "{} not supported with http2, pass httpx.AsyncClient options in "
+                "the http2 options".format(", ".join(sorted(kwargs)))
+            )
+        request = self.client.build_request(
+            method.upper(),
+            str(url),
+            headers=headers,
+            params=params,
+            timeout=_get_timeout(timeout)
+            if timeout is not None
+            else httpx.USE_CLIENT_DEFAULT,
+            **_get_content_kwargs(data, json)
+        )
+        if trace_request_ctx is not None:
+            trace_request_ctx.phases.pop("ttfb", None)
+            trace_request_ctx.mark("ttfb")
+        try:
+            httpx_response = await self.client.send(
+                request, stream=True, follow_redirects=allow_redirects
+            )
+        except httpx.TimeoutException as e:
+            raise _get_timeout_error(e)
+        except httpx.TransportError as e:
+            raise aiohttp.ClientConnectionError(str(e)) from e
+        if trace_request_ctx is not None:
+            trace_request_ctx.stop("ttfb")
+            trace_request_ctx.mark("body_read")
+
+        response = HTTP2Response(
+            method, httpx_response, trace_request_ctx, auto_decompress
+        )
+        try:
+            yield response
+        finally:
+            await response._close()
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("post", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("put", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("delete", url, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,89 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, pip install orjson
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # optional, pip install ujson
+    ujson = None
+
+# fastest first, used to pick the codec when none is given
+_PREFERENCE = ("orjson", "ujson", "json")
+
+
+class JsonCodec:
+    # encodes to utf-8 bytes and decodes bytes or str, backed by the stdlib
+    name = "json"
+
+    def dumps(self, obj, indent=False):
+        return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def dumps(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    name = "ujson"
+
+    def dumps(self, obj, indent=False):
+        return ujson.dumps(obj, indent=2 if indent else 0).encode("utf-8")
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+_CODECS = {
+    "json": (JsonCodec, json),
+    "orjson": (OrjsonCodec, orjson),
+    "ujson": (UjsonCodec, ujson),
+}
+
+
+def get_available_codecs():
+    return [name for name in _PREFERENCE if _CODECS[name][1] is not None]
+
+
+def get_json_codec(codec=None):
+    # codec is a JsonCodec, the name of one, or None/"auto" for the fastest
+    # one installed
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec in (None, "auto"):
+        codec = get_available_codecs()[0]
+    if codec not in _CODECS:
+        raise ValueError("Unknown json codec {}".format(codec))
+
+    codec_class, module = _CODECS[codec]
+    if module is None:
+        raise ImportError("json codec {} is not installed".format(codec))
+    return codec_class()
+
+
+def encode_json_body(codec, kwargs, headers):
+    # replaces a json= payload with data= encoded by the codec, returns the
+    # headers with a content type added
+    payload = kwargs.pop("json", None)
+    if payload is None:
+        return headers
+
+    kwargs["data"] = codec.dumps(payload)
+    headers = dict(headers or {})
+    if not any(name.lower() == "content-type" for name in headers):
+        headers["Content-Type"] = "application/json"
+    return headers
@@ -0,0 +1,250 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# timings of a request in seconds, None when the transport doesn't tell (e.g.
+# dns and tls of the sync client are part of connect)
+PHASES = ("duration", "pool_wait", "dns", "connect", "tls", "ttfb", "body_read")
+
+
+class RequestMetrics:
+    # what happened during one call of a session method, including its retries
+    # and re-authentication; ttfb and body_read are those of the last attempt,
+    # the other phases are summed over the attempts. request_size is the body
+    # as sent, response_size the decoded and response_wire_size the still
+    # compressed response body. A hedged GET (see hedging.HedgePolicy) has
+    # metrics for both of its requests, `hedge` telling which one ("primary"
+    # or "hedge") and `hedge_won` whether its response was used
+    __slots__ = (
+        "method",
+        "url",
+        "status",
+        "error",
+        "started_at",
+        "duration",
+        "pool_wait",
+        "dns",
+        "connect",
+        "tls",
+        "ttfb",
+        "body_read",
+        "retries",
+        "reauthentications",
+        "request_size",
+        "response_size",
+        "response_wire_size",
+        "hedge",
+        "hedge_won",
+    )
+
+    def __init__(self, method, url, **values):
+        self.method = method.upper()
+        self.url = url
+        for name in self.__slots__[2:]:
+            setattr(self, name, values.get(name))
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return "RequestMetrics({} {} {} in {:.3f}s)".format(
+            self.method, self.url, self.status or self.error, self.duration or 0
+        )
+
+
+class RequestTimings:
+    # collects the timings of a request while it is sent
+    __slots__ = ("started", "started_at", "phases", "marks", "sizes")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.phases = {}
+        self.marks = {}
+        self.sizes = {}
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+
+    def stop(self, name, phase=None):
+        # time since mark(name), added to the phase
+        started = self.marks.pop(name, None)
+        if started is not None:
+            self.add(phase or name, time.perf_counter() - started)
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_size(self, name, size):
+        self.sizes[name] = self.sizes.get(name, 0) + size
+
+    def to_metrics(self, method, url, **values):
+        values.setdefault("duration", time.perf_counter() - self.started)
+        for phase, seconds in self.phases.items():
+            values.setdefault(phase, seconds)
+        for name, size in self.sizes.items():
+            values.setdefault(name, size)
+        return RequestMetrics(method, url, started_at=self.started_at, **values)
+
+
+def emit_metrics(hooks, metrics):
+    # a failing metrics hook must not fail the request
+    for hook in hooks:
+        try:
+            hook(metrics)
+        except Exception:
+            logger.warning("metrics hook failed", exc_info=True)
+
+
+class StatsdMetricsHook:
+    # for statsd style clients with incr(name, count) and timing(name, ms)
+    def __init__(self, client, prefix="trustpilot.request"):
+        self.client = client
+        self.prefix = prefix
+
+    def __call__(self, metrics):
+        self.client.incr(
+            "{}.status.{}".format(self.prefix, metrics.status or metrics.error)
+        )
+        for phase in PHASES:
+            seconds = getattr(metrics, phase)
+            if seconds is not None:
+                self.client.timing("{}.{}".format(self.prefix, phase), seconds * 1000)
+        for counter in (
+            "retries",
+            "reauthentications",
+            "response_size",
+            "response_wire_size",
+        ):
+            count = getattr(metrics, counter)
+            if count:
+                self.client.incr("{}.{}".format(self.prefix, counter), count)
+        if metrics.hedge == "hedge":
+            self.client.incr("{}.hedges".format(self.prefix))
+            if metrics.hedge_won:
+                self.client.incr("{}.hedge_wins".format(self.prefix))
+
+
+class PrometheusMetricsHook:
+    def __init__(self, registry=None, namespace="trustpilot"):
+        # optional and slow to import, so only imported by this hook
+        try:
+            import prometheus_client
+        except ImportError:  # pip install prometheus-client
+            raise ImportError("prometheus-client is not installed")
+
+        options = {"namespace": namespace}
+        if registry is not None:
+            options["registry"] = registry
+        self.duration = prometheus_client.Histogram(
+            "request_duration_seconds",
+            "Duration of api requests including retries",
+            ["method", "status"],
+            **options
+        )
+        self.phases = prometheus_client.Histogram(
+            "request_phase_seconds",
+            "Duration of the phases of the last attempt of api requests",
+            ["phase"],
+            **options
+        )
+        self.retries = prometheus_client.Counter(
+            "request_retries", "Retried api requests", **options
+        )
+        self.reauthentications = prometheus_client.Counter(
+            "request_reauthentications",
+            "Api requests retried with a new access token",
+            **options
+        )
+        self.response_size = prometheus_client.Histogram(
+            "response_size_bytes",
+            "Size of api response bodies",
+            buckets=[2**exponent for exponent in range(8, 26, 2)],
+            **options
+        )
+        self.response_wire_size = prometheus_client.Histogram(
+            "response_wire_size_bytes",
+            "Size of api response bodies as received, before decompression",
+            buckets=[2**exponent for exponent in range(8, 26, 2)],
+            **options
+        )
+        self.hedges = prometheus_client.Counter(
+            "request_hedges",
+            "Hedge requests sent for slow api requests, by whether they won",
+            ["outcome"],
+            **options
+        )
+
+    def __call__(self, metrics):
+        status = str(metrics.status or metrics.error)
+        self.duration.labels(metrics.method, status).observe(metrics.duration)
+        for phase in PHASES[1:]:
+            seconds = getattr(metrics, phase)
+            if seconds is not None:
+                self.phases.labels(phase).observe(seconds)
+        if metrics.retries:
+            self.retries.inc(metrics.retries)
+        if metrics.reauthentications:
+            self.reauthentications.inc(metrics.reauthentications)
+        if metrics.response_size is not None:
+            self.response_size.observe(metrics.response_size)
+        if metrics.response_wire_size is not None:
+            self.response_wire_size.observe(metrics.response_wire_size)
+        if metrics.hedge == "hedge":
+            self.hedges.labels("won" if metrics.hedge_won else "lost").inc()
+
+
+class OpenTelemetryHook:
+    # records a client span per request, spanning its retries
+    def __init__(self, tracer=None):
+        # optional and slow to import, so only imported by this hook
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError:  # pip install opentelemetry-api
+            otel_trace = None
+        if tracer is None:
+            if otel_trace is None:
+                raise ImportError("opentelemetry-api is not installed")
+            tracer = otel_trace.get_tracer("trustpilot")
+        self.tracer = tracer
+        self._otel_trace = otel_trace
+
+    def __call__(self, metrics):
+        attributes = {
+            "http.request.method": metrics.method,
+            "url.full": metrics.url,
+            "trustpilot.retries": metrics.retries or 0,
+            "trustpilot.reauthentications": metrics.reauthentications or 0,
+        }
+        if metrics.status is not None:
+            attributes["http.response.status_code"] = metrics.status
+        if metrics.error is not None:
+            attributes["error.type"] = metrics.error
+        if metrics.hedge is not None:
+            attributes["trustpilot.hedge"] = metrics.hedge
+            attributes["trustpilot.hedge_won"] = bool(metrics.hedge_won)
+        # the semantic conventions mean the size as transferred
+        body_size = metrics.response_wire_size
+        if body_size is None:
+            body_size = metrics.response_size
+        if body_size is not None:
+            attributes["http.response.body.size"] = body_size
+        for phase in PHASES[1:]:
+            seconds = getattr(metrics, phase)
+            if seconds is not None:
+                attributes["trustpilot.{}_ms".format(phase)] = seconds * 1000
+
+        otel_trace = self._otel_trace
+        options = {}
+        if otel_trace is not None:
+            options["kind"] = otel_trace.SpanKind.CLIENT
+        start_time = int(metrics.started_at * 1e9)
+        span = self.tracer.start_span(
+            metrics.method, start_time=start_time, attributes=attributes, **options
+        )
+        if otel_trace is not None and (
+            metrics.error is not None or (metrics.status or 0) >= 500
+        ):
+            span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        span.end(end_time=start_time + int(metrics.duration * 1e9))
@@ -0,0 +1,200 @@
+from datetime import datetime
+
+from trustpilot import utils
+
+
+def parse_datetime(value):
+    # api timestamps are iso 8601 in utc, e.g. 2023-07-28T12:00:00.000Z
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return value
+
+
+class Field:
+    # reads `key` from the raw json of a model when accessed; nested models and
+    # parsed values are decoded on first access and kept on the instance
+    __slots__ = ("key", "model", "many", "parse", "name")
+
+    def __init__(self, key, model=None, many=False, parse=None):
+        self.key = key
+        self.model = model
+        self.many = many
+        self.parse = parse
+        self.name = key
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def decode(self, value):
+        if self.parse is not None:
+            return self.parse(value)
+        if self.many:
+            return tuple(self.model(item) for item in value)
+        return self.model(value)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance._data.get(self.key)
+        if value is None or (self.model is None and self.parse is None):
+            return value
+
+        decoded = instance._decoded
+        if decoded is None:
+            decoded = instance._decoded = {}
+        elif self.name in decoded:
+            return decoded[self.name]
+        value = decoded[self.name] = self.decode(value)
+        return value
+
+    def __set__(self, instance, value):
+        raise AttributeError("{} is read only".format(self.name))
+
+
+class Model:
+    # a read only view on the json of an api resource, fields missing from the
+    # model are available with model["key"]
+    __slots__ = ("_data", "_decoded")
+
+    def __init__(self, data):
+        self._data = data
+        self._decoded = None
+
+    @classmethod
+    def from_items(cls, items):
+        for item in items:
+            yield cls(item)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def to_dict(self):
+        return self._data
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._data == other._data
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}(id={!r})".format(type(self).__name__, self._data.get("id"))
+
+
+class Link(Model):
+    __slots__ = ()
+
+    href = Field("href")
+    method = Field("method")
+    rel = Field("rel")
+
+    def __repr__(self):
+        return "Link(rel={!r}, href={!r})".format(self.rel, self.href)
+
+
+class Consumer(Model):
+    __slots__ = ()
+
+    id = Field("id")
+    display_name = Field("displayName")
+    display_location = Field("displayLocation")
+    number_of_reviews = Field("numberOfReviews")
+    links = Field("links", Link, many=True)
+
+
+class BusinessUnit(Model):
+    __slots__ = ()
+
+    id = Field("id")
+    display_name = Field("displayName")
+    name = Field("name")
+    website_url = Field("websiteUrl")
+    country = Field("country")
+    number_of_reviews = Field("numberOfReviews")
+    score = Field("score")
+    status = Field("status")
+    links = Field("links", Link, many=True)
+
+
+class Review(Model):
+    __slots__ = ()
+
+    id = Field("id")
+    stars = Field("stars")
+    title = Field("title")
+    text = Field("text")
+    language = Field("language")
+    created_at = Field("createdAt", parse=parse_datetime)
+    updated_at = Field("updatedAt", parse=parse_datetime)
+    is_verified = Field("isVerified")
+    status = Field("status")
+    consumer = Field("consumer", Consumer)
+    business_unit = Field("businessUnit", BusinessUnit)
+    company_reply = Field("companyReply")
+    tags = Field("tags")
+    links = Field("links", Link, many=True)
+
+
+class Invitation(Model):
+    __slots__ = ()
+
+    id = Field("id")
+    consumer_email = Field("consumerEmail")
+    consumer_name = Field("consumerName")
+    reference_number = Field("referenceNumber")
+    locale = Field("locale")
+    sender_email = Field("senderEmail")
+    sender_name = Field("senderName")
+    reply_to = Field("replyTo")
+    location_id = Field("locationId")
+    service_review_invitation = Field("serviceReviewInvitation")
+    product_review_invitation = Field("productReviewInvitation")
+    created_at = Field("createdAt", parse=parse_datetime)
+    links = Field("links", Link, many=True)
+
+
+class Page(Model):
+    # a page of a list endpoint, subclasses set the model of its items
+    __slots__ = ()
+
+    item_model = None
+    items_key = None
+
+    links = Field("links", Link, many=True)
+
+    @property
+    def items(self):
+        items = utils.get_page_items(self._data, self.items_key)
+        if self.item_model is None:
+            return items
+        return [self.item_model(item) for item in items]
+
+    @property
+    def total(self):
+        return utils.get_total_count(self._data)
+
+    @property
+    def next_page_url(self):
+        return utils.get_next_page_url(self._data)
+
+    def __repr__(self):
+        return "{}(total={!r})".format(type(self).__name__, self.total)
+
+
+class ReviewsPage(Page):
+    __slots__ = ()
+
+    item_model = Review
+    items_key = "reviews"
+
+
+class BusinessUnitsPage(Page):
+    __slots__ = ()
+
+    item_model = BusinessUnit
+    items_key = "businessUnits"
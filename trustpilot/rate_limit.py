@@ -0,0 +1,126 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+from trustpilot.retry import parse_retry_after
+
+# reset values larger than this are epoch timestamps rather than seconds
+_EPOCH_THRESHOLD = 10**9
+
+
+def _get_header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.burst = burst or max(1.0, self.max_rate)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def reserve(self, now):
+        # takes a token and returns the seconds to wait before it can be used;
+        # the balance may go negative, which queues callers in arrival order
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = max(now, self._updated)
+        self._tokens -= 1
+
+        delay = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        return max(delay, self._blocked_until - now)
+
+    def block(self, until):
+        self._blocked_until = max(self._blocked_until, until)
+
+    def adapt(self, remaining, seconds):
+        # spread what is left of the server side quota over its window
+        if seconds > 0:
+            self.rate = min(self.max_rate, remaining / seconds)
+        else:
+            self.rate = self.max_rate
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=None, key_rates=None, endpoint_rates=None):
+        # rates are requests per second, either a number or a (rate, burst) tuple;
+        # key_rates overrides the rate per api key and endpoint_rates adds extra
+        # limits for url path prefixes, e.g. {"/v1/private/": 5}
+        self.rate = (rate, burst)
+        self.key_rates = dict(key_rates or {})
+        self.endpoint_rates = dict(endpoint_rates or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, bucket_key, rate):
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            if not isinstance(rate, (tuple, list)):
+                rate = (rate, None)
+            bucket = self._buckets[bucket_key] = TokenBucket(*rate)
+        return bucket
+
+    def _get_buckets(self, api_key, url):
+        buckets = [
+            self._get_bucket((api_key, None), self.key_rates.get(api_key, self.rate))
+        ]
+        path = urlparse(url).path
+        prefixes = [prefix for prefix in self.endpoint_rates if path.startswith(prefix)]
+        if prefixes:
+            prefix = max(prefixes, key=len)
+            buckets.append(
+                self._get_bucket((api_key, prefix), self.endpoint_rates[prefix])
+            )
+        return buckets
+
+    def reserve(self, api_key, url):
+        # seconds the caller has to wait before sending the request
+        with self._lock:
+            now = time.monotonic()
+            return max(
+                [bucket.reserve(now) for bucket in self._get_buckets(api_key, url)]
+            )
+
+    def acquire(self, api_key, url):
+        delay = self.reserve(api_key, url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def update_from_response(self, api_key, url, status, headers):
+        remaining = _parse_number(
+            _get_header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        )
+        reset = _parse_number(
+            _get_header(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+        )
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if remaining is None and retry_after is None:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if reset is not None and reset > _EPOCH_THRESHOLD:
+                reset = max(0.0, reset - time.time())
+
+            buckets = self._get_buckets(api_key, url)
+            for bucket in buckets:
+                if status == 429 and retry_after is not None:
+                    bucket.block(now + retry_after)
+                elif remaining is not None and reset is not None:
+                    if remaining < 1:
+                        bucket.block(now + reset)
+                    else:
+                        bucket.adapt(remaining, reset)
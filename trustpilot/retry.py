@@ -0,0 +1,87 @@
+import random
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# 429 means the request was rejected before being processed, so it is safe to
+# retry for any method
+NON_IDEMPOTENT_RETRY_STATUSES = frozenset([429])
+
+RetryAttempt = namedtuple("RetryAttempt", ["attempt", "status", "delay"])
+
+
+def parse_retry_after(value):
+    # seconds to wait from a Retry-After header (delay-seconds or http-date)
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        total=3,
+        backoff_factor=0.5,
+        backoff_max=30,
+        jitter=True,
+        statuses=RETRY_STATUSES,
+        methods=IDEMPOTENT_METHODS,
+        non_idempotent_statuses=NON_IDEMPOTENT_RETRY_STATUSES,
+        respect_retry_after=True,
+        max_retry_after=120,
+        budget=None,
+    ):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.non_idempotent_statuses = frozenset(non_idempotent_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        # maximum number of seconds spent on a request including all retries
+        self.budget = budget
+
+    def get_backoff(self, retries):
+        backoff = min(self.backoff_max, self.backoff_factor * (2**retries))
+        if self.jitter:
+            # "full jitter", spreads retries of concurrent clients
+            return random.uniform(0, backoff)
+        return backoff
+
+    def get_retry_delay(self, method, status, retries, elapsed=0, retry_after=None):
+        # seconds to wait before the next attempt, or None to give up
+        if retries >= self.total or status not in self.statuses:
+            return None
+
+        if (
+            method.upper() not in self.methods
+            and status not in self.non_idempotent_statuses
+        ):
+            return None
+
+        delay = self.get_backoff(retries)
+        if self.respect_retry_after:
+            retry_after = parse_retry_after(retry_after)
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                delay = max(delay, retry_after)
+
+        if self.budget is not None and elapsed + delay > self.budget:
+            return None
+
+        return delay
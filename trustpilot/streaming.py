@@ -0,0 +1,118 @@
+import json
+import re
+
+# the only bytes that matter for finding the items, everything else is copied
+_STRUCTURAL = re.compile(rb'[\[\]{}",\\]')
+_QUOTE, _BACKSLASH, _COMMA, _BRACKET = ord('"'), ord("\\"), ord(","), ord("[")
+_OPENING, _CLOSING = frozenset(b"[{"), frozenset(b"]}")
+
+
+class JsonItemParser:
+    # incrementally parses the items of an array in a json document fed in
+    # chunks, holding at most one item in memory: the array of `items_key` in a
+    # top level object (by default its first array other than "links"), or the
+    # document itself when it is an array
+    def __init__(self, items_key=None, loads=json.loads):
+        self.items_key = items_key
+        self.loads = loads
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._in_key = False
+        self._key = bytearray()
+        self._current_key = None
+        self._array_depth = None
+        self._item = bytearray()
+        self.done = False
+
+    def _is_items_array(self):
+        if self._depth == 0:
+            return self.items_key is None
+        if self._depth == 1 and self._current_key is not None:
+            if self.items_key is None:
+                return self._current_key != "links"
+            return self._current_key == self.items_key
+        return False
+
+    def _pop_item(self, items):
+        item = bytes(self._item).strip()
+        self._item.clear()
+        if item:
+            items.append(self.loads(item))
+
+    def feed(self, data):
+        # returns the items completed by this chunk
+        items = []
+        if self.done:
+            return items
+
+        data = bytes(data)
+        start = 0
+        skip = 0 if self._escape else -1
+        self._escape = False
+
+        for match in _STRUCTURAL.finditer(data):
+            position = match.start()
+            if position == skip:
+                continue
+            char = data[position]
+
+            if self._in_string:
+                if char == _BACKSLASH:
+                    if position + 1 == len(data):
+                        self._escape = True
+                    skip = position + 1
+                elif char == _QUOTE:
+                    self._in_string = False
+                    if self._in_key:
+                        self._in_key = False
+                        self._key += data[start:position]
+                        self._current_key = json.loads(b'"' + bytes(self._key) + b'"')
+                        self._key.clear()
+                continue
+
+            if char == _QUOTE:
+                self._in_string = True
+                if self._expect_key and self._depth == 1:
+                    self._expect_key = False
+                    self._in_key = True
+                    start = position + 1
+            elif char in _OPENING:
+                if (
+                    char == _BRACKET
+                    and self._array_depth is None
+                    and self._is_items_array()
+                ):
+                    self._depth += 1
+                    self._array_depth = self._depth
+                    start = position + 1
+                    continue
+                self._depth += 1
+                if self._depth == 1 and self._array_depth is None:
+                    self._expect_key = True
+            elif char in _CLOSING:
+                if self._array_depth is not None and self._depth == self._array_depth:
+                    self._item += data[start:position]
+                    self._pop_item(items)
+                    self.done = True
+                    return items
+                self._depth -= 1
+            elif char == _COMMA:
+                if self._array_depth is not None:
+                    if self._depth == self._array_depth:
+                        self._item += data[start:position]
+                        self._pop_item(items)
+                        start = position + 1
+                elif self._depth == 1:
+                    self._expect_key = True
+
+        if self._in_key:
+            self._key += data[start:]
+        elif self._array_depth is not None:
+            self._item += data[start:]
+        return items
+
+    def close(self):
+        if self._array_depth is not None and not self.done:
+            raise ValueError("json document ended inside the items array")
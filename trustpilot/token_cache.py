@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import os.path as path
+import threading
+import time
+from contextlib import contextmanager
+from os import environ
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_default_token_cache_path():
+    cache_home = environ.get("XDG_CACHE_HOME") or path.join(
+        path.expanduser("~"), ".cache"
+    )
+    return path.join(cache_home, "trustpilot", "tokens.json")
+
+
+class TokenCache:
+    # interface for sharing access tokens between sessions, keyed by
+    # auth.get_token_cache_key
+
+    def get(self, key):
+        # returns (access_token, expires_at) for a still valid token or None
+        raise NotImplementedError
+
+    def set(self, key, access_token, expires_at):
+        raise NotImplementedError
+
+
+class MemoryTokenCache(TokenCache):
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._tokens.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry
+
+    def set(self, key, access_token, expires_at):
+        with self._lock:
+            self._tokens[key] = (access_token, expires_at)
+
+
+class FileTokenCache(TokenCache):
+    def __init__(self, cache_path=None):
+        self.path = (
+            cache_path
+            or environ.get("TRUSTPILOT_TOKEN_CACHE_PATH")
+            or get_default_token_cache_path()
+        )
+        self._lock_path = self.path + ".lock"
+
+    @contextmanager
+    def _locked(self, exclusive):
+        directory = path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, tokens):
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(tokens, cache_file)
+        os.replace(temp_path, self.path)
+
+    def get(self, key):
+        try:
+            with self._locked(exclusive=False):
+                entry = self._read().get(key)
+        except OSError as e:
+            logger.warning({"message": "token cache not readable", "error": str(e)})
+            return None
+
+        if not entry or entry.get("expires_at", 0) <= time.time():
+            return None
+        return entry["access_token"], entry["expires_at"]
+
+    def set(self, key, access_token, expires_at):
+        try:
+            with self._locked(exclusive=True):
+                now = time.time()
+                tokens = dict(
+                    (cached_key, entry)
+                    for cached_key, entry in self._read().items()
+                    if entry.get("expires_at", 0) > now
+                )
+                tokens[key] = {"access_token": access_token, "expires_at": expires_at}
+                self._write(tokens)
+        except OSError as e:
+            logger.warning({"message": "token cache not writable", "error": str(e)})
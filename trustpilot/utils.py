@@ -1,3 +1,12 @@
+from collections import namedtuple
+from os import environ
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+import hashlib
+
+# outcome of one request of a batch, "error" is set when it raised instead
+BatchResult = namedtuple("BatchResult", ["index", "spec", "response", "error"])
+
+
 def get_cleaned_url(url, api_host, api_version):
     if any(prefix in url for prefix in ["http://", "https://"]):
         return url
@@ -9,3 +18,126 @@ def get_cleaned_url(url, api_host, api_version):
         cleaned_url += "/{}{}".format(api_version, url)
 
     return cleaned_url
+
+
+def get_session_key(
+    api_host=None,
+    api_key=None,
+    username=None,
+    token_issuer_host=None,
+    token_issuer_path=None,
+    **kwargs
+):
+    # what tells the sessions of different business users apart, with the
+    # environment defaults of setup()
+    api_host = api_host or environ.get(
+        "TRUSTPILOT_API_HOST", "https://api.trustpilot.com"
+    )
+    return (
+        api_host,
+        api_key or environ.get("TRUSTPILOT_API_KEY"),
+        username or environ.get("TRUSTPILOT_USERNAME"),
+        token_issuer_host or api_host,
+        token_issuer_path
+        or environ.get(
+            "TRUSTPILOT_API_TOKEN_ISSUER_PATH",
+            "oauth/oauth-business-users-for-applications/accesstoken",
+        ),
+    )
+
+
+def get_request_spec_args(spec):
+    # request specs are urls (GET) or dicts with "method", "url" (or "path") and
+    # any other keyword arguments for the request
+    if isinstance(spec, str):
+        return "get", spec, {}
+
+    kwargs = dict(spec)
+    method = kwargs.pop("method", "get").lower()
+    url = kwargs.pop("url", None) or kwargs.pop("path")
+    return method, url, kwargs
+
+
+def get_next_page_url(content):
+    # list responses link to the following page with a "next-page" link
+    if not isinstance(content, dict):
+        return None
+    for link in content.get("links") or []:
+        if link.get("rel") in ("next-page", "next"):
+            return link.get("href")
+    return None
+
+
+def get_page_items(content, items_key=None):
+    # the items of a list response, by default its first list (e.g. "reviews")
+    if isinstance(content, list):
+        return content
+    if items_key is not None:
+        return content.get(items_key) or []
+    for key, value in content.items():
+        if key != "links" and isinstance(value, list):
+            return value
+    return []
+
+
+def get_total_count(content, total_key=None):
+    # the total number of items of a list response, if it tells
+    if not isinstance(content, dict):
+        return None
+    for key in [total_key] if total_key else ["total", "totalCount", "totalItems"]:
+        try:
+            return int(content[key])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return None
+
+
+def _get_query_params(url, params=None):
+    # the url without its query string and the (key, value) pairs of both, the
+    # params replacing those of the query string with the same key
+    parts = urlsplit(url)
+    if isinstance(params, dict):
+        params = list(params.items())
+    params = list(params or [])
+    keys = {key for key, _ in params}
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in keys
+    ]
+    return urlunsplit(parts._replace(query="")), query + params
+
+
+def get_page_request_specs(
+    url, content, items_key=None, total_key=None, params=None, **kwargs
+):
+    # request specs for the pages following `content` when the number of pages
+    # can be worked out from its total count, else None
+    url, params = _get_query_params(url, params)
+    values = dict(params)
+    total = get_total_count(content, total_key)
+    per_page = int(values.get("perPage") or len(get_page_items(content, items_key)))
+    if total is None or per_page < 1:
+        return None
+
+    first_page = int(values.get("page", 1))
+    last_page = -(-total // per_page)
+    params = [(key, value) for key, value in params if key != "page"]
+    return (
+        dict(kwargs, method="get", url=url, params=params + [("page", page)])
+        for page in range(first_page + 1, last_page + 1)
+    )
+
+
+def get_request_fingerprint(method, url, params=None, headers=None, **kwargs):
+    # a stable hash of what identifies a request, including any other (hashable
+    # by repr) request arguments
+    if isinstance(params, dict):
+        params = sorted((str(key), str(value)) for key, value in params.items())
+    elif params is not None and not isinstance(params, (str, bytes)):
+        params = sorted((str(key), str(value)) for key, value in params)
+    headers = sorted(
+        (str(key).lower(), str(value)) for key, value in (headers or {}).items()
+    )
+    fingerprint = repr((method.upper(), url, params, headers, sorted(kwargs.items())))
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()